@@ -1,3 +1,17 @@
-from .routes import router
+from .routes import (
+    router,
+    init_agent_service,
+    get_readiness,
+    close_agent_service,
+    start_job_workers,
+    stop_job_workers
+)
 
-__all__ = ["router"]
+__all__ = [
+    "router",
+    "init_agent_service",
+    "get_readiness",
+    "close_agent_service",
+    "start_job_workers",
+    "stop_job_workers"
+]
@@ -1,6 +1,45 @@
-from fastapi import APIRouter, HTTPException, status
-from app.models.schemas import ATSMatchRequest, ATSMatchResponse, HealthResponse, SkillAnalysis, MatchStatus
+import asyncio
+import json
+import math
+from typing import Any, Dict, List, Optional, Tuple, Union
+from fastapi import APIRouter, Header, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from app.models.schemas import (
+    ATSMatchRequest,
+    ATSMatchResponse,
+    ATSBatchMatchRequest,
+    ATSBatchMatchItem,
+    ATSUploadMatchItem,
+    ATSRankRequest,
+    ATSRankResponse,
+    RankedCandidate,
+    HealthResponse,
+    LeaderboardEntry,
+    MatchStatus,
+    ScoringMode,
+    UploadFormat,
+    VacanteData,
+    VacanteLeaderboardResponse,
+    VacanteReference,
+    VacanteRescoreResponse,
+    VacanteRegistrationResponse,
+    CandidatoData,
+    CandidatoRegistrationResponse,
+    CandidatoBulkRegistrationResponse,
+    ATSJobRequest,
+    ATSJobCreated,
+    ATSJobStatus
+)
 from app.services import AgentService
+from app.services.analysis_parser import ANALYSIS_ADAPTER
+from app.services.candidate_ingest import UploadLimitExceeded, aiter_candidatos
+from app.services.deadlines import DeadlineExceeded
+from app.services.metrics import record_stage_since_request_start, registry, stage
+from app.services.prompt_builder import estimate_tokens
+from app.services.rate_limiter import RateLimitExceeded
+from app.services.candidate_store import StoredCandidato
+from app.services.job_queue import JobItem, JobQueue, JobWorkerPool
+from app.services.vacante_registry import CompiledVacante
 from app.config import settings
 import logging
 
@@ -21,6 +60,7 @@ def get_agent_service() -> AgentService:
     if agent_service is None:
         try:
             agent_service = AgentService()
+            registry.register_collector("agent", agent_service.metrics_samples)
             logger.info("AgentService (Simulador ATS) inicializado correctamente")
         except Exception as e:
             logger.error(f"Error al inicializar AgentService: {str(e)}")
@@ -28,6 +68,181 @@ def get_agent_service() -> AgentService:
     return agent_service
 
 
+# Estado del precalentamiento: la instancia solo está lista cuando termina
+readiness: Dict[str, Any] = {"ready": False, "warmup": None}
+warm_up_task: Optional[asyncio.Task] = None
+
+
+async def warm_up_agent_service(service: AgentService) -> None:
+    """Precalienta el servicio y marca la instancia como lista (aunque Groq no responda)"""
+    try:
+        if settings.warmup_enabled:
+            readiness["warmup"] = await service.awarm_up()
+    except Exception as e:
+        logger.error(f"Error en el warm-up del agente: {str(e)}")
+        readiness["warmup"] = {"ok": False, "error": str(e)}
+    readiness["ready"] = True
+
+
+def init_agent_service() -> None:
+    """Crea el servicio del agente al arrancar y lanza su warm-up en segundo plano"""
+    global warm_up_task
+    service = get_agent_service()
+    if warm_up_task is None:
+        warm_up_task = asyncio.create_task(warm_up_agent_service(service))
+
+
+def get_readiness() -> Dict[str, Any]:
+    """Estado de readiness de la instancia"""
+    return dict(readiness)
+
+
+async def close_agent_service() -> None:
+    """Cancela el warm-up si sigue en curso y cierra el pool HTTP del agente"""
+    if warm_up_task is not None and not warm_up_task.done():
+        warm_up_task.cancel()
+    if agent_service is not None:
+        await agent_service.aclose()
+
+
+# Cola de jobs durable y sus workers (singletons)
+job_queue: Optional[JobQueue] = None
+job_workers: Optional[JobWorkerPool] = None
+
+
+def get_job_queue() -> JobQueue:
+    """Obtiene o crea la cola de jobs"""
+    global job_queue
+    if job_queue is None:
+        job_queue = JobQueue(
+            settings.job_queue_path,
+            max_attempts=settings.job_max_attempts,
+            backoff_seconds=settings.job_backoff_seconds,
+            backoff_max_seconds=settings.job_backoff_max_seconds,
+            lease_seconds=settings.job_lease_seconds
+        )
+        registry.register_collector("jobs", job_queue_samples)
+    return job_queue
+
+
+def job_queue_samples() -> List[Tuple[str, str, str, Dict[str, str], float]]:
+    """Gauges de la cola de jobs para /metrics: elementos por estado"""
+    return [
+        ("ats_job_items", "gauge", "Elementos de la cola de jobs por estado", {"status": item_status}, count)
+        for item_status, count in job_queue.get_stats().items()
+    ]
+
+
+async def run_job_item(item: JobItem) -> Dict[str, Any]:
+    """Handler de los workers: procesa un elemento con el servicio del agente"""
+    return await get_agent_service().aprocess_job_item(item)
+
+
+def start_job_workers() -> None:
+    """Arranca los workers de la cola (retoman los jobs pendientes de ejecuciones anteriores)"""
+    global job_workers
+    if job_workers is None:
+        job_workers = JobWorkerPool(
+            get_job_queue(),
+            run_job_item,
+            workers=settings.job_workers,
+            poll_interval=settings.job_poll_interval
+        )
+    job_workers.start()
+
+
+async def stop_job_workers() -> None:
+    """Detiene los workers de la cola"""
+    if job_workers is not None:
+        await job_workers.stop()
+
+
+def build_match_response(analysis_result: Dict[str, Any]) -> ATSMatchResponse:
+    """Valida el análisis del agente contra el modelo de respuesta"""
+    return ANALYSIS_ADAPTER.validate_python(analysis_result)
+
+
+def resolve_vacante(service: AgentService, request: VacanteReference) -> CompiledVacante:
+    """Vacante de la petición ya compilada: registrada (vacante_id) o enviada completa"""
+    if request.vacante_id is None:
+        return service.vacantes.compile(request.vacante)
+    compiled = service.vacantes.get(request.vacante_id)
+    if compiled is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Vacante no registrada: {request.vacante_id}"
+        )
+    return compiled
+
+
+def resolve_candidato(service: AgentService, request: Union[ATSMatchRequest, ATSJobRequest]) -> Union[CandidatoData, StoredCandidato]:
+    """Candidato de la petición: almacenado (candidato_id) o enviado completo"""
+    if request.candidato_id is None:
+        return request.candidato
+    stored = service.candidatos.get(request.candidato_id)
+    if stored is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Candidato no registrado: {request.candidato_id}"
+        )
+    return stored
+
+
+def resolve_candidatos(service: AgentService, request: Union[ATSBatchMatchRequest, ATSJobRequest]) -> List[Union[CandidatoData, StoredCandidato]]:
+    """Candidatos de un lote: almacenados (candidato_ids) o enviados completos"""
+    if request.candidato_ids is None:
+        return request.candidatos
+    stored, missing = service.candidatos.get_many(request.candidato_ids)
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Candidatos no registrados: {', '.join(missing[:20])}"
+        )
+    return stored
+
+
+class BodyStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse que responde mientras se sigue leyendo el body
+
+    StreamingResponse escucha receive() en paralelo para detectar la
+    desconexión del cliente y se quedaría con fragmentos del body. Aquí no se
+    escucha: una desconexión durante la subida la detecta request.stream().
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+def upload_format(request: Request, fmt: Optional[UploadFormat]) -> UploadFormat:
+    """Formato de una subida: el parámetro format o, si falta, el Content-Type"""
+    if fmt is not None:
+        return fmt
+    content_type = request.headers.get("content-type", "").lower()
+    if "csv" in content_type:
+        return UploadFormat.CSV
+    if "json" in content_type:
+        return UploadFormat.JSONL
+    raise HTTPException(
+        status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+        detail="Indica format=csv o format=jsonl, o un Content-Type text/csv o application/x-ndjson"
+    )
+
+
+def request_timeout(header_value: Optional[float]) -> Optional[float]:
+    """Plazo de una petición: la cabecera X-Request-Timeout (acotada) o REQUEST_DEADLINE_SECONDS"""
+    if header_value is not None:
+        return min(header_value, settings.request_deadline_max_seconds)
+    return settings.request_deadline_seconds or None
+
+
+def format_sse(event: str, data: Any) -> str:
+    """Serializa un evento Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
 @router.get("/", response_model=HealthResponse)
 async def health_check():
     """
@@ -57,7 +272,13 @@ async def get_ats_info():
 
 
 @router.post("/ats/match", response_model=ATSMatchResponse)
-async def ats_matching(request: ATSMatchRequest):
+async def ats_matching(
+    request: ATSMatchRequest,
+    use_cache: bool = Query(True, description="Consultar y actualizar la caché de análisis"),
+    refresh_cache: bool = Query(False, description="Invalidar la entrada en caché y recalcular"),
+    scoring_mode: Optional[ScoringMode] = Query(None, description="llm (análisis con modelo) o local (solo motor local)"),
+    x_request_timeout: Optional[float] = Header(None, gt=0, description="Plazo de la petición en segundos")
+):
     """
     Realiza el matching ATS entre una vacante y un candidato
     
@@ -67,45 +288,68 @@ async def ats_matching(request: ATSMatchRequest):
     - Scoring ponderado: 50% Hard Skills, 30% Experiencia, 20% Soft Skills
     - Anonimización de datos PII para cumplir normativas de no discriminación
     
+    La sección de habilidades la calcula un motor local determinista (taxonomía de
+    sinónimos + similitud de n-gramas); con `scoring_mode=local` todo el análisis
+    se calcula localmente sin llamar al modelo.
+    
+    Los análisis se cachean por contenido: repetir el mismo par vacante/candidato
+    devuelve el resultado previo sin llamar al modelo (processing.source = "cache").
+    
+    Si el análisis no termina dentro del plazo (REQUEST_DEADLINE_SECONDS o la
+    cabecera X-Request-Timeout) se cancela la llamada al modelo y se responde 504.
+    
     Args:
         request: Objeto ATSMatchRequest con datos de vacante y candidato
+        use_cache: Si es False, ignora la caché por completo
+        refresh_cache: Si es True, descarta el resultado en caché y lo recalcula
+        scoring_mode: local calcula el matching solo con el motor local, sin modelo
+        x_request_timeout: Plazo en segundos (acotado a REQUEST_DEADLINE_MAX_SECONDS)
         
     Returns:
         ATSMatchResponse con análisis completo del matching
     """
+    # Lectura del body y validación Pydantic (ocurren antes de entrar al handler)
+    record_stage_since_request_start("validate")
     try:
-        logger.info(f"Procesando matching ATS para: {request.vacante.job_title}")
-        
         # Obtener el servicio del agente
         service = get_agent_service()
+        with stage("resolve"):
+            vacante = resolve_vacante(service, request)
+            candidato = resolve_candidato(service, request)
         
-        # Procesar el matching ATS
-        analysis_result = service.process_ats_matching(
-            vacante=request.vacante,
-            candidato=request.candidato
+        logger.info(f"Procesando matching ATS para: {vacante.vacante.job_title}")
+        
+        # Procesar el matching ATS sin bloquear el event loop
+        analysis_result = await service.aprocess_ats_matching(
+            vacante=vacante,
+            candidato=candidato,
+            use_cache=use_cache,
+            refresh_cache=refresh_cache,
+            scoring_mode=scoring_mode,
+            timeout=request_timeout(x_request_timeout)
         )
         
         logger.info(f"Matching completado - Score: {analysis_result.get('match_score', 0)}%")
         
         # Construir la respuesta estructurada
-        response = ATSMatchResponse(
-            match_score=analysis_result.get("match_score", 0.0),
-            status=MatchStatus(analysis_result.get("status", "PENDIENTE")),
-            skill_analysis=SkillAnalysis(
-                hard_skills_score=analysis_result["skill_analysis"]["hard_skills_score"],
-                soft_skills_score=analysis_result["skill_analysis"]["soft_skills_score"],
-                matched_skills=analysis_result["skill_analysis"]["matched_skills"],
-                missing_skills=analysis_result["skill_analysis"]["missing_skills"]
-            ),
-            experience_score=analysis_result.get("experience_score", 0.0),
-            compliance_check=analysis_result.get("compliance_check", {}),
-            recommendations=analysis_result.get("recommendations", []),
-            summary=analysis_result.get("summary", ""),
-            detailed_analysis=analysis_result.get("detailed_analysis", "")
-        )
-        
-        return response
+        with stage("response"):
+            return build_match_response(analysis_result)
         
+    except HTTPException:
+        raise
+    except RateLimitExceeded as e:
+        logger.warning(f"Matching rechazado por límite de tasa: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=str(e),
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
+    except DeadlineExceeded as e:
+        logger.warning(f"Matching cancelado por plazo: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=str(e)
+        )
     except ValueError as e:
         logger.error(f"Error de validación: {str(e)}")
         raise HTTPException(
@@ -124,3 +368,691 @@ async def ats_matching(request: ATSMatchRequest):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error al procesar el matching ATS: {str(e)}"
         )
+
+
+@router.post("/ats/match/stream")
+async def ats_matching_stream(
+    request: ATSMatchRequest,
+    use_cache: bool = Query(True, description="Consultar y actualizar la caché de análisis"),
+    refresh_cache: bool = Query(False, description="Invalidar la entrada en caché y recalcular"),
+    scoring_mode: Optional[ScoringMode] = Query(None, description="llm (análisis con modelo) o local (solo motor local)"),
+    x_request_timeout: Optional[float] = Header(None, gt=0, description="Plazo de la petición en segundos")
+):
+    """
+    Variante Server-Sent Events de /ats/match
+    
+    Emite un evento por campo en cuanto el modelo lo completa, en el orden del
+    formato de respuesta: `match_score` y `status` primero, luego `skill_analysis`,
+    `experience_score`, `compliance_check` y los campos narrativos
+    (`recommendations`, `summary`, `detailed_analysis`). El evento final `result`
+    contiene el ATSMatchResponse completo; si algo falla se emite `error` (con
+    status_code 504 si vence el plazo de la petición).
+    
+    Args:
+        request: Objeto ATSMatchRequest con datos de vacante y candidato
+        
+    Returns:
+        Stream text/event-stream
+    """
+    try:
+        service = get_agent_service()
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al procesar el matching ATS: {str(e)}"
+        )
+    vacante = resolve_vacante(service, request)
+    candidato = resolve_candidato(service, request)
+    timeout = request_timeout(x_request_timeout)
+    
+    logger.info(f"Procesando matching ATS (stream) para: {vacante.vacante.job_title}")
+    
+    async def sse_events():
+        try:
+            async for name, value in service.astream_ats_matching(
+                vacante,
+                candidato,
+                use_cache=use_cache,
+                refresh_cache=refresh_cache,
+                scoring_mode=scoring_mode,
+                timeout=timeout
+            ):
+                if name == "result":
+                    yield format_sse("result", build_match_response(value).model_dump(mode="json"))
+                else:
+                    yield format_sse(name, {name: value})
+        except RateLimitExceeded as e:
+            logger.warning(f"Matching (stream) rechazado por límite de tasa: {str(e)}")
+            yield format_sse("error", {
+                "detail": str(e),
+                "status_code": status.HTTP_429_TOO_MANY_REQUESTS,
+                "retry_after": math.ceil(e.retry_after)
+            })
+        except DeadlineExceeded as e:
+            logger.warning(f"Matching (stream) cancelado por plazo: {str(e)}")
+            yield format_sse("error", {"detail": str(e), "status_code": status.HTTP_504_GATEWAY_TIMEOUT})
+        except Exception as e:
+            logger.error(f"Error al procesar el matching ATS (stream): {str(e)}")
+            yield format_sse("error", {"detail": f"Error al procesar el matching ATS: {str(e)}"})
+    
+    return StreamingResponse(
+        sse_events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post("/ats/match/batch")
+async def ats_matching_batch(
+    request: ATSBatchMatchRequest,
+    use_cache: bool = Query(True, description="Consultar y actualizar la caché de análisis"),
+    refresh_cache: bool = Query(False, description="Invalidar las entradas en caché y recalcular"),
+    scoring_mode: Optional[ScoringMode] = Query(None, description="llm (análisis con modelo) o local (solo motor local)")
+):
+    """
+    Realiza el matching ATS de una vacante contra varios candidatos
+    
+    Los análisis se ejecutan en paralelo y cada resultado se devuelve como una
+    línea NDJSON (ATSBatchMatchItem) en cuanto termina, sin esperar al resto.
+    El campo `index` indica la posición del candidato en la petición.
+    
+    Args:
+        request: Objeto ATSBatchMatchRequest con la vacante y la lista de candidatos
+        use_cache: Si es False, ignora la caché por completo
+        refresh_cache: Si es True, descarta los resultados en caché y los recalcula
+        scoring_mode: local calcula el matching solo con el motor local, sin modelo
+        
+    Returns:
+        Stream application/x-ndjson con un ATSBatchMatchItem por candidato
+    """
+    if request.pool_size > settings.batch_max_candidates:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"El lote excede el máximo de {settings.batch_max_candidates} candidatos"
+        )
+    
+    try:
+        service = get_agent_service()
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al procesar el matching ATS: {str(e)}"
+        )
+    
+    vacante = resolve_vacante(service, request)
+    candidatos = resolve_candidatos(service, request)
+    parallelism = min(
+        request.parallelism or settings.batch_default_parallelism,
+        settings.batch_max_parallelism
+    )
+    logger.info(
+        f"Procesando lote ATS para: {vacante.vacante.job_title} "
+        f"({len(candidatos)} candidatos, paralelismo {parallelism})"
+    )
+    
+    async def ndjson_results():
+        async for index, outcome in service.aiter_ats_batch(
+            vacante,
+            candidatos,
+            parallelism,
+            use_cache=use_cache,
+            refresh_cache=refresh_cache,
+            scoring_mode=scoring_mode
+        ):
+            if isinstance(outcome, Exception):
+                logger.error(f"Error en el candidato {index} del lote: {str(outcome)}")
+                item = ATSBatchMatchItem(index=index, error=str(outcome))
+            else:
+                try:
+                    item = ATSBatchMatchItem(index=index, result=build_match_response(outcome))
+                except (ValueError, KeyError) as e:
+                    logger.error(f"Error en formato de respuesta del candidato {index}: {str(e)}")
+                    item = ATSBatchMatchItem(index=index, error=f"Error en el formato de respuesta del análisis: {str(e)}")
+            yield item.model_dump_json() + "\n"
+    
+    return StreamingResponse(ndjson_results(), media_type="application/x-ndjson")
+
+
+@router.post("/ats/match/upload")
+async def ats_matching_upload(
+    request: Request,
+    vacante_id: str = Query(..., description="Id devuelto por POST /vacantes"),
+    fmt: Optional[UploadFormat] = Query(None, alias="format", description="csv o jsonl (por defecto, según el Content-Type)"),
+    parallelism: Optional[int] = Query(None, ge=1, description="Número de análisis simultáneos (limitado por el servidor)"),
+    use_cache: bool = Query(True, description="Consultar y actualizar la caché de análisis"),
+    refresh_cache: bool = Query(False, description="Invalidar las entradas en caché y recalcular"),
+    scoring_mode: Optional[ScoringMode] = Query(None, description="llm (análisis con modelo) o local (solo motor local)")
+):
+    """
+    Realiza el matching de una vacante registrada contra un archivo de candidatos
+    
+    El body es el archivo CSV (cabecera con los campos de CandidatoData; listas
+    separadas por ";") o JSONL (un candidato por línea), sin multipart. Se
+    procesa en streaming: cada fila se valida al leerla, se analiza con
+    concurrencia acotada y su resultado se devuelve como una línea JSONL
+    (ATSUploadMatchItem) en cuanto termina. El body se lee al ritmo del
+    matching, así que la memoria no depende del tamaño del archivo. Una fila
+    inválida se reporta en su línea con `error` sin detener el resto.
+    
+    Args:
+        request: Petición con el archivo en el body
+        vacante_id: Vacante registrada contra la que se evalúan las filas
+        fmt: csv o jsonl
+        parallelism: Número máximo de análisis simultáneos
+        use_cache: Si es False, ignora la caché por completo
+        refresh_cache: Si es True, descarta los resultados en caché y los recalcula
+        scoring_mode: local calcula el matching solo con el motor local, sin modelo
+        
+    Returns:
+        Stream application/x-ndjson con un ATSUploadMatchItem por fila
+    """
+    fmt = upload_format(request, fmt)
+    try:
+        service = get_agent_service()
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al procesar el matching ATS: {str(e)}"
+        )
+    
+    vacante = resolve_vacante(service, VacanteReference(vacante_id=vacante_id))
+    parallelism = min(parallelism or settings.batch_default_parallelism, settings.batch_max_parallelism)
+    logger.info(
+        f"Procesando archivo {fmt.value} para: {vacante.vacante.job_title} (paralelismo {parallelism})"
+    )
+    
+    async def rows():
+        async for index, line, candidato in aiter_candidatos(
+            request.stream(),
+            fmt,
+            max_row_bytes=settings.upload_max_row_bytes,
+            max_rows=settings.upload_max_rows
+        ):
+            yield (index, line), candidato
+    
+    async def ndjson_results():
+        processed = failed = 0
+        async for (index, line), outcome in service.aiter_ats_stream(
+            vacante,
+            rows(),
+            parallelism,
+            use_cache=use_cache,
+            refresh_cache=refresh_cache,
+            scoring_mode=scoring_mode
+        ):
+            processed += 1
+            if isinstance(outcome, Exception):
+                failed += 1
+                if not isinstance(outcome, UploadLimitExceeded):
+                    logger.warning(f"Error en la fila {index} (línea {line}) del archivo: {str(outcome)}")
+                item = ATSUploadMatchItem(index=index, line=line, error=str(outcome))
+            else:
+                try:
+                    item = ATSUploadMatchItem(index=index, line=line, result=build_match_response(outcome))
+                except (ValueError, KeyError) as e:
+                    failed += 1
+                    item = ATSUploadMatchItem(index=index, line=line, error=f"Error en el formato de respuesta del análisis: {str(e)}")
+            yield item.model_dump_json() + "\n"
+        logger.info(f"Archivo procesado: {processed} filas, {failed} con error")
+    
+    return BodyStreamingResponse(ndjson_results(), media_type="application/x-ndjson")
+
+
+@router.post("/ats/rank", response_model=ATSRankResponse)
+async def ats_rank(request: ATSRankRequest):
+    """
+    Rankea un pool grande de candidatos para una vacante
+    
+    1. Pre-filtro local: índice invertido sobre habilidades normalizadas, años de
+       experiencia y ubicación; todo el pool se puntúa en una pasada vectorizada
+       (misma ponderación 50/30/20, compliance excluyente = 0)
+    2. Solo los `top_k` mejores pasan por el análisis completo con el modelo
+    
+    Args:
+        request: Objeto ATSRankRequest con la vacante, el pool y el tamaño del Top-K
+        
+    Returns:
+        ATSRankResponse con el Top-K ordenado por match_score final
+    """
+    if request.pool_size > settings.rank_max_candidates:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"El pool excede el máximo de {settings.rank_max_candidates} candidatos"
+        )
+    if request.top_k > settings.rank_max_top_k:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"top_k no puede superar {settings.rank_max_top_k}"
+        )
+    
+    try:
+        service = get_agent_service()
+        vacante = resolve_vacante(service, request)
+        parallelism = min(
+            request.parallelism or settings.batch_default_parallelism,
+            settings.batch_max_parallelism
+        )
+        logger.info(
+            f"Rankeando {request.pool_size} candidatos para: {vacante.vacante.job_title} "
+            f"(top_k {request.top_k})"
+        )
+        if request.candidato_ids is not None:
+            rows, missing = service.candidatos.rows_for(request.candidato_ids)
+            if missing:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail=f"Candidatos no registrados: {', '.join(missing[:20])}"
+                )
+            results = await service.arank_stored_candidates(
+                vacante,
+                rows,
+                request.top_k,
+                parallelism,
+                request.min_prefilter_score
+            )
+        else:
+            results = await service.arank_candidates(
+                vacante,
+                request.candidatos,
+                request.top_k,
+                parallelism,
+                request.min_prefilter_score
+            )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error al rankear candidatos: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al rankear candidatos: {str(e)}"
+        )
+    
+    ranking = []
+    for index, prefilter_score, outcome in results:
+        analysis, error = None, None
+        if isinstance(outcome, Exception):
+            error = str(outcome)
+        else:
+            try:
+                analysis = build_match_response(outcome)
+            except (ValueError, KeyError) as e:
+                error = f"Error en el formato de respuesta del análisis: {str(e)}"
+        ranking.append((index, prefilter_score, analysis, error))
+    
+    # Orden final: match_score del análisis completo y, a igualdad, el pre-filtro
+    ranking.sort(key=lambda item: (item[2].match_score if item[2] else -1.0, item[1]), reverse=True)
+    
+    return ATSRankResponse(
+        total_candidates=request.pool_size,
+        shortlisted=len(ranking),
+        ranking=[
+            RankedCandidate(index=index, rank=rank, prefilter_score=prefilter_score, analysis=analysis, error=error)
+            for rank, (index, prefilter_score, analysis, error) in enumerate(ranking, start=1)
+        ]
+    )
+
+
+@router.post("/vacantes", response_model=VacanteRegistrationResponse)
+async def register_vacante(vacante: VacanteData):
+    """
+    Registra una vacante y precalcula sus artefactos de matching
+    
+    Se calculan una sola vez las habilidades normalizadas y sus vectores, los
+    predicados de compliance y la sección de la vacante del prompt. El id
+    devuelto se usa como `vacante_id` en /ats/match, /ats/match/stream,
+    /ats/match/batch y /ats/rank en lugar de enviar la vacante completa.
+    El id depende solo del contenido: registrar la misma vacante devuelve el mismo id.
+    
+    Args:
+        vacante: Datos de la vacante
+        
+    Returns:
+        VacanteRegistrationResponse con el id y las habilidades canónicas
+    """
+    try:
+        service = get_agent_service()
+        compiled, created = service.vacantes.register(vacante)
+    except Exception as e:
+        logger.error(f"Error al registrar la vacante: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al registrar la vacante: {str(e)}"
+        )
+    
+    logger.info(f"Vacante registrada: {compiled.vacante_id} ({vacante.job_title})")
+    return VacanteRegistrationResponse(
+        vacante_id=compiled.vacante_id,
+        created=created,
+        job_title=vacante.job_title,
+        canonical_hard_skills=compiled.canonical_hard_skills,
+        canonical_soft_skills=compiled.canonical_soft_skills,
+        prompt_section_tokens=estimate_tokens(compiled.prompt_section)
+    )
+
+
+@router.get("/vacantes/{vacante_id}", response_model=VacanteData)
+async def get_vacante(vacante_id: str):
+    """
+    Obtiene los datos de una vacante registrada
+    """
+    service = get_agent_service()
+    compiled = service.vacantes.get(vacante_id)
+    if compiled is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Vacante no registrada: {vacante_id}"
+        )
+    return compiled.vacante
+
+
+@router.delete("/vacantes/{vacante_id}")
+async def delete_vacante(vacante_id: str):
+    """
+    Elimina una vacante del registro
+    """
+    service = get_agent_service()
+    return {"deleted": service.vacantes.delete(vacante_id)}
+
+
+@router.put("/vacantes/{vacante_id}", response_model=VacanteRescoreResponse)
+def edit_vacante(vacante_id: str, vacante: VacanteData):
+    """
+    Edita una vacante y recalcula su historial sin volver a analizar el pool
+    
+    La vacante editada se registra con un id nuevo (el id depende del
+    contenido). Para cada candidato ya analizado contra la versión anterior
+    solo se recalculan los componentes afectados por los campos que cambiaron
+    (hard/soft skills → skills, years_experience → experience; education,
+    location_required y work_permit_required → compliance) y el score se
+    recombina con la ponderación 50% Hard, 30% Experiencia, 20% Soft. Resumen
+    y recomendaciones se conservan marcados como desactualizados
+    (`narrative_stale`) hasta que un /ats/match del par los regenera.
+    
+    Se ejecuta en el pool de hilos: el recálculo es CPU local y no bloquea el event loop.
+    
+    Args:
+        vacante_id: Id de la vacante antes de la edición
+        vacante: Datos completos de la vacante editada
+        
+    Returns:
+        VacanteRescoreResponse con el id nuevo y el resumen del re-scoring
+    """
+    if not settings.match_history_enabled:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="El historial de análisis está desactivado (MATCH_HISTORY_ENABLED=False)"
+        )
+    
+    service = get_agent_service()
+    try:
+        summary = service.rescore_vacante(vacante_id, vacante)
+    except Exception as e:
+        logger.error(f"Error al recalcular la vacante {vacante_id}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al recalcular la vacante: {str(e)}"
+        )
+    if summary is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Vacante no registrada: {vacante_id}"
+        )
+    
+    logger.info(
+        f"Vacante {vacante_id} editada → {summary['vacante_id']}: {summary['rescored']} análisis recalculados "
+        f"({', '.join(summary['rescored_components']) or 'solo narrativa'}) en {summary['duration_ms']} ms"
+    )
+    return VacanteRescoreResponse(**summary)
+
+
+@router.get("/vacantes/{vacante_id}/leaderboard", response_model=VacanteLeaderboardResponse)
+async def vacante_leaderboard(
+    vacante_id: str,
+    status_filter: Optional[MatchStatus] = Query(None, alias="status", description="Solo análisis con este estado"),
+    missing_skill: Optional[str] = Query(None, description="Solo candidatos a los que les falta esta habilidad"),
+    min_score: Optional[float] = Query(None, ge=0, le=100, description="match_score mínimo"),
+    limit: int = Query(20, ge=1, le=500, description="Tamaño de la página"),
+    offset: int = Query(0, ge=0, description="Análisis que se saltan antes de la página")
+):
+    """
+    Leaderboard de una vacante a partir del historial de análisis
+    
+    Cada análisis válido (de /ats/match, stream, batch, upload, rank o jobs)
+    se guarda en el historial con el último resultado de cada candidato, así
+    que la consulta no llama al modelo: por ejemplo el top 10 APROBADO
+    (`?status=APROBADO&limit=10`) o los candidatos a los que solo les falta
+    Docker (`?missing_skill=docker`, admite alias). Ordenado por match_score.
+    
+    Args:
+        vacante_id: Id de la vacante (el de POST /vacantes)
+        status_filter: APROBADO, RECHAZADO o PENDIENTE
+        missing_skill: Habilidad faltante por la que filtrar
+        min_score: match_score mínimo
+        limit: Tamaño de la página
+        offset: Análisis que se saltan antes de la página
+        
+    Returns:
+        VacanteLeaderboardResponse con el total y la página pedida
+    """
+    if not settings.match_history_enabled:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="El historial de análisis está desactivado (MATCH_HISTORY_ENABLED=False)"
+        )
+    
+    service = get_agent_service()
+    with stage("history"):
+        page = service.history.leaderboard(
+            vacante_id,
+            status=status_filter.value if status_filter is not None else None,
+            missing_skill=missing_skill,
+            min_score=min_score,
+            limit=limit,
+            offset=offset
+        )
+    return VacanteLeaderboardResponse(
+        vacante_id=vacante_id,
+        total=page.total,
+        limit=limit,
+        offset=offset,
+        entries=[
+            LeaderboardEntry(
+                rank=offset + position,
+                candidato_id=entry.candidato_id,
+                match_score=entry.match_score,
+                status=entry.status,
+                source=entry.source,
+                narrative_stale=entry.source == "rescore",
+                analyzed_at=entry.analyzed_at,
+                analysis=entry.analysis
+            )
+            for position, entry in enumerate(page.entries, start=1)
+        ]
+    )
+
+
+@router.post("/candidatos", response_model=CandidatoRegistrationResponse)
+async def register_candidato(candidato: CandidatoData):
+    """
+    Guarda el perfil de un candidato en el almacén
+    
+    El CV se procesa una sola vez: habilidades canónicas, términos normalizados
+    y una fila de features (experiencia, permiso, educación y firma de términos)
+    en una matriz memory-mapped. El id devuelto se usa como `candidato_id` en
+    /ats/match y /ats/match/stream, o en `candidato_ids` de /ats/match/batch y
+    /ats/rank. El id depende solo del contenido del perfil.
+    
+    Args:
+        candidato: Datos del candidato
+        
+    Returns:
+        CandidatoRegistrationResponse con el id y las habilidades canónicas
+    """
+    try:
+        service = get_agent_service()
+        stored, created = service.candidatos.add(candidato)
+    except Exception as e:
+        logger.error(f"Error al registrar el candidato: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al registrar el candidato: {str(e)}"
+        )
+    
+    return CandidatoRegistrationResponse(
+        candidato_id=stored.candidato_id,
+        created=created,
+        canonical_skills=sorted({service.skill_matcher.canonicalize(skill) for skill in candidato.skills})
+    )
+
+
+@router.post("/candidatos/bulk", response_model=CandidatoBulkRegistrationResponse)
+async def register_candidatos_bulk(candidatos: List[CandidatoData]):
+    """
+    Guarda varios perfiles de candidatos en una sola transacción
+    """
+    if len(candidatos) > settings.candidate_bulk_max:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"El registro masivo excede el máximo de {settings.candidate_bulk_max} candidatos"
+        )
+    
+    try:
+        service = get_agent_service()
+        stored, created = service.candidatos.add_many(candidatos)
+    except Exception as e:
+        logger.error(f"Error al registrar candidatos: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al registrar candidatos: {str(e)}"
+        )
+    
+    logger.info(f"Candidatos registrados: {sum(created)} nuevos de {len(candidatos)}")
+    return CandidatoBulkRegistrationResponse(
+        candidato_ids=[item.candidato_id for item in stored],
+        created=sum(created),
+        total_stored=service.candidatos.size
+    )
+
+
+@router.get("/candidatos/{candidato_id}", response_model=CandidatoData)
+async def get_candidato(candidato_id: str):
+    """
+    Obtiene los datos de un candidato almacenado
+    """
+    service = get_agent_service()
+    stored = service.candidatos.get(candidato_id)
+    if stored is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Candidato no registrado: {candidato_id}"
+        )
+    return stored.candidato
+
+
+@router.post("/ats/jobs", response_model=ATSJobCreated, status_code=status.HTTP_202_ACCEPTED)
+async def create_job(request: ATSJobRequest):
+    """
+    Encola un matching (individual o por lotes) y devuelve el id del job de inmediato
+    
+    El job se guarda en una cola SQLite durable y lo procesan workers en segundo
+    plano con reintentos y backoff exponencial. Sobrevive a reinicios: al volver
+    a arrancar, los workers continúan con los análisis pendientes. Consulta el
+    progreso y los resultados con `GET /ats/jobs/{job_id}`.
+    
+    Args:
+        request: Vacante (o vacante_id) y candidato(s) (o sus ids)
+        
+    Returns:
+        ATSJobCreated con el id del job
+    """
+    if not settings.jobs_enabled:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="La cola de jobs está desactivada (JOBS_ENABLED=False)"
+        )
+    
+    service = get_agent_service()
+    vacante = resolve_vacante(service, request)
+    if request.candidatos is not None or request.candidato_ids is not None:
+        kind = "batch"
+        candidatos = resolve_candidatos(service, request)
+    else:
+        kind = "match"
+        candidatos = [resolve_candidato(service, request)]
+    if len(candidatos) > settings.batch_max_candidates:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"El job excede el máximo de {settings.batch_max_candidates} candidatos"
+        )
+    
+    # El job guarda los datos completos para no depender de registros en memoria
+    job_id = await asyncio.to_thread(
+        get_job_queue().enqueue,
+        kind,
+        vacante.vacante.model_dump(mode="json"),
+        [
+            (c.candidato if isinstance(c, StoredCandidato) else c).model_dump(mode="json")
+            for c in candidatos
+        ],
+        {
+            "use_cache": request.use_cache,
+            "scoring_mode": request.scoring_mode.value if request.scoring_mode else None
+        }
+    )
+    if job_workers is not None:
+        job_workers.notify()
+    
+    logger.info(f"Job {job_id} encolado ({kind}, {len(candidatos)} análisis) para: {vacante.vacante.job_title}")
+    return ATSJobCreated(job_id=job_id, kind=kind, status="queued", total=len(candidatos))
+
+
+@router.get("/ats/jobs/{job_id}", response_model=ATSJobStatus)
+async def get_job(job_id: str):
+    """
+    Obtiene el estado, el progreso y los resultados terminados de un job
+    """
+    job = get_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Job no encontrado: {job_id}"
+        )
+    return job
+
+
+@router.get("/ats/cache/stats")
+async def get_cache_stats():
+    """
+    Obtiene las métricas de la caché de análisis (aciertos, fallos, tamaño) y
+    de la coalescencia de análisis idénticos en vuelo (llamadas ahorradas)
+    """
+    service = get_agent_service()
+    coalescing = service.single_flight.get_stats() if settings.coalesce_enabled else None
+    if service.cache is None:
+        return {"enabled": False, "coalescing": coalescing}
+    return {"enabled": True, **service.cache.get_stats(), "coalescing": coalescing}
+
+
+@router.post("/ats/cache/invalidate")
+async def invalidate_cache_entry(request: ATSMatchRequest):
+    """
+    Elimina de la caché el análisis de un par vacante/candidato concreto
+    """
+    service = get_agent_service()
+    return {
+        "invalidated": service.invalidate_cached_match(
+            resolve_vacante(service, request),
+            resolve_candidato(service, request)
+        )
+    }
+
+
+@router.delete("/ats/cache")
+async def clear_cache():
+    """
+    Vacía por completo la caché de análisis
+    """
+    service = get_agent_service()
+    if service.cache is None:
+        return {"cleared": 0}
+    return {"cleared": service.cache.clear()}
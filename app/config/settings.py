@@ -6,6 +6,27 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
+def available_cpus() -> int:
+    """
+    Núcleos disponibles para el proceso
+
+    Respeta la afinidad de CPU y, en contenedores, la cuota de cgroup v2
+    (cpu.max), que es lo que limita la CPU en plataformas como Railway.
+    """
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as handle:
+            quota, period = handle.read().split()[:2]
+        if quota != "max":
+            cpus = min(cpus, max(int(int(quota) / int(period)), 1))
+    except (OSError, ValueError):
+        pass
+    return max(cpus, 1)
+
+
 class Settings(BaseSettings):
     """Configuración de la aplicación"""
     
@@ -18,9 +39,138 @@ class Settings(BaseSettings):
     debug: bool = os.getenv("DEBUG", "False").lower() == "true"
     host: str = os.getenv("HOST", "0.0.0.0")
     port: int = int(os.getenv("PORT", "8000"))
+    timeout_keep_alive: int = int(os.getenv("TIMEOUT_KEEP_ALIVE", "75"))
+    
+    # Modo multi-worker: procesos uvicorn (0 = uno por núcleo disponible, hasta
+    # MAX_WORKERS). Con más de uno, la caché, las cuotas de Groq, las vacantes y
+    # los candidatos se comparten en SQLite dentro de SHARED_STATE_DIR
+    web_concurrency: int = int(os.getenv("WEB_CONCURRENCY", "0"))
+    max_workers: int = int(os.getenv("MAX_WORKERS", "8"))
+    shared_state_dir: str = os.getenv("SHARED_STATE_DIR", ".ats_state")
     
     # Configuración del modelo Groq
     groq_model: str = os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile")
+    groq_timeout_seconds: int = int(os.getenv("GROQ_TIMEOUT_SECONDS", "60"))
+    # URL base de la API de Groq (vacío = la oficial); los benchmarks la apuntan al servidor simulado
+    groq_base_url: str = os.getenv("GROQ_BASE_URL", "")
+    
+    # Pool HTTP keep-alive compartido por las llamadas al modelo y precalentamiento
+    # al arrancar (/ready responde 200 solo cuando termina)
+    http_max_connections: int = int(os.getenv("HTTP_MAX_CONNECTIONS", "64"))
+    http_max_keepalive_connections: int = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "16"))
+    http_keepalive_expiry_seconds: float = float(os.getenv("HTTP_KEEPALIVE_EXPIRY_SECONDS", "120"))
+    warmup_enabled: bool = os.getenv("WARMUP_ENABLED", "True").lower() == "true"
+    warmup_connections: int = int(os.getenv("WARMUP_CONNECTIONS", "2"))
+    
+    # Configuración de concurrencia
+    max_concurrent_matches: int = int(os.getenv("MAX_CONCURRENT_MATCHES", "8"))
+    
+    # Scheduler de llamadas a Groq: cuotas por minuto de la cuenta (0 = sin límite),
+    # salida esperada por análisis para estimar tokens y reintentos ante un 429
+    groq_rpm_limit: int = int(os.getenv("GROQ_RPM_LIMIT", "30"))
+    groq_tpm_limit: int = int(os.getenv("GROQ_TPM_LIMIT", "12000"))
+    groq_expected_output_tokens: int = int(os.getenv("GROQ_EXPECTED_OUTPUT_TOKENS", "700"))
+    groq_min_concurrency: int = int(os.getenv("GROQ_MIN_CONCURRENCY", "1"))
+    groq_rate_limit_retries: int = int(os.getenv("GROQ_RATE_LIMIT_RETRIES", "2"))
+    
+    # Plazo máximo de /ats/match y /ats/match/stream (0 = sin plazo); la cabecera
+    # X-Request-Timeout lo sustituye por petición hasta REQUEST_DEADLINE_MAX_SECONDS
+    request_deadline_seconds: float = float(os.getenv("REQUEST_DEADLINE_SECONDS", "30"))
+    request_deadline_max_seconds: float = float(os.getenv("REQUEST_DEADLINE_MAX_SECONDS", "120"))
+    
+    # Hedging: si una llamada al modelo supera el percentil HEDGE_PERCENTILE de las
+    # latencias recientes se lanza una segunda y gana la primera respuesta válida
+    hedge_enabled: bool = os.getenv("HEDGE_ENABLED", "False").lower() == "true"
+    hedge_percentile: float = float(os.getenv("HEDGE_PERCENTILE", "95"))
+    hedge_min_samples: int = int(os.getenv("HEDGE_MIN_SAMPLES", "50"))
+    hedge_min_delay_seconds: float = float(os.getenv("HEDGE_MIN_DELAY_SECONDS", "0.5"))
+    hedge_window: int = int(os.getenv("HEDGE_WINDOW", "500"))
+    
+    # Precio del modelo principal en USD por millón de tokens (métricas de coste)
+    groq_price_input_per_mtok: float = float(os.getenv("GROQ_PRICE_INPUT_PER_MTOK", "0.59"))
+    groq_price_output_per_mtok: float = float(os.getenv("GROQ_PRICE_OUTPUT_PER_MTOK", "0.79"))
+    
+    # Cascada de modelos: modelo pequeño con prompt compacto y escalado al
+    # principal cuando el score cae en la banda de incertidumbre
+    cascade_enabled: bool = os.getenv("CASCADE_ENABLED", "False").lower() == "true"
+    cascade_small_model: str = os.getenv("CASCADE_SMALL_MODEL", "llama-3.1-8b-instant")
+    cascade_band_low: float = float(os.getenv("CASCADE_BAND_LOW", "40"))
+    cascade_band_high: float = float(os.getenv("CASCADE_BAND_HIGH", "75"))
+    cascade_prompt_token_budget: int = int(os.getenv("CASCADE_PROMPT_TOKEN_BUDGET", "1500"))
+    cascade_cv_max_tokens: int = int(os.getenv("CASCADE_CV_MAX_TOKENS", "500"))
+    cascade_small_price_input_per_mtok: float = float(os.getenv("CASCADE_SMALL_PRICE_INPUT_PER_MTOK", "0.05"))
+    cascade_small_price_output_per_mtok: float = float(os.getenv("CASCADE_SMALL_PRICE_OUTPUT_PER_MTOK", "0.08"))
+    
+    # Configuración del matching por lotes
+    batch_default_parallelism: int = int(os.getenv("BATCH_DEFAULT_PARALLELISM", "4"))
+    batch_max_parallelism: int = int(os.getenv("BATCH_MAX_PARALLELISM", "16"))
+    batch_max_candidates: int = int(os.getenv("BATCH_MAX_CANDIDATES", "1000"))
+    # Subida de archivos de candidatos (CSV/JSONL) en streaming: filas y tamaño de fila máximos
+    upload_max_rows: int = int(os.getenv("UPLOAD_MAX_ROWS", "100000"))
+    upload_max_row_bytes: int = int(os.getenv("UPLOAD_MAX_ROW_BYTES", "262144"))
+    rank_max_candidates: int = int(os.getenv("RANK_MAX_CANDIDATES", "20000"))
+    rank_max_top_k: int = int(os.getenv("RANK_MAX_TOP_K", "100"))
+    
+    # Configuración de la caché de análisis
+    cache_enabled: bool = os.getenv("CACHE_ENABLED", "True").lower() == "true"
+    cache_max_entries: int = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+    cache_ttl_seconds: int = int(os.getenv("CACHE_TTL_SECONDS", "86400"))
+    cache_sqlite_path: str = os.getenv("CACHE_SQLITE_PATH", "")
+    # Vida máxima en la memoria de cada worker cuando la caché es compartida
+    # (acota cuánto tarda una invalidación en verse en los demás workers)
+    cache_memory_ttl_seconds: int = int(os.getenv("CACHE_MEMORY_TTL_SECONDS", "60"))
+    
+    # Coalescencia de análisis idénticos en vuelo (una sola llamada al modelo)
+    coalesce_enabled: bool = os.getenv("COALESCE_ENABLED", "True").lower() == "true"
+    
+    # Configuración de la capa de compliance local
+    compliance_gate_enabled: bool = os.getenv("COMPLIANCE_GATE_ENABLED", "True").lower() == "true"
+    compliance_gate_checks: str = os.getenv("COMPLIANCE_GATE_CHECKS", "has_work_permit,location_match,education_match")
+    compliance_location_aliases: str = os.getenv("COMPLIANCE_LOCATION_ALIASES", "")
+    compliance_education_levels: str = os.getenv("COMPLIANCE_EDUCATION_LEVELS", "")
+    
+    # Configuración del motor local de skills y del scoring local
+    skill_matcher_enabled: bool = os.getenv("SKILL_MATCHER_ENABLED", "True").lower() == "true"
+    skill_aliases: str = os.getenv("SKILL_ALIASES", "")
+    skill_hard_threshold: float = float(os.getenv("SKILL_HARD_THRESHOLD", "0.8"))
+    skill_soft_threshold: float = float(os.getenv("SKILL_SOFT_THRESHOLD", "0.65"))
+    default_scoring_mode: str = os.getenv("DEFAULT_SCORING_MODE", "llm")
+    local_approval_threshold: float = float(os.getenv("LOCAL_APPROVAL_THRESHOLD", "70"))
+    local_rejection_threshold: float = float(os.getenv("LOCAL_REJECTION_THRESHOLD", "40"))
+    
+    # Registro de vacantes precompiladas (SQLite opcional; vacío = solo memoria)
+    vacante_registry_max_entries: int = int(os.getenv("VACANTE_REGISTRY_MAX_ENTRIES", "4096"))
+    vacante_registry_path: str = os.getenv("VACANTE_REGISTRY_PATH", "")
+    
+    # Almacén de candidatos: perfiles en SQLite y matriz de features memory-mapped
+    # (vacío = dentro de SHARED_STATE_DIR; ":memory:" = en memoria, solo para desarrollo)
+    candidate_store_path: str = os.getenv("CANDIDATE_STORE_PATH", "")
+    candidate_features_path: str = os.getenv("CANDIDATE_FEATURES_PATH", "")
+    candidate_bulk_max: int = int(os.getenv("CANDIDATE_BULK_MAX", "5000"))
+    
+    # Cola de jobs durable (SQLite) y workers en proceso
+    jobs_enabled: bool = os.getenv("JOBS_ENABLED", "True").lower() == "true"
+    job_queue_path: str = os.getenv("JOB_QUEUE_PATH", "ats_jobs.db")
+    job_workers: int = int(os.getenv("JOB_WORKERS", "4"))
+    job_max_attempts: int = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+    job_backoff_seconds: float = float(os.getenv("JOB_BACKOFF_SECONDS", "2"))
+    job_backoff_max_seconds: float = float(os.getenv("JOB_BACKOFF_MAX_SECONDS", "60"))
+    job_lease_seconds: float = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+    job_poll_interval: float = float(os.getenv("JOB_POLL_INTERVAL", "0.5"))
+    
+    # Historial indexado de análisis (leaderboards por vacante); vacío = solo memoria
+    match_history_enabled: bool = os.getenv("MATCH_HISTORY_ENABLED", "True").lower() == "true"
+    match_history_path: str = os.getenv("MATCH_HISTORY_PATH", "ats_history.db")
+    # Análisis del historial que se recalculan y guardan por transacción al editar una vacante
+    rescore_batch_size: int = int(os.getenv("RESCORE_BATCH_SIZE", "500"))
+    
+    # Anonimización local del CV (PII y relleno) antes de construir el prompt
+    anonymizer_enabled: bool = os.getenv("ANONYMIZER_ENABLED", "True").lower() == "true"
+    anonymizer_cache_entries: int = int(os.getenv("ANONYMIZER_CACHE_ENTRIES", "4096"))
+    
+    # Presupuesto de tokens del payload por petición y máximo para el CV
+    prompt_token_budget: int = int(os.getenv("PROMPT_TOKEN_BUDGET", "2500"))
+    prompt_cv_max_tokens: int = int(os.getenv("PROMPT_CV_MAX_TOKENS", "1200"))
     
     # Configuración del sistema ATS
     ats_system_instructions: str = """
@@ -46,10 +196,84 @@ PRINCIPIOS OPERATIVOS:
         env_file = ".env"
         case_sensitive = False
     
+    def worker_count(self) -> int:
+        """
+        Número de procesos uvicorn que sirven la aplicación
+        
+        Es WEB_CONCURRENCY; sin él se asume un solo proceso, que es lo que
+        arranca `uvicorn main:app` o cualquier otro servidor ASGI. `python
+        main.py` fija WEB_CONCURRENCY antes de lanzar los workers (ver
+        launch_worker_count).
+        """
+        if self.debug or self.web_concurrency <= 0:
+            return 1
+        return self.web_concurrency
+    
+    def launch_worker_count(self) -> int:
+        """Procesos que lanza `python main.py`: WEB_CONCURRENCY o uno por núcleo disponible"""
+        if self.debug:
+            return 1
+        if self.web_concurrency > 0:
+            return self.web_concurrency
+        return max(min(available_cpus(), self.max_workers), 1)
+    
+    @property
+    def multi_worker(self) -> bool:
+        """True si el estado se comparte entre varios procesos"""
+        return self.worker_count() > 1
+    
+    def shared_state_path(self, configured: str, filename: str) -> str:
+        """
+        Ruta de un estado que deben compartir los workers
+        
+        Args:
+            configured: Ruta configurada explícitamente (tiene prioridad)
+            filename: Nombre del archivo dentro de SHARED_STATE_DIR
+        
+        Returns:
+            La ruta configurada; sin ella, una dentro de SHARED_STATE_DIR en modo
+            multi-worker o "" (solo memoria del proceso) con un único worker
+        """
+        if configured or not self.multi_worker:
+            return configured
+        os.makedirs(self.shared_state_dir, exist_ok=True)
+        return os.path.join(self.shared_state_dir, filename)
+    
+    def persistent_state_path(self, configured: str, filename: str) -> str:
+        """
+        Ruta de un estado que se conserva entre reinicios, con uno o varios workers
+        
+        Args:
+            configured: Ruta configurada explícitamente (":memory:" = solo memoria)
+            filename: Nombre del archivo dentro de SHARED_STATE_DIR
+        
+        Returns:
+            La ruta configurada, "" si se pidió ":memory:" o, por defecto, una
+            dentro de SHARED_STATE_DIR
+        """
+        if configured == ":memory:":
+            return ""
+        if configured:
+            return configured
+        os.makedirs(self.shared_state_dir, exist_ok=True)
+        return os.path.join(self.shared_state_dir, filename)
+    
     def validate_settings(self):
         """Valida que las configuraciones críticas estén presentes"""
         if not self.groq_api_key:
             raise ValueError("GROQ_API_KEY no está configurada en el archivo .env")
+        if self.max_concurrent_matches < 1:
+            raise ValueError("MAX_CONCURRENT_MATCHES debe ser mayor o igual a 1")
+        if self.batch_default_parallelism < 1 or self.batch_max_parallelism < 1:
+            raise ValueError("El paralelismo de lotes debe ser mayor o igual a 1")
+        if self.job_workers < 1 or self.job_max_attempts < 1:
+            raise ValueError("JOB_WORKERS y JOB_MAX_ATTEMPTS deben ser mayores o iguales a 1")
+        if self.cascade_band_low > self.cascade_band_high:
+            raise ValueError("CASCADE_BAND_LOW no puede ser mayor que CASCADE_BAND_HIGH")
+        if self.web_concurrency < 0 or self.max_workers < 1:
+            raise ValueError("WEB_CONCURRENCY no puede ser negativo y MAX_WORKERS debe ser mayor o igual a 1")
+        if self.default_scoring_mode not in ("llm", "local"):
+            raise ValueError("DEFAULT_SCORING_MODE debe ser 'llm' o 'local'")
 
 
 settings = Settings()
@@ -1,19 +1,49 @@
 from .schemas import (
     ATSMatchRequest, 
     ATSMatchResponse, 
+    ATSBatchMatchRequest,
+    ATSBatchMatchItem,
+    ATSRankRequest,
+    ATSRankResponse,
+    RankedCandidate,
+    LeaderboardEntry,
+    VacanteLeaderboardResponse,
+    VacanteRescoreResponse,
     HealthResponse,
     VacanteData,
     CandidatoData,
     SkillAnalysis,
-    MatchStatus
+    MatchStatus,
+    ProcessingInfo,
+    ScoringMode,
+    VacanteReference,
+    ATSJobRequest,
+    ATSJobCreated,
+    ATSJobStatus,
+    VacanteRegistrationResponse
 )
 
 __all__ = [
     "ATSMatchRequest", 
     "ATSMatchResponse", 
+    "ATSBatchMatchRequest",
+    "ATSBatchMatchItem",
+    "ATSRankRequest",
+    "ATSRankResponse",
+    "RankedCandidate",
+    "LeaderboardEntry",
+    "VacanteLeaderboardResponse",
+    "VacanteRescoreResponse",
     "HealthResponse",
     "VacanteData",
     "CandidatoData",
     "SkillAnalysis",
-    "MatchStatus"
+    "MatchStatus",
+    "ProcessingInfo",
+    "ScoringMode",
+    "VacanteReference",
+    "ATSJobRequest",
+    "ATSJobCreated",
+    "ATSJobStatus",
+    "VacanteRegistrationResponse"
 ]
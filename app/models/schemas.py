@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from typing import Optional, Dict, Any, List
 from enum import Enum
 
@@ -10,6 +10,18 @@ class MatchStatus(str, Enum):
     PENDIENTE = "PENDIENTE"
 
 
+class ScoringMode(str, Enum):
+    """Modos de cálculo del matching"""
+    LLM = "llm"
+    LOCAL = "local"
+
+
+class UploadFormat(str, Enum):
+    """Formatos de archivo de candidatos aceptados por /ats/match/upload"""
+    CSV = "csv"
+    JSONL = "jsonl"
+
+
 class VacanteData(BaseModel):
     """Modelo para los datos de la vacante"""
     
@@ -70,11 +82,30 @@ class CandidatoData(BaseModel):
         }
 
 
-class ATSMatchRequest(BaseModel):
+class VacanteReference(BaseModel):
+    """Vacante completa o id de una vacante registrada con POST /vacantes (exactamente uno)"""
+    
+    vacante: Optional[VacanteData] = Field(None, description="Datos de la vacante")
+    vacante_id: Optional[str] = Field(None, description="Id devuelto por POST /vacantes")
+    
+    @model_validator(mode="after")
+    def check_vacante_reference(self):
+        if (self.vacante is None) == (self.vacante_id is None):
+            raise ValueError("Se debe indicar exactamente uno de 'vacante' o 'vacante_id'")
+        return self
+
+
+class ATSMatchRequest(VacanteReference):
     """Modelo para la petición del matching ATS"""
     
-    vacante: VacanteData = Field(..., description="Datos de la vacante")
-    candidato: CandidatoData = Field(..., description="Datos del candidato")
+    candidato: Optional[CandidatoData] = Field(None, description="Datos del candidato")
+    candidato_id: Optional[str] = Field(None, description="Id devuelto por POST /candidatos")
+    
+    @model_validator(mode="after")
+    def check_candidato_reference(self):
+        if (self.candidato is None) == (self.candidato_id is None):
+            raise ValueError("Se debe indicar exactamente uno de 'candidato' o 'candidato_id'")
+        return self
     
     class Config:
         json_schema_extra = {
@@ -105,6 +136,119 @@ class ATSMatchRequest(BaseModel):
         }
 
 
+class ATSBatchMatchRequest(VacanteReference):
+    """Modelo para la petición de matching por lotes (una vacante, muchos candidatos)"""
+    
+    candidatos: Optional[List[CandidatoData]] = Field(None, min_length=1, description="Lista de candidatos a evaluar")
+    candidato_ids: Optional[List[str]] = Field(None, min_length=1, description="Ids devueltos por POST /candidatos (en lugar de candidatos)")
+    parallelism: Optional[int] = Field(None, ge=1, description="Número de análisis simultáneos (limitado por el servidor)")
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "vacante": ATSMatchRequest.Config.json_schema_extra["example"]["vacante"],
+                "candidatos": [ATSMatchRequest.Config.json_schema_extra["example"]["candidato"]],
+                "parallelism": 4
+            }
+        }
+    
+    @model_validator(mode="after")
+    def check_candidatos_reference(self):
+        if (self.candidatos is None) == (self.candidato_ids is None):
+            raise ValueError("Se debe indicar exactamente uno de 'candidatos' o 'candidato_ids'")
+        return self
+    
+    @property
+    def pool_size(self) -> int:
+        """Número de candidatos de la petición"""
+        return len(self.candidatos if self.candidatos is not None else self.candidato_ids)
+
+
+class ATSRankRequest(VacanteReference):
+    """Modelo para la petición de ranking Top-K de un pool de candidatos"""
+    
+    candidatos: Optional[List[CandidatoData]] = Field(None, min_length=1, description="Pool de candidatos a rankear")
+    candidato_ids: Optional[List[str]] = Field(None, min_length=1, description="Ids devueltos por POST /candidatos (en lugar de candidatos)")
+    top_k: int = Field(10, ge=1, description="Candidatos que pasan al análisis completo con el modelo")
+    min_prefilter_score: float = Field(0.0, ge=0, le=100, description="Score mínimo (exclusivo) del pre-filtro para entrar en el Top-K")
+    parallelism: Optional[int] = Field(None, ge=1, description="Número de análisis simultáneos (limitado por el servidor)")
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "vacante": ATSMatchRequest.Config.json_schema_extra["example"]["vacante"],
+                "candidatos": [ATSMatchRequest.Config.json_schema_extra["example"]["candidato"]],
+                "top_k": 10,
+                "min_prefilter_score": 0.0
+            }
+        }
+    
+    @model_validator(mode="after")
+    def check_candidatos_reference(self):
+        if (self.candidatos is None) == (self.candidato_ids is None):
+            raise ValueError("Se debe indicar exactamente uno de 'candidatos' o 'candidato_ids'")
+        return self
+    
+    @property
+    def pool_size(self) -> int:
+        """Número de candidatos de la petición"""
+        return len(self.candidatos if self.candidatos is not None else self.candidato_ids)
+
+
+class VacanteRegistrationResponse(BaseModel):
+    """Modelo para la respuesta del registro de una vacante"""
+    
+    vacante_id: str = Field(..., description="Id de la vacante para usar como vacante_id")
+    created: bool = Field(..., description="False si la misma vacante ya estaba registrada")
+    job_title: str = Field(..., description="Título del puesto")
+    canonical_hard_skills: List[str] = Field(..., description="Hard skills normalizadas a su forma canónica")
+    canonical_soft_skills: List[str] = Field(..., description="Soft skills normalizadas a su forma canónica")
+    prompt_section_tokens: int = Field(..., description="Tokens estimados de la sección de la vacante en el prompt")
+
+
+class CandidatoRegistrationResponse(BaseModel):
+    """Modelo para la respuesta del registro de un candidato"""
+    
+    candidato_id: str = Field(..., description="Id del candidato para usar como candidato_id")
+    created: bool = Field(..., description="False si el mismo candidato ya estaba registrado")
+    canonical_skills: List[str] = Field(..., description="Habilidades normalizadas a su forma canónica")
+
+
+class CandidatoBulkRegistrationResponse(BaseModel):
+    """Modelo para la respuesta del registro de varios candidatos"""
+    
+    candidato_ids: List[str] = Field(..., description="Id de cada candidato, en el orden de la petición")
+    created: int = Field(..., description="Candidatos que no estaban registrados")
+    total_stored: int = Field(..., description="Candidatos en el almacén tras el registro")
+
+
+class ATSJobRequest(VacanteReference):
+    """Modelo para encolar un matching (individual o por lotes) en la cola de jobs"""
+    
+    candidato: Optional[CandidatoData] = Field(None, description="Datos del candidato (job individual)")
+    candidato_id: Optional[str] = Field(None, description="Id de un candidato almacenado (job individual)")
+    candidatos: Optional[List[CandidatoData]] = Field(None, min_length=1, description="Lista de candidatos (job por lotes)")
+    candidato_ids: Optional[List[str]] = Field(None, min_length=1, description="Ids de candidatos almacenados (job por lotes)")
+    use_cache: bool = Field(True, description="Consultar y actualizar la caché de análisis")
+    scoring_mode: Optional[ScoringMode] = Field(None, description="llm (análisis con modelo) o local (solo motor local)")
+    
+    @model_validator(mode="after")
+    def check_candidatos_reference(self):
+        given = [self.candidato, self.candidato_id, self.candidatos, self.candidato_ids]
+        if sum(value is not None for value in given) != 1:
+            raise ValueError("Se debe indicar exactamente uno de 'candidato', 'candidato_id', 'candidatos' o 'candidato_ids'")
+        return self
+
+
+class ATSJobCreated(BaseModel):
+    """Modelo para la respuesta al encolar un job"""
+    
+    job_id: str = Field(..., description="Id para consultar el job en GET /ats/jobs/{job_id}")
+    kind: str = Field(..., description="match (un candidato) o batch (varios)")
+    status: str = Field(..., description="Estado inicial del job")
+    total: int = Field(..., description="Número de análisis del job")
+
+
 class SkillAnalysis(BaseModel):
     """Análisis de habilidades"""
     hard_skills_score: float = Field(..., description="Score de habilidades técnicas (0-100)")
@@ -113,6 +257,27 @@ class SkillAnalysis(BaseModel):
     missing_skills: List[str] = Field(..., description="Habilidades faltantes")
 
 
+class ProcessingInfo(BaseModel):
+    """Metadatos sobre cómo se obtuvo el análisis"""
+    source: str = Field(..., description="Origen del análisis: llm, cache, compliance, local o rescore")
+    prompt_tokens: Optional[int] = Field(None, description="Tokens estimados del prompt (prefijo estático + payload)")
+    payload_tokens: Optional[int] = Field(None, description="Tokens estimados del payload específico de la petición")
+    cv_tokens_removed: Optional[int] = Field(None, description="Tokens del CV eliminados por la compresión extractiva")
+    pii_redactions: Optional[int] = Field(None, description="Datos personales sustituidos por marcadores antes de enviar el prompt")
+    anonymized_chars_removed: Optional[int] = Field(None, description="Caracteres eliminados por la anonimización y normalización del CV")
+    anonymized_tokens_removed: Optional[int] = Field(None, description="Tokens estimados eliminados por la anonimización y normalización del CV")
+    input_tokens: Optional[int] = Field(None, description="Tokens de entrada reportados por el proveedor")
+    output_tokens: Optional[int] = Field(None, description="Tokens de salida reportados por el proveedor")
+    latency_ms: Optional[float] = Field(None, description="Latencia de la llamada al modelo en milisegundos")
+    parse_status: Optional[str] = Field(None, description="Extracción del JSON del modelo: ok, repaired o failed")
+    coalesced: Optional[bool] = Field(None, description="True si se reutilizó un análisis idéntico que ya estaba en curso")
+    hedge: Optional[str] = Field(None, description="Si se lanzó una llamada de cobertura, cuál respondió antes: primary o hedge")
+    tier: Optional[str] = Field(None, description="Nivel de la cascada que decidió el análisis: small o large")
+    escalation_reason: Optional[str] = Field(None, description="Motivo del escalado al modelo grande: uncertain_score o parse_failed")
+    rescored_components: Optional[List[str]] = Field(None, description="Componentes recalculados al editar la vacante: skills, experience o compliance")
+    narrative_stale: Optional[bool] = Field(None, description="True si resumen y recomendaciones son de la versión anterior de la vacante")
+
+
 class ATSMatchResponse(BaseModel):
     """Modelo para la respuesta del matching ATS"""
     
@@ -124,6 +289,7 @@ class ATSMatchResponse(BaseModel):
     recommendations: List[str] = Field(..., description="Recomendaciones para el candidato")
     summary: str = Field(..., description="Resumen ejecutivo del análisis")
     detailed_analysis: str = Field(..., description="Análisis detallado completo")
+    processing: Optional[ProcessingInfo] = Field(None, description="Metadatos del procesamiento")
     
     class Config:
         json_schema_extra = {
@@ -152,6 +318,90 @@ class ATSMatchResponse(BaseModel):
         }
 
 
+class ATSBatchMatchItem(BaseModel):
+    """Resultado individual emitido (una línea NDJSON) por el matching por lotes"""
+    
+    index: int = Field(..., description="Posición del candidato en la lista de la petición")
+    result: Optional[ATSMatchResponse] = Field(None, description="Análisis del matching si se completó")
+    error: Optional[str] = Field(None, description="Mensaje de error si el análisis falló")
+
+
+class ATSUploadMatchItem(ATSBatchMatchItem):
+    """Resultado de una fila (una línea JSONL) del matching de un archivo de candidatos"""
+    
+    index: int = Field(..., description="Posición de la fila de datos en el archivo (desde 0)")
+    line: int = Field(..., description="Línea del archivo donde empieza la fila")
+
+
+class ATSJobStatus(BaseModel):
+    """Modelo para el estado, progreso y resultados de un job"""
+    
+    job_id: str = Field(..., description="Id del job")
+    kind: str = Field(..., description="match (un candidato) o batch (varios)")
+    status: str = Field(..., description="queued, running, completed, completed_with_errors o failed")
+    total: int = Field(..., description="Número de análisis del job")
+    completed: int = Field(..., description="Análisis terminados correctamente")
+    failed: int = Field(..., description="Análisis que agotaron los reintentos")
+    pending: int = Field(..., description="Análisis en cola o en curso")
+    progress: float = Field(..., description="Fracción terminada (0-1)")
+    created_at: float = Field(..., description="Fecha de creación (epoch)")
+    updated_at: float = Field(..., description="Última actualización (epoch)")
+    results: List[ATSBatchMatchItem] = Field(..., description="Resultados terminados, por posición del candidato")
+
+
+class RankedCandidate(BaseModel):
+    """Candidato del Top-K con su score de pre-filtro y su análisis completo"""
+    
+    index: int = Field(..., description="Posición del candidato en la lista de la petición")
+    rank: int = Field(..., description="Posición en el ranking final (1 = mejor)")
+    prefilter_score: float = Field(..., description="Score local del pre-filtro (0-100)")
+    analysis: Optional[ATSMatchResponse] = Field(None, description="Análisis completo del matching")
+    error: Optional[str] = Field(None, description="Mensaje de error si el análisis falló")
+
+
+class ATSRankResponse(BaseModel):
+    """Modelo para la respuesta del ranking Top-K"""
+    
+    total_candidates: int = Field(..., description="Tamaño del pool evaluado por el pre-filtro")
+    shortlisted: int = Field(..., description="Candidatos enviados al análisis completo")
+    ranking: List[RankedCandidate] = Field(..., description="Top-K ordenado por match_score final")
+
+
+class LeaderboardEntry(BaseModel):
+    """Candidato del leaderboard de una vacante con su último análisis"""
+    
+    rank: int = Field(..., description="Posición en el leaderboard (1 = mejor match_score)")
+    candidato_id: str = Field(..., description="Id del candidato (el mismo del almacén de candidatos)")
+    match_score: float = Field(..., description="Score de afinidad (0-100)")
+    status: MatchStatus = Field(..., description="Estado del matching")
+    source: str = Field(..., description="Origen del análisis: llm, cache, compliance, local o rescore")
+    narrative_stale: bool = Field(..., description="True si el análisis se recalculó tras editar la vacante y conserva la narrativa anterior")
+    analyzed_at: float = Field(..., description="Fecha del análisis (epoch)")
+    analysis: ATSMatchResponse = Field(..., description="Análisis completo del matching")
+
+
+class VacanteLeaderboardResponse(BaseModel):
+    """Modelo para la respuesta del leaderboard de una vacante"""
+    
+    vacante_id: str = Field(..., description="Id de la vacante")
+    total: int = Field(..., description="Análisis que cumplen los filtros")
+    limit: int = Field(..., description="Tamaño de la página")
+    offset: int = Field(..., description="Análisis saltados antes de la página")
+    entries: List[LeaderboardEntry] = Field(..., description="Página ordenada por match_score (mayor primero)")
+
+
+class VacanteRescoreResponse(BaseModel):
+    """Modelo para la respuesta de la edición de una vacante con re-scoring incremental"""
+    
+    previous_vacante_id: str = Field(..., description="Id de la vacante antes de la edición")
+    vacante_id: str = Field(..., description="Id de la vacante editada (depende de su contenido)")
+    changed_fields: List[str] = Field(..., description="Campos de la vacante que cambiaron")
+    rescored_components: List[str] = Field(..., description="Componentes recalculados: skills, experience o compliance")
+    rescored: int = Field(..., description="Análisis del historial recalculados sin llamar al modelo")
+    status_changes: int = Field(..., description="Análisis cuyo estado cambió tras la edición")
+    duration_ms: float = Field(..., description="Duración del re-scoring en milisegundos")
+
+
 class HealthResponse(BaseModel):
     """Modelo para el endpoint de health check"""
     
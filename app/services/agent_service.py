@@ -1,11 +1,57 @@
-import json
+import asyncio
+import logging
+import math
 import os
-from typing import Dict, Any
+import sqlite3
+import time
+from typing import Dict, Any, AsyncIterator, Hashable, List, Optional, Sequence, Set, Tuple, Union
+import httpx
+import numpy as np
 from agno.agent import Agent
 from agno.models.groq import Groq
+from agno.run.agent import RunEvent
 from agno.tools.models.groq import GroqTools
 from app.config import settings
-from app.models.schemas import VacanteData, CandidatoData
+from app.models.schemas import ATSMatchRequest, VacanteData, CandidatoData, ScoringMode
+from app.services.candidate_index import CandidateIndex
+from app.services.candidate_store import CANDIDATO_ID_LENGTH, CandidateStore, StoredCandidato
+from app.services.analysis_parser import AnalysisParser
+from app.services.anonymizer import CVAnonymizer
+from app.services.compliance import ComplianceEngine
+from app.services.deadlines import Deadline, DeadlineExceeded
+from app.services.hedging import HedgePolicy
+from app.services.job_queue import JobItem
+from app.services.match_cache import MatchCache, fingerprint_candidato, match_cache_key
+from app.services.match_history import MatchHistory
+from app.services.metrics import ANALYSIS_SOURCES, LLM_CALLS, LLM_TOKENS, PARSE_RESULTS, Sample, record_stage, stage
+from app.services.model_cascade import TIER_LARGE, TIER_SMALL, CascadeStats, ModelTier, escalation_reason
+from app.services.prompt_builder import PromptBuilder, PromptStats
+from app.services.rate_limiter import (
+    OUTCOME_CANCELLED,
+    OUTCOME_ERROR,
+    OUTCOME_OK,
+    OUTCOME_RATE_LIMITED,
+    Priority,
+    RateLimitExceeded,
+    RateLimitScheduler,
+    SharedQuota,
+    Ticket,
+    rate_limit_retry_after
+)
+from app.services.rescoring import affected_components, changed_fields, rescore_analysis
+from app.services.scoring import local_analysis
+from app.services.single_flight import SingleFlight
+from app.services.skill_matcher import SkillMatcher, SkillMatchResult
+from app.services.vacante_registry import CompiledVacante, VacanteRegistry
+
+logger = logging.getLogger(__name__)
+
+# Una vacante puede llegar completa o ya compilada desde el registro
+VacanteInput = Union[VacanteData, CompiledVacante]
+# Clave con la que un flujo identifica a cada candidato (p. ej. su posición)
+RowKey = Hashable
+# Un candidato puede llegar completo o ya procesado desde el almacén
+CandidatoInput = Union[CandidatoData, StoredCandidato]
 
 
 class AgentService:
@@ -18,180 +64,1239 @@ class AgentService:
         # Configurar la API key de Groq como variable de entorno
         os.environ["GROQ_API_KEY"] = settings.groq_api_key
         
+        # Motor local de skills: calcula skill_analysis sin depender del modelo
+        # (también canonicaliza habilidades para el índice de ranking)
+        self.skill_matcher = SkillMatcher.from_settings(settings)
+        
+        # Prompt en dos partes: prefijo estático (instrucciones) + payload por petición
+        self.prompt_builder = PromptBuilder(
+            self.skill_matcher,
+            token_budget=settings.prompt_token_budget,
+            cv_max_tokens=settings.prompt_cv_max_tokens
+        )
+        
+        # Anonimización y normalización local del CV antes de construir el prompt
+        self.anonymizer: Optional[CVAnonymizer] = None
+        if settings.anonymizer_enabled:
+            self.anonymizer = CVAnonymizer(
+                max_entries=settings.anonymizer_cache_entries,
+                is_skill=self.skill_matcher.is_known
+            )
+        
+        # Pool HTTP keep-alive compartido por todas las llamadas al modelo (todos
+        # los niveles de la cascada): evita abrir una conexión TLS por petición
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.http_max_connections,
+                max_keepalive_connections=settings.http_max_keepalive_connections,
+                keepalive_expiry=settings.http_keepalive_expiry_seconds
+            )
+        )
+        
         # Crear el agente con el modelo de Groq especificado
         self.agent = Agent(
-            model=Groq(id=settings.groq_model),
-            instructions=[settings.ats_system_instructions],
+            model=self._groq_model(settings.groq_model),
+            instructions=[settings.ats_system_instructions, self.prompt_builder.static_prefix],
             tools=[GroqTools()],
             markdown=False
         )
+        
+        # Scheduler delante del agente: cuotas RPM/TPM de Groq, concurrencia
+        # adaptativa (hasta MAX_CONCURRENT_MATCHES) y prioridades
+        self.scheduler = self._scheduler(settings.groq_model)
+        
+        # Cascada de modelos: el modelo pequeño (prompt compacto) resuelve los casos
+        # claros y solo se escala al grande dentro de la banda de incertidumbre
+        self.tiers: Dict[str, ModelTier] = {
+            TIER_LARGE: ModelTier(
+                TIER_LARGE,
+                settings.groq_model,
+                self.agent,
+                self.scheduler,
+                self.prompt_builder,
+                settings.groq_price_input_per_mtok,
+                settings.groq_price_output_per_mtok
+            )
+        }
+        self.cascade: Optional[CascadeStats] = None
+        self._cache_model = settings.groq_model
+        if settings.cascade_enabled:
+            self.tiers[TIER_SMALL] = ModelTier(
+                TIER_SMALL,
+                settings.cascade_small_model,
+                Agent(
+                    model=self._groq_model(settings.cascade_small_model),
+                    instructions=[settings.ats_system_instructions, self.prompt_builder.static_prefix],
+                    tools=[GroqTools()],
+                    markdown=False
+                ),
+                # Groq aplica las cuotas RPM/TPM por modelo
+                self._scheduler(settings.cascade_small_model),
+                PromptBuilder(
+                    self.skill_matcher,
+                    token_budget=settings.cascade_prompt_token_budget,
+                    cv_max_tokens=settings.cascade_cv_max_tokens
+                ),
+                settings.cascade_small_price_input_per_mtok,
+                settings.cascade_small_price_output_per_mtok
+            )
+            self.cascade = CascadeStats([TIER_SMALL, TIER_LARGE])
+            # Los análisis de la cascada no se mezclan en caché con los del modelo grande solo
+            self._cache_model = (
+                f"{settings.cascade_small_model}>{settings.groq_model}"
+                f"@{settings.cascade_band_low:g}-{settings.cascade_band_high:g}"
+            )
+        
+        # Peticiones idénticas en vuelo comparten una única llamada al modelo
+        self.single_flight = SingleFlight()
+        
+        # Llamadas de cobertura ante latencias en la cola lenta (None si está desactivado)
+        self.hedging: Optional[HedgePolicy] = None
+        if settings.hedge_enabled:
+            self.hedging = HedgePolicy(
+                settings.hedge_percentile,
+                settings.hedge_min_samples,
+                settings.hedge_min_delay_seconds,
+                settings.hedge_window
+            )
+        
+        # Caché de análisis por contenido (None si está desactivada)
+        self.cache: Optional[MatchCache] = None
+        if settings.cache_enabled:
+            self.cache = MatchCache(
+                max_entries=settings.cache_max_entries,
+                ttl_seconds=settings.cache_ttl_seconds,
+                sqlite_path=settings.shared_state_path(settings.cache_sqlite_path, "match_cache.db"),
+                memory_ttl_seconds=settings.cache_memory_ttl_seconds if settings.multi_worker else None
+            )
+        
+        # Filtro excluyente local: evita llamar al modelo para rechazos evidentes
+        self.compliance = ComplianceEngine.from_settings(settings)
+        
+        # Vacantes registradas con sus artefactos de matching precalculados
+        self.vacantes = VacanteRegistry(
+            self.skill_matcher,
+            self.compliance,
+            self.prompt_builder,
+            max_entries=settings.vacante_registry_max_entries,
+            sqlite_path=settings.shared_state_path(settings.vacante_registry_path, "vacantes.db")
+        )
+        
+        # Perfiles de candidatos persistidos con sus features precalculadas
+        self.candidatos = CandidateStore(
+            self.skill_matcher,
+            self.compliance,
+            sqlite_path=settings.persistent_state_path(settings.candidate_store_path, "candidatos.db"),
+            features_path=settings.persistent_state_path(settings.candidate_features_path, "candidatos.features")
+        )
+        
+        # Historial indexado de análisis para los leaderboards por vacante
+        self.history: Optional[MatchHistory] = None
+        if settings.match_history_enabled:
+            self.history = MatchHistory(self.skill_matcher.canonicalize, settings.match_history_path)
     
-    def build_ats_prompt(self, vacante: VacanteData, candidato: CandidatoData) -> str:
+    async def awarm_up(self) -> Dict[str, Any]:
+        """
+        Precalienta el servicio antes de recibir tráfico
+        
+        - Rutas locales: compila la vacante de ejemplo y ejecuta el motor de
+          skills, el compliance y el constructor de prompts de cada nivel.
+        - Conexión: lista los modelos de Groq por el pool compartido, lo que
+          abre WARMUP_CONNECTIONS conexiones TLS keep-alive (y valida la API
+          key) sin consumir tokens.
+        
+        Returns:
+            Diccionario con el resultado (ok, duración de cada fase y error si lo hubo)
         """
-        Construye el prompt del Simulador ATS con análisis semántico
+        started = time.perf_counter()
+        example = ATSMatchRequest.Config.json_schema_extra["example"]
+        compiled = self._compiled(VacanteData(**example["vacante"]))
+        candidato = CandidatoData(**example["candidato"])
+        skill_match = self.skill_matcher.match(compiled.vacante, candidato, compiled.skills)
+        self.compliance.evaluate(compiled.vacante, candidato, compiled.compliance)
+        for tier in self.tiers.values():
+            self._build_prompt(compiled, candidato, skill_match, tier.prompt_builder)
+        local_ms = (time.perf_counter() - started) * 1000
+        
+        result: Dict[str, Any] = {"ok": True, "local_ms": round(local_ms, 1), "connections": 0, "error": None}
+        started = time.perf_counter()
+        client = self.agent.model.get_async_client()
+        outcomes = await asyncio.gather(
+            *[client.models.list() for _ in range(max(settings.warmup_connections, 1))],
+            return_exceptions=True
+        )
+        errors = [outcome for outcome in outcomes if isinstance(outcome, BaseException)]
+        result["connections"] = len(outcomes) - len(errors)
+        result["connect_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        if errors:
+            result["ok"] = False
+            result["error"] = str(errors[0])
+            logger.warning(f"Warm-up: no se pudo contactar con Groq: {errors[0]}")
+        logger.info(
+            f"Warm-up completado: rutas locales {result['local_ms']} ms, "
+            f"{result['connections']} conexiones en {result['connect_ms']} ms"
+        )
+        return result
+    
+    async def aclose(self) -> None:
+        """Cierra el pool HTTP compartido"""
+        await self.http_client.aclose()
+    
+    def build_ats_prompt(
+        self,
+        vacante: VacanteInput,
+        candidato: CandidatoData,
+        skill_match: Optional[SkillMatchResult] = None
+    ) -> str:
+        """
+        Construye el mensaje del Simulador ATS para una petición
+        
+        Las instrucciones del algoritmo y el formato de respuesta forman parte
+        del prefijo estático registrado en el agente (ver PromptBuilder); este
+        mensaje solo contiene el payload compacto de la vacante y el candidato.
         
         Args:
-            vacante: Datos de la vacante
+            vacante: Datos de la vacante o vacante registrada (CompiledVacante)
             candidato: Datos del candidato
+            skill_match: Sección de habilidades precalculada por el motor local (opcional)
             
         Returns:
-            Prompt estructurado para el análisis ATS
+            Payload JSON para el análisis ATS
         """
-        
-        prompt = f"""
-## SIMULADOR DE ATS - ANÁLISIS DE MATCHING
-
-### ROL DEL SISTEMA:
-Actúa como un Sistema Experto de Reclutamiento IA con arquitectura de procesamiento de lenguaje natural (NLP).
-Tu función es realizar un matching objetivo entre una vacante y un perfil, simulando un pipeline de datos heterogéneos.
-
-### INSTRUCCIONES DEL ALGORITMO (Paso a Paso):
-
-#### 1. INGESTA Y PRE-PROCESAMIENTO (Simulado):
-- Recibirás dos conjuntos de datos: "VACANTE" y "CANDIDATO"
-- **Anonimización**: Ignora cualquier dato PII (Nombre, Género, Edad, Foto) para cumplir con normativa de No Discriminación
-- **Evalúa solo méritos profesionales y técnicos**
-
-#### 2. CAPA DE COMPLIANCE (Filtro Excluyente):
-**REGLA CRÍTICA**: Si un requisito legal/excluyente NO se cumple, el match_score debe ser automáticamente 0% y estado RECHAZADO.
-Verifica:
-- Permiso de trabajo: {'✓ Requerido' if vacante.work_permit_required else '✗ No requerido'}
-- Ubicación requerida: {vacante.location_required or 'No especificada'}
-- Educación mínima: {vacante.education or 'No especificada'}
-
-#### 3. MOTOR DE MATCHING (Análisis Vectorial Simulado):
-**NO uses búsqueda exacta de palabras clave**. Usa análisis semántico:
-- "React" = "ReactJS" = "Frontend con librerías modernas JS"
-- "Python" = "Desarrollo en lenguajes de scripting" = "Backend con Python/Django"
-
-**Compara:**
-- **Hard Skills** (50%): Tecnologías, herramientas, idiomas técnicos
-- **Experiencia** (30%): Años y relevancia del sector
-- **Soft Skills/Culture Fit** (20%): Liderazgo, comunicación (inferidas del texto)
-
-#### 4. GENERACIÓN DE OUTPUT:
-Calcula un Score de Afinidad (0-100) y genera análisis JSON estructurado.
-
----
-
-### DATOS DE LA VACANTE:
-```json
-{{
-    "puesto": "{vacante.job_title}",
-    "descripcion": "{vacante.job_description}",
-    "hard_skills_requeridas": {json.dumps(vacante.hard_skills, ensure_ascii=False)},
-    "soft_skills_deseadas": {json.dumps(vacante.soft_skills or [], ensure_ascii=False)},
-    "años_experiencia": {vacante.years_experience},
-    "educacion": "{vacante.education or 'No especificada'}",
-    "idiomas": {json.dumps(vacante.languages or [], ensure_ascii=False)},
-    "ubicacion_requerida": "{vacante.location_required or 'Flexible'}",
-    "permiso_trabajo_requerido": {str(vacante.work_permit_required).lower()},
-    "sector": "{vacante.sector or 'General'}"
-}}
-```
-
-### DATOS DEL CANDIDATO:
-```json
-{{
-    "cv_completo": "{candidato.cv_text}",
-    "habilidades": {json.dumps(candidato.skills, ensure_ascii=False)},
-    "años_experiencia": {candidato.years_experience},
-    "educacion": "{candidato.education}",
-    "idiomas": {json.dumps(candidato.languages, ensure_ascii=False)},
-    "ubicacion_actual": "{candidato.location}",
-    "tiene_permiso_trabajo": {str(candidato.has_work_permit).lower()},
-    "experiencia_sector": "{candidato.sector_experience or 'No especificada'}",
-    "info_adicional": "{candidato.additional_info or 'N/A'}"
-}}
-```
-
----
-
-### FORMATO DE RESPUESTA REQUERIDO:
-Debes responder EXCLUSIVAMENTE con un objeto JSON válido con esta estructura:
-
-{{
-    "match_score": <float 0-100>,
-    "status": "<APROBADO|RECHAZADO|PENDIENTE>",
-    "skill_analysis": {{
-        "hard_skills_score": <float 0-100>,
-        "soft_skills_score": <float 0-100>,
-        "matched_skills": ["skill1", "skill2", ...],
-        "missing_skills": ["skill1", "skill2", ...]
-    }},
-    "experience_score": <float 0-100>,
-    "compliance_check": {{
-        "has_work_permit": <true|false>,
-        "location_match": <true|false>,
-        "education_match": <true|false>
-    }},
-    "recommendations": ["recomendación 1", "recomendación 2", ...],
-    "summary": "Resumen ejecutivo en 2-3 líneas",
-    "detailed_analysis": "Análisis detallado completo del matching"
-}}
-
-**IMPORTANTE**: 
-- Si compliance_check falla en algún punto crítico, match_score debe ser 0 y status debe ser RECHAZADO
-- Usa análisis semántico, no matching exacto de palabras
-- Sé objetivo y profesional en el análisis
-"""
+        prompt, _ = self._build_prompt(self._compiled(vacante), candidato, skill_match)
         return prompt
     
-    def process_ats_matching(self, vacante: VacanteData, candidato: CandidatoData) -> Dict[str, Any]:
+    async def aprocess_ats_matching(
+        self,
+        vacante: VacanteInput,
+        candidato: CandidatoInput,
+        use_cache: bool = True,
+        refresh_cache: bool = False,
+        scoring_mode: Optional[ScoringMode] = None,
+        priority: Priority = Priority.INTERACTIVE,
+        timeout: Optional[float] = None
+    ) -> Dict[str, Any]:
         """
         Procesa el matching ATS entre vacante y candidato
         
+        Usa la API asíncrona del agente para no bloquear el event loop. Las
+        llamadas a Groq pasan por el scheduler (cuotas RPM/TPM y concurrencia
+        adaptativa); un 429 se reintenta tras la espera indicada por el
+        proveedor y, si persiste, se propaga como RateLimitExceeded.
+        
+        Si ya hay en vuelo un análisis del mismo par vacante/candidato (misma
+        clave canónica), la petición se une a él en lugar de lanzar otra
+        llamada (processing.coalesced = True). Con CASCADE_ENABLED el análisis
+        pasa primero por el modelo pequeño (ver _acascade).
+        
+        Con timeout, la espera del turno y de las llamadas al modelo se cancela
+        si el análisis no termina dentro del plazo (DeadlineExceeded).
+        
         Args:
-            vacante: Datos de la vacante
-            candidato: Datos del candidato
+            vacante: Datos de la vacante o vacante registrada (CompiledVacante)
+            candidato: Datos del candidato o candidato almacenado (StoredCandidato)
+            use_cache: Si es False, no se consulta ni se actualiza la caché
+            refresh_cache: Si es True, se invalida la entrada y se recalcula
+            scoring_mode: llm (por defecto) o local para calcular todo sin modelo
+            priority: Clase de prioridad en el scheduler (interactiva por defecto)
+            timeout: Plazo en segundos desde la llamada (None = sin plazo)
             
         Returns:
             Diccionario con el análisis completo del matching
         """
-        # Construir el prompt del ATS
-        prompt = self.build_ats_prompt(vacante, candidato)
+        deadline = Deadline(timeout)
+        with stage("prepare"):
+            compiled = self._compiled(vacante)
+            candidato, profile = self._split_candidato(candidato)
+            early_result, cache_key, skill_match = self._prepare_matching(
+                compiled, candidato, use_cache, refresh_cache, scoring_mode, profile
+            )
+        if early_result is not None:
+            return self._complete_analysis(early_result, compiled, candidato, profile)
+        
+        async def call_model() -> Dict[str, Any]:
+            if self.cascade is not None:
+                return await self._acascade(compiled, candidato, cache_key, skill_match, priority)
+            return await self._acall_tier(self.tiers[TIER_LARGE], compiled, candidato, cache_key, skill_match, priority)
+        
+        # El plazo se aplica a cada petición: si vence, deja de esperar a la llamada
+        # compartida, que solo se cancela cuando no queda nadie esperándola
+        async with deadline.scope():
+            if not settings.coalesce_enabled:
+                analysis, shared = await call_model(), False
+            else:
+                flight_key = cache_key or self._cache_key(compiled, candidato, profile)
+                analysis, shared = await self.single_flight.do(flight_key, call_model)
+        if shared:
+            analysis.setdefault("processing", {"source": "llm"})["coalesced"] = True
+        return self._complete_analysis(analysis, compiled, candidato, profile, shared)
+    
+    async def astream_ats_matching(
+        self,
+        vacante: VacanteInput,
+        candidato: CandidatoInput,
+        use_cache: bool = True,
+        refresh_cache: bool = False,
+        scoring_mode: Optional[ScoringMode] = None,
+        timeout: Optional[float] = None
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Versión en streaming de aprocess_ats_matching
+        
+        Transmite la salida del modelo y entrega cada campo de primer nivel en
+        cuanto se completa su valor (match_score y status llegan primero).
+        Si el matching se resuelve localmente (compliance, scoring local o
+        caché) todos los campos se entregan de inmediato. Con timeout, la
+        espera del turno y de cada fragmento del modelo se acota al plazo.
+        
+        Args:
+            vacante: Datos de la vacante o vacante registrada (CompiledVacante)
+            candidato: Datos del candidato o candidato almacenado (StoredCandidato)
+            use_cache: Si es False, no se consulta ni se actualiza la caché
+            refresh_cache: Si es True, se invalida la entrada y se recalcula
+            scoring_mode: llm (por defecto) o local para calcular todo sin modelo
+            timeout: Plazo en segundos desde la llamada (None = sin plazo)
+            
+        Yields:
+            Tuplas (campo, valor) y, al final, ("result", análisis completo)
+        """
+        deadline = Deadline(timeout)
+        with stage("prepare"):
+            compiled = self._compiled(vacante)
+            candidato, profile = self._split_candidato(candidato)
+            early_result, cache_key, skill_match = self._prepare_matching(
+                compiled, candidato, use_cache, refresh_cache, scoring_mode, profile
+            )
+        if early_result is not None:
+            for key, value in early_result.items():
+                if key != "processing":
+                    yield key, value
+            yield "result", self._complete_analysis(early_result, compiled, candidato, profile)
+            return
+        
+        with stage("prompt"):
+            prompt, prompt_stats = self._build_prompt(compiled, candidato, skill_match)
+        parser = AnalysisParser()
+        estimated_tokens = self._estimated_tokens(prompt_stats)
+        
+        for _ in range(settings.groq_rate_limit_retries + 1):
+            ticket = await deadline.run(self.scheduler.acquire(Priority.INTERACTIVE, estimated_tokens))
+            record_stage("queue", ticket.queued_ms / 1000)
+            outcome, retry_after, provider_error = OUTCOME_ERROR, None, False
+            try:
+                started = time.perf_counter()
+                async for event in deadline.iterate(self.agent.arun(prompt, stream=True)):
+                    kind = getattr(event, "event", None)
+                    content = getattr(event, "content", None)
+                    if kind == RunEvent.run_content.value and isinstance(content, str):
+                        for key, value in parser.feed(content):
+                            # El motor local de skills prevalece sobre el modelo
+                            if key == "skill_analysis" and skill_match is not None:
+                                value = skill_match.to_skill_analysis()
+                            yield key, value
+                    elif kind == RunEvent.run_error.value:
+                        retry_after = rate_limit_retry_after(content)
+                        if retry_after is None:
+                            provider_error = True
+                            parser.feed(content or "")
+                latency_ms = (time.perf_counter() - started) * 1000
+                record_stage("llm", latency_ms / 1000)
+                if retry_after is not None:
+                    outcome = OUTCOME_RATE_LIMITED
+                else:
+                    outcome = OUTCOME_ERROR if provider_error else OUTCOME_OK
+            except (DeadlineExceeded, asyncio.CancelledError):
+                outcome = OUTCOME_CANCELLED
+                raise
+            finally:
+                self.scheduler.release(ticket, outcome, retry_after=retry_after)
+                LLM_CALLS.inc(model=settings.groq_model, outcome=outcome)
+            # Un 429 a mitad de respuesta no se puede reintentar sin duplicar campos
+            if retry_after is None or parser.text:
+                break
+        if retry_after is not None:
+            raise RateLimitExceeded(retry_after)
+        
+        with stage("parse"):
+            analysis = self._finish_analysis(parser, candidato, cache_key, skill_match)
+        self._record_llm_usage(analysis, None, prompt_stats, latency_ms)
+        yield "result", self._complete_analysis(analysis, compiled, candidato, profile)
+    
+    def invalidate_cached_match(self, vacante: VacanteInput, candidato: CandidatoInput) -> bool:
+        """
+        Elimina de la caché el análisis de un par vacante/candidato
+        
+        Returns:
+            True si existía una entrada en caché
+        """
+        if self.cache is None:
+            return False
+        candidato, profile = self._split_candidato(candidato)
+        return self.cache.invalidate(self._cache_key(self._compiled(vacante), candidato, profile))
+    
+    def rescore_vacante(self, previous_id: str, vacante: VacanteData) -> Optional[Dict[str, Any]]:
+        """
+        Recalcula el historial de una vacante editada sin volver a llamar al modelo
+        
+        Compara la vacante anterior con la editada y, para cada análisis del
+        historial de la anterior, recalcula solo los componentes afectados
+        (habilidades, experiencia, compliance) y recombina el score 50/30/20
+        (ver rescore_analysis). Los resultados se registran bajo el id de la
+        vacante editada con la narrativa anterior marcada como desactualizada;
+        un /ats/match posterior del par la regenera con el modelo y sustituye
+        la entrada.
+        
+        Args:
+            previous_id: Id de la vacante antes de la edición
+            vacante: Datos de la vacante editada
+            
+        Returns:
+            Resumen (ids, campos cambiados, componentes recalculados, análisis
+            y cambios de estado) o None si la vacante anterior no existe
+        """
+        if self.history is None:
+            raise ValueError("El re-scoring requiere MATCH_HISTORY_ENABLED=True")
+        registered = self.vacantes.get(previous_id)
+        previous = registered.vacante if registered is not None else self.history.vacante(previous_id)
+        if previous is None:
+            return None
+        
+        started = time.perf_counter()
+        compiled, _ = self.vacantes.register(vacante)
+        fields = changed_fields(previous, vacante)
+        components = affected_components(fields)
+        rescored = status_changes = 0
+        if compiled.vacante_id != previous_id:
+            skill_matcher = self.skill_matcher if settings.skill_matcher_enabled else None
+            for records in self.history.iter_records(previous_id, settings.rescore_batch_size):
+                entries = []
+                for record in records:
+                    analysis = rescore_analysis(
+                        record.analysis,
+                        compiled,
+                        record.candidato,
+                        components,
+                        self.compliance,
+                        skill_matcher,
+                        settings.local_approval_threshold,
+                        settings.local_rejection_threshold
+                    )
+                    status_changes += analysis["status"] != record.analysis["status"]
+                    entries.append((record.candidato_id, record.candidato, analysis))
+                self.history.record_many(compiled.vacante_id, vacante, entries)
+                rescored += len(entries)
+        ANALYSIS_SOURCES.inc(rescored, source="rescore")
+        
+        return {
+            "previous_vacante_id": previous_id,
+            "vacante_id": compiled.vacante_id,
+            "changed_fields": fields,
+            "rescored_components": components,
+            "rescored": rescored,
+            "status_changes": status_changes,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1)
+        }
+    
+    async def aiter_ats_batch(
+        self,
+        vacante: VacanteInput,
+        candidatos: List[CandidatoInput],
+        parallelism: int,
+        use_cache: bool = True,
+        refresh_cache: bool = False,
+        scoring_mode: Optional[ScoringMode] = None,
+        priority: Priority = Priority.BATCH
+    ) -> AsyncIterator[Tuple[int, Union[Dict[str, Any], Exception]]]:
+        """
+        Procesa una vacante contra varios candidatos de forma concurrente
+        
+        Los resultados se entregan en orden de finalización, no de entrada,
+        para que el cliente reciba los primeros análisis en cuanto estén listos.
+        Un fallo en un candidato no aborta el lote: se entrega la excepción.
+        
+        Args:
+            vacante: Datos de la vacante o vacante registrada (CompiledVacante)
+            candidatos: Candidatos a evaluar
+            parallelism: Número máximo de análisis simultáneos del lote
+            use_cache: Si es False, no se consulta ni se actualiza la caché
+            refresh_cache: Si es True, se invalidan las entradas y se recalculan
+            scoring_mode: llm (por defecto) o local para calcular todo sin modelo
+            priority: Clase de prioridad en el scheduler (lote por defecto, detrás
+                de las peticiones interactivas)
+            
+        Yields:
+            Tuplas (índice del candidato, análisis o excepción)
+        """
+        async def rows():
+            for item in enumerate(candidatos):
+                yield item
+        
+        async for outcome in self.aiter_ats_stream(
+            vacante,
+            rows(),
+            parallelism,
+            use_cache=use_cache,
+            refresh_cache=refresh_cache,
+            scoring_mode=scoring_mode,
+            priority=priority
+        ):
+            yield outcome
+    
+    async def aiter_ats_stream(
+        self,
+        vacante: VacanteInput,
+        candidatos: AsyncIterator[Tuple[RowKey, Union[CandidatoInput, Exception]]],
+        parallelism: int,
+        use_cache: bool = True,
+        refresh_cache: bool = False,
+        scoring_mode: Optional[ScoringMode] = None,
+        priority: Priority = Priority.BATCH
+    ) -> AsyncIterator[Tuple[RowKey, Union[Dict[str, Any], Exception]]]:
+        """
+        Procesa una vacante contra un flujo de candidatos con memoria constante
+        
+        El siguiente candidato solo se pide al iterador cuando queda un hueco
+        libre, así que nunca hay más de `parallelism` en curso y la lectura del
+        origen (p. ej. el body de una subida) avanza al ritmo del matching.
+        Los elementos que ya llegan como excepción (filas inválidas) se
+        entregan tal cual, sin analizarse.
+        
+        Args:
+            vacante: Datos de la vacante o vacante registrada (CompiledVacante)
+            candidatos: Iterador asíncrono de tuplas (clave, candidato o excepción)
+            parallelism: Número máximo de análisis simultáneos
+            use_cache: Si es False, no se consulta ni se actualiza la caché
+            refresh_cache: Si es True, se invalidan las entradas y se recalculan
+            scoring_mode: llm (por defecto) o local para calcular todo sin modelo
+            priority: Clase de prioridad en el scheduler
+            
+        Yields:
+            Tuplas (clave del candidato, análisis o excepción) en orden de finalización
+        """
+        # La vacante se compila una sola vez para todo el flujo
+        vacante = self._compiled(vacante)
+        
+        async def run_one(key: RowKey, candidato: CandidatoInput):
+            try:
+                return key, await self.aprocess_ats_matching(
+                    vacante,
+                    candidato,
+                    use_cache=use_cache,
+                    refresh_cache=refresh_cache,
+                    scoring_mode=scoring_mode,
+                    priority=priority
+                )
+            except Exception as e:
+                return key, e
+        
+        pending: Set[asyncio.Task] = set()
+        exhausted = False
+        try:
+            while not exhausted or pending:
+                while not exhausted and len(pending) < parallelism:
+                    try:
+                        key, candidato = await candidatos.__anext__()
+                    except StopAsyncIteration:
+                        exhausted = True
+                        break
+                    if isinstance(candidato, Exception):
+                        yield key, candidato
+                    else:
+                        pending.add(asyncio.create_task(run_one(key, candidato)))
+                if pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        yield task.result()
+        finally:
+            # Si el cliente se desconecta, no seguir gastando llamadas al modelo
+            for task in pending:
+                task.cancel()
+    
+    async def arank_candidates(
+        self,
+        vacante: VacanteInput,
+        candidatos: List[CandidatoData],
+        top_k: int,
+        parallelism: int,
+        min_prefilter_score: float = 0.0
+    ) -> List[Tuple[int, float, Union[Dict[str, Any], Exception]]]:
+        """
+        Rankea un pool de candidatos y analiza a fondo solo el Top-K
+        
+        Todo el pool se puntúa localmente con un índice invertido en una pasada
+        vectorizada; solo los K mejores pasan por aprocess_ats_matching.
+        
+        Args:
+            vacante: Datos de la vacante o vacante registrada (CompiledVacante)
+            candidatos: Pool completo de candidatos
+            top_k: Número de candidatos que reciben el análisis completo
+            parallelism: Número máximo de análisis simultáneos
+            min_prefilter_score: Score mínimo (exclusivo) del pre-filtro
+            
+        Returns:
+            Lista de (índice en el pool, score del pre-filtro, análisis o excepción)
+            en el orden del pre-filtro
+        """
+        vacante = self._compiled(vacante)
+        index = CandidateIndex(candidatos, self.skill_matcher, self.compliance)
+        shortlist = index.top_k(vacante.vacante, top_k, min_prefilter_score)
+        
+        outcomes: Dict[int, Union[Dict[str, Any], Exception]] = {}
+        async for position, outcome in self.aiter_ats_batch(
+            vacante,
+            [candidatos[i] for i, _ in shortlist],
+            parallelism
+        ):
+            outcomes[position] = outcome
+        
+        return [(i, score, outcomes[position]) for position, (i, score) in enumerate(shortlist)]
+    
+    async def arank_stored_candidates(
+        self,
+        vacante: VacanteInput,
+        rows: Sequence[int],
+        top_k: int,
+        parallelism: int,
+        min_prefilter_score: float = 0.0
+    ) -> List[Tuple[int, float, Union[Dict[str, Any], Exception]]]:
+        """
+        Variante de arank_candidates para candidatos del almacén
         
-        # Procesar con el agente
-        response = self.agent.run(prompt)
+        El pre-filtro se calcula directamente sobre la matriz de features
+        (memory-mapped) sin cargar ni procesar los CVs; solo se cargan de
+        SQLite los perfiles del Top-K.
         
-        # Extraer el contenido de la respuesta
+        Args:
+            vacante: Datos de la vacante o vacante registrada (CompiledVacante)
+            rows: Filas del almacén que forman el pool (ver CandidateStore.rows_for)
+            top_k: Número de candidatos que reciben el análisis completo
+            parallelism: Número máximo de análisis simultáneos
+            min_prefilter_score: Score mínimo (exclusivo) del pre-filtro
+            
+        Returns:
+            Lista de (índice en rows, score del pre-filtro, análisis o excepción)
+            en el orden del pre-filtro
+        """
+        vacante = self._compiled(vacante)
+        shortlist = self.candidatos.top_k(
+            vacante.skills,
+            vacante.vacante.years_experience,
+            vacante.compliance.work_permit_required,
+            vacante.compliance.location_parts,
+            vacante.compliance.education_level,
+            np.asarray(rows, dtype=np.int64),
+            top_k,
+            min_prefilter_score
+        )
+        profiles = self.candidatos.get_rows([rows[i] for i, _ in shortlist])
+        
+        outcomes: Dict[int, Union[Dict[str, Any], Exception]] = {}
+        async for position, outcome in self.aiter_ats_batch(vacante, profiles, parallelism):
+            outcomes[position] = outcome
+        
+        return [(i, score, outcomes[position]) for position, (i, score) in enumerate(shortlist)]
+    
+    async def aprocess_job_item(self, item: JobItem) -> Dict[str, Any]:
+        """
+        Procesa un elemento de la cola de jobs
+        
+        Un análisis cuya respuesta no se pudo extraer (parse_status = failed)
+        se trata como error para que la cola lo reintente con backoff.
+        
+        Args:
+            item: Elemento reclamado de la cola
+            
+        Returns:
+            Diccionario con el análisis completo del matching
+        """
+        analysis = await self.aprocess_ats_matching(
+            VacanteData(**item.vacante),
+            CandidatoData(**item.candidato),
+            use_cache=item.options.get("use_cache", True),
+            scoring_mode=item.options.get("scoring_mode"),
+            priority=Priority.BACKGROUND
+        )
+        if analysis.get("processing", {}).get("parse_status") == "failed":
+            raise ValueError("La respuesta del modelo no contiene un análisis válido")
+        return analysis
+    
+    def _extract_response_text(self, response: Any) -> str:
+        """Extrae el contenido de texto de la respuesta del agente"""
         if hasattr(response, 'content'):
-            response_text = response.content
+            return response.content
         elif isinstance(response, str):
-            response_text = response
+            return response
         else:
-            response_text = str(response)
+            return str(response)
+    
+    async def _acascade(
+        self,
+        compiled: CompiledVacante,
+        candidato: CandidatoData,
+        cache_key: Optional[str],
+        skill_match: Optional[SkillMatchResult],
+        priority: Priority
+    ) -> Dict[str, Any]:
+        """
+        Análisis en cascada: modelo pequeño primero, grande solo si hace falta
+        
+        Se escala al modelo grande si la respuesta del pequeño no se pudo
+        validar o si su match_score cae dentro de la banda de incertidumbre
+        [CASCADE_BAND_LOW, CASCADE_BAND_HIGH]. processing.tier indica qué
+        nivel decidió y processing.latency_ms incluye ambas llamadas.
+        """
+        small = await self._acall_tier(self.tiers[TIER_SMALL], compiled, candidato, None, skill_match, priority)
+        reason = escalation_reason(small, settings.cascade_band_low, settings.cascade_band_high)
+        if reason is None:
+            if cache_key is not None:
+                self.cache.set(cache_key, {k: v for k, v in small.items() if k != "processing"})
+            self.cascade.record_decision(TIER_SMALL)
+            return small
         
-        # Intentar parsear como JSON
+        logger.info(f"Cascada: escalando al modelo grande ({reason}, score {small.get('match_score')})")
+        analysis = await self._acall_tier(self.tiers[TIER_LARGE], compiled, candidato, cache_key, skill_match, priority)
+        processing = analysis["processing"]
+        processing["escalation_reason"] = reason
+        processing["latency_ms"] = round(processing["latency_ms"] + small["processing"]["latency_ms"], 1)
+        self.cascade.record_decision(TIER_LARGE, escalated_from=TIER_SMALL)
+        return analysis
+    
+    async def _acall_tier(
+        self,
+        tier: ModelTier,
+        compiled: CompiledVacante,
+        candidato: CandidatoData,
+        cache_key: Optional[str],
+        skill_match: Optional[SkillMatchResult],
+        priority: Priority
+    ) -> Dict[str, Any]:
+        """Análisis completo con el modelo de un nivel (prompt, llamada, validación y métricas)"""
+        with stage("prompt"):
+            prompt, prompt_stats = self._build_prompt(compiled, candidato, skill_match, tier.prompt_builder)
+        response, latency_ms, hedge = await self._arun_agent(prompt, prompt_stats, priority, tier)
+        with stage("parse"):
+            analysis = self._finish_analysis(self._parse_response(response), candidato, cache_key, skill_match)
+        self._record_llm_usage(analysis, response, prompt_stats, latency_ms, tier.model_id)
+        if hedge is not None:
+            analysis["processing"]["hedge"] = hedge
+        if self.cascade is not None:
+            processing = analysis["processing"]
+            processing["tier"] = tier.name
+            input_tokens = processing["input_tokens"] or processing["prompt_tokens"]
+            output_tokens = processing["output_tokens"] or 0
+            self.cascade.record_call(
+                tier.name, latency_ms, input_tokens, output_tokens, tier.cost(input_tokens, output_tokens)
+            )
+        return analysis
+    
+    async def _arun_agent(
+        self,
+        prompt: str,
+        prompt_stats: PromptStats,
+        priority: Priority,
+        tier: Optional[ModelTier] = None
+    ) -> Tuple[Any, float, Optional[str]]:
+        """
+        Llama al agente de un nivel (el modelo grande por defecto) a través de su scheduler
+        
+        Un 429 de Groq reduce la concurrencia y pausa el despacho; la llamada
+        se reintenta hasta GROQ_RATE_LIMIT_RETRIES veces antes de propagarse.
+        Con HEDGE_ENABLED cada intento puede lanzar una llamada de cobertura
+        (ver _arun_hedged).
+        
+        Returns:
+            Tupla (respuesta del agente, latencia de la llamada en ms, resultado
+            de la cobertura: None si no se lanzó, "primary" o "hedge")
+        """
+        tier = tier or self.tiers[TIER_LARGE]
+        estimated_tokens = self._estimated_tokens(prompt_stats)
+        retry_after = None
+        for _ in range(settings.groq_rate_limit_retries + 1):
+            ticket = await tier.scheduler.acquire(priority, estimated_tokens)
+            record_stage("queue", ticket.queued_ms / 1000)
+            started = time.perf_counter()
+            response, retry_after, hedge = await self._arun_hedged(tier, prompt, ticket, priority)
+            latency_ms = (time.perf_counter() - started) * 1000
+            record_stage("llm", latency_ms / 1000)
+            if retry_after is None:
+                return response, latency_ms, hedge
+            logger.warning(f"Groq devolvió 429; reintento tras {retry_after:.1f} s")
+        raise RateLimitExceeded(retry_after)
+    
+    async def _arun_hedged(
+        self,
+        tier: ModelTier,
+        prompt: str,
+        ticket: Ticket,
+        priority: Priority
+    ) -> Tuple[Any, Optional[float], Optional[str]]:
+        """
+        Llamada al agente con cobertura (hedged request)
+        
+        Si la llamada no ha respondido al llegar al percentil HEDGE_PERCENTILE
+        de las latencias recientes del modelo, se lanza una segunda idéntica
+        (con su propio turno en el scheduler, así que respeta las cuotas) y se
+        usa la primera respuesta válida; la otra se cancela. Si ninguna es
+        válida se devuelve el resultado de la original.
+        
+        Args:
+            tier: Nivel de la cascada al que se llama
+            prompt: Prompt completo
+            ticket: Turno ya concedido por el scheduler para la llamada original
+            priority: Prioridad con la que se pide el turno de la cobertura
+            
+        Returns:
+            Tupla (respuesta, espera sugerida si fue un 429, resultado de la cobertura)
+        """
+        delay = self.hedging.delay(tier.model_id) if self.hedging is not None else None
+        if delay is None:
+            response, retry_after = await self._arun_call(tier, prompt, ticket, observe_cancelled=True)
+            return response, retry_after, None
+        
+        async def hedge_call() -> Tuple[Any, Optional[float]]:
+            hedge_ticket = await tier.scheduler.acquire(priority, ticket.estimated_tokens)
+            return await self._arun_call(tier, prompt, hedge_ticket)
+        
+        primary = asyncio.ensure_future(self._arun_call(tier, prompt, ticket, observe_cancelled=True))
+        calls = [primary]
+        winner: Optional[asyncio.Future] = None
         try:
-            # Buscar JSON en la respuesta
-            import re
-            json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-            if json_match:
-                return json.loads(json_match.group())
-            else:
-                return json.loads(response_text)
-        except json.JSONDecodeError:
-            # Si no se puede parsear, retornar un análisis básico
-            return {
-                "match_score": 0.0,
-                "status": "PENDIENTE",
-                "skill_analysis": {
-                    "hard_skills_score": 0.0,
-                    "soft_skills_score": 0.0,
-                    "matched_skills": [],
-                    "missing_skills": []
-                },
-                "experience_score": 0.0,
-                "compliance_check": {
-                    "has_work_permit": candidato.has_work_permit,
-                    "location_match": False,
-                    "education_match": False
-                },
-                "recommendations": ["No se pudo procesar el análisis correctamente"],
-                "summary": "Error al procesar la respuesta del agente",
-                "detailed_analysis": response_text
-            }
+            done, pending = await asyncio.wait(calls, timeout=delay)
+            if not done:
+                calls.append(asyncio.ensure_future(hedge_call()))
+                logger.info(f"Hedging: {tier.model_id} sin respuesta tras {delay * 1000:.0f} ms, lanzando cobertura")
+            pending = set(calls)
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((call for call in calls if call in done and self._valid_call(call)), None)
+            winner = winner or primary
+            response, retry_after = winner.result()
+            return response, retry_after, ("hedge" if winner is not primary else "primary") if len(calls) > 1 else None
+        finally:
+            for call in calls:
+                if not call.done():
+                    call.cancel()
+                elif not call.cancelled():
+                    # La excepción de la llamada perdedora no se propaga
+                    call.exception()
+            if len(calls) > 1:
+                self.hedging.record(tier.model_id, won=winner is not None and winner is not primary)
+    
+    async def _arun_call(
+        self,
+        tier: ModelTier,
+        prompt: str,
+        ticket: Ticket,
+        observe_cancelled: bool = False
+    ) -> Tuple[Any, Optional[float]]:
+        """
+        Una llamada al agente con un turno ya concedido, que se devuelve según el resultado
+        
+        Args:
+            observe_cancelled: Si la llamada se cancela, registrar lo que llevaba
+                esperando como latencia (cota inferior de una llamada lenta)
+        
+        Returns:
+            Tupla (respuesta del agente, espera sugerida si fue un 429 o None)
+        """
+        started = time.perf_counter()
+        try:
+            response = await tier.agent.arun(prompt)
+        except asyncio.CancelledError:
+            tier.scheduler.release(ticket, OUTCOME_CANCELLED)
+            LLM_CALLS.inc(model=tier.model_id, outcome=OUTCOME_CANCELLED)
+            if observe_cancelled and self.hedging is not None:
+                self.hedging.observe(tier.model_id, time.perf_counter() - started)
+            raise
+        except BaseException:
+            tier.scheduler.release(ticket, OUTCOME_ERROR)
+            LLM_CALLS.inc(model=tier.model_id, outcome=OUTCOME_ERROR)
+            raise
+        
+        retry_after = self._rate_limit_retry_after(response)
+        if retry_after is not None:
+            tier.scheduler.release(ticket, OUTCOME_RATE_LIMITED, retry_after=retry_after)
+            LLM_CALLS.inc(model=tier.model_id, outcome=OUTCOME_RATE_LIMITED)
+            return response, retry_after
+        if self._is_error_response(response):
+            # Errores del proveedor (5xx, timeout, autenticación) que el agente devuelve como respuesta
+            tier.scheduler.release(ticket, OUTCOME_ERROR)
+            LLM_CALLS.inc(model=tier.model_id, outcome=OUTCOME_ERROR)
+            return response, None
+        tier.scheduler.release(ticket, OUTCOME_OK, actual_tokens=self._usage_tokens(response))
+        LLM_CALLS.inc(model=tier.model_id, outcome=OUTCOME_OK)
+        if self.hedging is not None:
+            self.hedging.observe(tier.model_id, time.perf_counter() - started)
+        return response, None
+    
+    def _valid_call(self, call: asyncio.Future) -> bool:
+        """True si una llamada de _arun_hedged terminó con una respuesta utilizable"""
+        if call.cancelled() or call.exception() is not None:
+            return False
+        response, retry_after = call.result()
+        return retry_after is None and not self._is_error_response(response)
+    
+    def _estimated_tokens(self, prompt_stats: PromptStats) -> int:
+        """Tokens que se descuentan de la cuota TPM antes de la llamada (prompt + salida esperada)"""
+        return prompt_stats.static_prefix_tokens + prompt_stats.payload_tokens + settings.groq_expected_output_tokens
+    
+    def _usage_tokens(self, response: Any) -> Optional[int]:
+        """Tokens reales de la llamada según las métricas del agente (None si no se reportan)"""
+        metrics = getattr(response, "metrics", None)
+        total = (getattr(metrics, "input_tokens", 0) or 0) + (getattr(metrics, "output_tokens", 0) or 0)
+        return total or None
+    
+    def _is_error_response(self, response: Any) -> bool:
+        """True si el agente devolvió un error del proveedor como respuesta"""
+        status = getattr(response, "status", None)
+        return str(getattr(status, "value", status)).upper() == "ERROR"
+    
+    def _rate_limit_retry_after(self, response: Any) -> Optional[float]:
+        """Segundos de espera si la respuesta del agente es un 429 de Groq, None en otro caso"""
+        if not self._is_error_response(response):
+            return None
+        return rate_limit_retry_after(self._extract_response_text(response))
+    
+    def _record_llm_usage(
+        self,
+        analysis: Dict[str, Any],
+        response: Any,
+        prompt_stats: PromptStats,
+        latency_ms: float,
+        model: Optional[str] = None
+    ) -> None:
+        """
+        Añade al análisis los tokens del prompt y la latencia de la llamada al modelo
+        
+        Los tokens de entrada/salida reales se toman de las métricas del agente
+        cuando el proveedor las reporta; prompt_tokens es la estimación local.
+        """
+        metrics = getattr(response, "metrics", None)
+        input_tokens = getattr(metrics, "input_tokens", None) or None
+        output_tokens = getattr(metrics, "output_tokens", None) or None
+        model = model or settings.groq_model
+        LLM_TOKENS.inc(prompt_stats.static_prefix_tokens + prompt_stats.payload_tokens, model=model, kind="prompt_estimate")
+        if input_tokens:
+            LLM_TOKENS.inc(input_tokens, model=model, kind="input")
+        if output_tokens:
+            LLM_TOKENS.inc(output_tokens, model=model, kind="output")
+        analysis.setdefault("processing", {"source": "llm"}).update({
+            "prompt_tokens": prompt_stats.static_prefix_tokens + prompt_stats.payload_tokens,
+            "payload_tokens": prompt_stats.payload_tokens,
+            "cv_tokens_removed": prompt_stats.cv_tokens_original - prompt_stats.cv_tokens_sent,
+            "pii_redactions": prompt_stats.pii_redactions,
+            "anonymized_chars_removed": prompt_stats.anonymized_chars_removed,
+            "anonymized_tokens_removed": prompt_stats.anonymized_tokens_removed,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "latency_ms": round(latency_ms, 1)
+        })
+        logger.info(
+            f"Prompt: {prompt_stats.payload_tokens} tokens de payload "
+            f"(+{prompt_stats.static_prefix_tokens} de prefijo estático), "
+            f"CV {prompt_stats.cv_tokens_sent}/{prompt_stats.cv_tokens_original} tokens, "
+            f"entrada real {input_tokens}, latencia {latency_ms:.0f} ms"
+        )
+    
+    def _scheduler(self, model_id: str) -> RateLimitScheduler:
+        """
+        Scheduler de llamadas a un modelo
+        
+        En modo multi-worker las cuotas RPM/TPM de la cuenta y la pausa por
+        429 se comparten en SQLite, y MAX_CONCURRENT_MATCHES se reparte entre
+        los workers para que el total no crezca con el número de procesos.
+        """
+        workers = settings.worker_count()
+        quota = None
+        if workers > 1:
+            quota = SharedQuota(
+                settings.shared_state_path("", "rate_limits.db"),
+                f"groq:{model_id}",
+                settings.groq_rpm_limit,
+                settings.groq_tpm_limit
+            )
+        return RateLimitScheduler(
+            requests_per_minute=settings.groq_rpm_limit,
+            tokens_per_minute=settings.groq_tpm_limit,
+            max_concurrency=math.ceil(settings.max_concurrent_matches / workers),
+            min_concurrency=settings.groq_min_concurrency,
+            quota=quota
+        )
+    
+    def _groq_model(self, model_id: str) -> Groq:
+        """Modelo de Groq que usa el pool HTTP compartido"""
+        return Groq(
+            id=model_id,
+            http_client=self.http_client,
+            timeout=settings.groq_timeout_seconds,
+            base_url=settings.groq_base_url or None
+        )
+    
+    def _complete_analysis(
+        self,
+        analysis: Dict[str, Any],
+        compiled: CompiledVacante,
+        candidato: CandidatoData,
+        profile: Optional[StoredCandidato],
+        shared: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Cuenta el análisis por origen en las métricas, lo guarda en el historial y lo devuelve
+        
+        No se registran las respuestas irrecuperables ni las peticiones que se
+        unieron a un análisis en vuelo (ya lo registró la que hizo la llamada).
+        Un fallo del historial no hace fallar el matching.
+        """
+        processing = analysis.get("processing", {})
+        ANALYSIS_SOURCES.inc(source=processing.get("source", "llm"))
+        if self.history is None or shared or processing.get("parse_status") == "failed":
+            return analysis
+        candidato_id = (
+            profile.candidato_id if profile is not None
+            else fingerprint_candidato(candidato)[:CANDIDATO_ID_LENGTH]
+        )
+        try:
+            with stage("history"):
+                self.history.record(compiled.vacante_id, compiled.vacante, candidato_id, candidato, analysis)
+        except sqlite3.Error as e:
+            logger.warning(f"No se pudo guardar el análisis en el historial: {e}")
+        return analysis
+    
+    def metrics_samples(self) -> List[Sample]:
+        """Gauges del servicio para /metrics: caché, coalescencia, anonimizador, historial, hedging y schedulers de cada nivel"""
+        samples: List[Sample] = []
+        if self.cache is not None:
+            cache = self.cache.get_stats()
+            samples.append(("ats_cache_entries", "gauge", "Entradas en memoria de la caché de análisis", {}, cache["memory_entries"]))
+            for kind in ("memory_hits", "disk_hits", "misses", "stores", "evictions"):
+                samples.append(("ats_cache_events_total", "counter", "Eventos de la caché de análisis", {"event": kind}, cache[kind]))
+            samples.append(("ats_cache_hit_ratio", "gauge", "Tasa de aciertos de la caché de análisis", {}, cache["hit_rate"]))
+        if settings.coalesce_enabled:
+            flights = self.single_flight.get_stats()
+            samples.append(("ats_coalesce_in_flight", "gauge", "Análisis únicos en vuelo", {}, flights["in_flight"]))
+            samples.append(("ats_coalesced_requests_total", "counter", "Peticiones resueltas uniéndose a un análisis en vuelo", {}, flights["coalesced"]))
+        if self.anonymizer is not None:
+            anonymizer = self.anonymizer.get_stats()
+            samples.append(("ats_anonymizer_redactions_total", "counter", "Datos personales sustituidos antes de enviar el prompt", {}, anonymizer["redactions"]))
+            for unit in ("chars", "tokens"):
+                samples.append(("ats_anonymizer_removed_total", "counter", "Texto eliminado del CV por la anonimización y normalización", {"unit": unit}, anonymizer[f"{unit}_removed"]))
+            samples.append(("ats_anonymizer_cache_hit_ratio", "gauge", "Tasa de aciertos de la caché de CVs anonimizados", {}, anonymizer["hit_rate"]))
+        if self.history is not None:
+            history = self.history.get_stats()
+            samples.append(("ats_history_entries", "gauge", "Análisis en el historial (último por par vacante/candidato)", {}, history["entries"]))
+            samples.append(("ats_history_recorded_total", "counter", "Análisis guardados en el historial por este proceso", {}, history["recorded"]))
+            samples.append(("ats_history_queries_total", "counter", "Consultas de leaderboard servidas desde el historial", {}, history["queries"]))
+        if self.hedging is not None:
+            for model, hedges in self.hedging.get_stats()["models"].items():
+                for event in ("fired", "won"):
+                    samples.append(("ats_hedged_calls_total", "counter", "Llamadas de cobertura lanzadas y ganadas (respondieron antes que la original)", {"model": model, "event": event}, hedges[event]))
+                if hedges["delay_ms"] is not None:
+                    samples.append(("ats_hedge_delay_seconds", "gauge", "Espera antes de lanzar una llamada de cobertura (percentil de latencia)", {"model": model}, hedges["delay_ms"] / 1000))
+        for tier in self.tiers.values():
+            scheduler = tier.scheduler.get_stats()
+            labels = {"model": tier.model_id}
+            samples.append(("ats_scheduler_in_flight", "gauge", "Llamadas al modelo en vuelo", labels, scheduler["in_flight"]))
+            samples.append(("ats_scheduler_concurrency_limit", "gauge", "Límite de concurrencia adaptativo (AIMD)", labels, scheduler["concurrency_limit"]))
+            for priority, queued in scheduler["queued"].items():
+                samples.append(("ats_scheduler_queued", "gauge", "Peticiones esperando turno por prioridad", {**labels, "priority": priority}, queued))
+            if scheduler["tokens_available"] is not None:
+                samples.append(("ats_scheduler_tokens_available", "gauge", "Tokens disponibles en la cubeta TPM", labels, scheduler["tokens_available"]))
+        return samples
+    
+    def _compiled(self, vacante: VacanteInput) -> CompiledVacante:
+        """Artefactos de matching de la vacante (se calculan si llega sin registrar)"""
+        if isinstance(vacante, CompiledVacante):
+            return vacante
+        return self.vacantes.compile(vacante)
+    
+    def _split_candidato(self, candidato: CandidatoInput) -> Tuple[CandidatoData, Optional[StoredCandidato]]:
+        """Datos del candidato y, si viene del almacén, su perfil procesado"""
+        if isinstance(candidato, StoredCandidato):
+            return candidato.candidato, candidato
+        return candidato, None
+    
+    def _build_prompt(
+        self,
+        compiled: CompiledVacante,
+        candidato: CandidatoData,
+        skill_match: Optional[SkillMatchResult],
+        prompt_builder: Optional[PromptBuilder] = None
+    ) -> Tuple[str, PromptStats]:
+        """
+        Payload de la petición reutilizando la sección de la vacante ya serializada
+        
+        El CV y la información adicional pasan antes por el anonimizador: el
+        proveedor solo recibe el texto sin datos personales ni relleno.
+        """
+        anonymization = None
+        if self.anonymizer is not None:
+            candidato, anonymization = self.anonymizer.anonymize_candidato(candidato)
+        prompt, prompt_stats = (prompt_builder or self.prompt_builder).build(
+            compiled.vacante,
+            candidato,
+            skill_match,
+            vacante_json=compiled.prompt_section,
+            keywords=compiled.keywords
+        )
+        if anonymization is not None:
+            prompt_stats.pii_redactions = anonymization.redactions
+            prompt_stats.anonymized_chars_removed = anonymization.chars_removed
+            prompt_stats.anonymized_tokens_removed = anonymization.tokens_removed
+        return prompt, prompt_stats
+    
+    def _prepare_matching(
+        self,
+        compiled: CompiledVacante,
+        candidato: CandidatoData,
+        use_cache: bool,
+        refresh_cache: bool,
+        scoring_mode: Optional[ScoringMode],
+        profile: Optional[StoredCandidato] = None
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[str], Optional[SkillMatchResult]]:
+        """
+        Etapas locales previas a la llamada al modelo
+        
+        En orden: motor de skills, compliance, scoring local y caché. Cualquiera
+        de ellas puede resolver el matching sin consultar a Groq.
+        
+        Returns:
+            Tupla (análisis ya resuelto o None, clave de caché, resultado del motor de skills)
+        """
+        vacante = compiled.vacante
+        mode = ScoringMode(scoring_mode or settings.default_scoring_mode)
+        skill_match = None
+        if settings.skill_matcher_enabled:
+            skill_match = self.skill_matcher.match(
+                vacante,
+                candidato,
+                compiled.skills,
+                profile.candidate_terms if profile is not None else None
+            )
+        skill_analysis = skill_match.to_skill_analysis() if skill_match is not None else None
+        
+        compliance_result = self.compliance.evaluate(vacante, candidato, compiled.compliance)
+        if settings.compliance_gate_enabled and not compliance_result.passed:
+            return self.compliance.rejection_analysis(vacante, candidato, compliance_result, skill_analysis), None, skill_match
+        
+        if mode == ScoringMode.LOCAL:
+            if skill_analysis is None:
+                raise ValueError("scoring_mode=local requiere SKILL_MATCHER_ENABLED=True")
+            analysis = local_analysis(
+                vacante,
+                candidato,
+                skill_analysis,
+                compliance_result.checks,
+                settings.local_approval_threshold,
+                settings.local_rejection_threshold
+            )
+            return analysis, None, skill_match
+        
+        cache_key, cached = self._lookup_cache(compiled, candidato, use_cache, refresh_cache, profile)
+        return cached, cache_key, skill_match
+    
+    def _cache_key(
+        self,
+        compiled: CompiledVacante,
+        candidato: CandidatoData,
+        profile: Optional[StoredCandidato] = None
+    ) -> str:
+        """Clave de caché del par vacante/candidato con la configuración actual"""
+        return match_cache_key(
+            compiled.vacante,
+            candidato,
+            self._cache_model,
+            settings.ats_system_instructions + self.prompt_builder.static_prefix,
+            vacante_fingerprint=compiled.fingerprint,
+            candidato_fingerprint=profile.fingerprint if profile is not None else None
+        )
+    
+    def _lookup_cache(
+        self,
+        compiled: CompiledVacante,
+        candidato: CandidatoData,
+        use_cache: bool,
+        refresh_cache: bool,
+        profile: Optional[StoredCandidato] = None
+    ) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """
+        Consulta la caché antes de llamar al modelo
+        
+        Returns:
+            Tupla (clave para guardar el resultado o None si no se cachea, análisis en caché o None)
+        """
+        if self.cache is None or not use_cache:
+            return None, None
+        
+        cache_key = self._cache_key(compiled, candidato, profile)
+        if refresh_cache:
+            self.cache.invalidate(cache_key)
+            return cache_key, None
+        
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            cached["processing"] = {"source": "cache"}
+        return cache_key, cached
+    
+    def _parse_response(self, response: Any) -> AnalysisParser:
+        """Pasa la respuesta completa del agente por el parser de análisis"""
+        parser = AnalysisParser()
+        parser.feed(self._extract_response_text(response) or "")
+        return parser
+    
+    def _finish_analysis(
+        self,
+        parser: AnalysisParser,
+        candidato: CandidatoData,
+        cache_key: Optional[str],
+        skill_match: Optional[SkillMatchResult] = None
+    ) -> Dict[str, Any]:
+        """
+        Valida la respuesta del modelo y guarda en caché los análisis válidos
+        
+        El análisis se valida contra ATSMatchResponse; si el JSON venía mal
+        formado se repara localmente en lugar de repetir la llamada. Las
+        respuestas irrecuperables no se cachean para que el siguiente intento
+        vuelva a consultar al modelo. Si hay resultado del motor local de
+        skills, su skill_analysis prevalece sobre el del modelo para que la
+        sección sea reproducible.
+        """
+        parsed, parse_status = parser.finalize()
+        PARSE_RESULTS.inc(status=parse_status)
+        if parsed is None:
+            logger.warning("No se pudo extraer un análisis válido de la respuesta del modelo")
+            return self._fallback_analysis(parser.text, candidato)
+        
+        analysis = parsed.model_dump(mode="json", exclude={"processing"})
+        if skill_match is not None:
+            analysis["skill_analysis"] = skill_match.to_skill_analysis()
+        
+        if cache_key is not None:
+            self.cache.set(cache_key, analysis)
+        analysis["processing"] = {"source": "llm", "parse_status": parse_status}
+        return analysis
+    
+    def _fallback_analysis(self, response_text: str, candidato: CandidatoData) -> Dict[str, Any]:
+        """Análisis básico que se devuelve cuando la respuesta no se pudo parsear"""
+        return {
+            "match_score": 0.0,
+            "status": "PENDIENTE",
+            "skill_analysis": {
+                "hard_skills_score": 0.0,
+                "soft_skills_score": 0.0,
+                "matched_skills": [],
+                "missing_skills": []
+            },
+            "experience_score": 0.0,
+            "compliance_check": {
+                "has_work_permit": candidato.has_work_permit,
+                "location_match": False,
+                "education_match": False
+            },
+            "recommendations": ["No se pudo procesar el análisis correctamente"],
+            "summary": "Error al procesar la respuesta del agente",
+            "detailed_analysis": response_text,
+            "processing": {"source": "llm", "parse_status": "failed"}
+        }
     
     def get_agent_info(self) -> Dict[str, Any]:
         """
@@ -212,5 +1317,31 @@ Debes responder EXCLUSIVAMENTE con un objeto JSON válido con esta estructura:
             ],
             "instructions": settings.ats_system_instructions,
             "tools": ["GroqTools"],
-            "model": "groq"
+            "model": "groq",
+            "max_concurrent_matches": settings.max_concurrent_matches,
+            "workers": {"count": settings.worker_count(), "pid": os.getpid(), "shared_state": settings.multi_worker},
+            "scheduler": self.scheduler.get_stats(),
+            "cascade": {
+                "small_model": settings.cascade_small_model,
+                "large_model": settings.groq_model,
+                "uncertainty_band": [settings.cascade_band_low, settings.cascade_band_high],
+                **self.cascade.get_stats()
+            } if self.cascade is not None else None,
+            "cache": self.cache.get_stats() if self.cache is not None else None,
+            "coalescing": self.single_flight.get_stats() if settings.coalesce_enabled else None,
+            "anonymizer": self.anonymizer.get_stats() if self.anonymizer is not None else None,
+            "history": self.history.get_stats() if self.history is not None else None,
+            "deadline": {
+                "default_seconds": settings.request_deadline_seconds or None,
+                "max_seconds": settings.request_deadline_max_seconds
+            },
+            "hedging": self.hedging.get_stats() if self.hedging is not None else None,
+            "compliance_gate": sorted(self.compliance.gate_checks) if settings.compliance_gate_enabled else [],
+            "skill_matcher": settings.skill_matcher_enabled,
+            "default_scoring_mode": settings.default_scoring_mode,
+            "prompt": {
+                "static_prefix_tokens": self.prompt_builder.static_prefix_tokens,
+                "token_budget": settings.prompt_token_budget,
+                "cv_max_tokens": settings.prompt_cv_max_tokens
+            }
         }
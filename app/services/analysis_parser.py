@@ -0,0 +1,265 @@
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from pydantic import TypeAdapter, ValidationError
+from app.models.schemas import ATSMatchResponse
+from app.services.json_stream import StreamingFieldParser
+
+# Validación directa del análisis en el modelo de respuesta
+ANALYSIS_ADAPTER = TypeAdapter(ATSMatchResponse)
+
+# Campos sin los cuales el análisis no es utilizable
+REQUIRED_FIELDS = ("match_score", "status", "skill_analysis")
+
+_CODE_FENCE = re.compile(r"```(?:json|JSON)?")
+_LITERALS = {"true": "true", "false": "false", "null": "null", "none": "null"}
+_STATUS_ALIASES = {
+    "APROBADO": "APROBADO",
+    "APPROVED": "APROBADO",
+    "RECHAZADO": "RECHAZADO",
+    "REJECTED": "RECHAZADO",
+    "PENDIENTE": "PENDIENTE",
+    "PENDING": "PENDIENTE",
+}
+_TRUTHY = {"true", "si", "sí", "yes", "1", "cumple"}
+
+
+def _strip_trailing_comma(out: List[str]) -> None:
+    """Elimina una coma final (y los espacios que la siguen) del texto reparado"""
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ",":
+        out.pop()
+
+
+def repair_json(text: str) -> str:
+    """
+    Repara los errores de formato más habituales en la salida del modelo
+
+    - Bloques de código markdown y texto antes/después del objeto
+    - Comillas simples, saltos de línea sin escapar dentro de cadenas
+    - Comas finales, comentarios // y signos "%" tras los números
+    - Literales de Python (True/False/None) y claves sin comillas
+    - Salida truncada: cierra cadenas, listas y objetos abiertos
+
+    Returns:
+        Texto JSON reparado (puede seguir siendo inválido si el daño es mayor)
+    """
+    text = _CODE_FENCE.sub("", text)
+    start = text.find("{")
+    if start == -1:
+        return text
+    text = text[start:]
+
+    out: List[str] = []
+    stack: List[str] = []
+    in_string = False
+    quote = '"'
+    escape = False
+    i = 0
+    n = len(text)
+
+    while i < n:
+        ch = text[i]
+        if in_string:
+            if escape:
+                out.append(ch)
+                escape = False
+            elif ch == "\\":
+                out.append(ch)
+                escape = True
+            elif ch == quote:
+                out.append('"')
+                in_string = False
+            elif ch == '"':
+                out.append('\\"')
+            elif ch == "\n":
+                out.append("\\n")
+            elif ch == "\t":
+                out.append("\\t")
+            elif ch != "\r":
+                out.append(ch)
+            i += 1
+            continue
+
+        if ch in "\"'":
+            in_string = True
+            quote = ch
+            out.append('"')
+        elif ch in "{[":
+            stack.append(ch)
+            out.append(ch)
+        elif ch in "}]":
+            _strip_trailing_comma(out)
+            if stack:
+                out.append("}" if stack.pop() == "{" else "]")
+            if not stack:
+                break
+        elif ch == "/" and text.startswith("//", i):
+            newline = text.find("\n", i)
+            i = n if newline == -1 else newline
+            continue
+        elif ch == "%":
+            pass
+        elif ch.isalpha() or ch == "_":
+            j = i
+            while j < n and (text[j].isalnum() or text[j] == "_"):
+                j += 1
+            word = text[i:j]
+            literal = _LITERALS.get(word.lower())
+            out.append(literal if literal else json.dumps(word))
+            i = j
+            continue
+        else:
+            out.append(ch)
+        i += 1
+
+    if in_string:
+        if escape:
+            out.pop()
+        out.append('"')
+    _strip_trailing_comma(out)
+    if out and out[-1] == ":":
+        out.append("null")
+    while stack:
+        _strip_trailing_comma(out)
+        out.append("}" if stack.pop() == "{" else "]")
+    return "".join(out)
+
+
+def _to_score(value: Any) -> Any:
+    """Convierte un score ("85%", "85.5", 85) a float en el rango 0-100"""
+    if isinstance(value, str):
+        try:
+            value = float(value.strip().rstrip("%").replace(",", "."))
+        except ValueError:
+            return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return min(max(float(value), 0.0), 100.0)
+    return value
+
+
+def _to_list(value: Any) -> Any:
+    """Acepta una cadena suelta o null donde se espera una lista de cadenas"""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value] if value.strip() else []
+    return value
+
+
+def _to_bool(value: Any) -> Any:
+    """Acepta "true"/"sí"/"no" donde se espera un booleano"""
+    if isinstance(value, str):
+        return value.strip().lower() in _TRUTHY
+    return value
+
+
+def normalize_analysis(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Corrige desviaciones de tipo frecuentes antes de validar contra el esquema
+
+    Scores como texto o fuera de rango, estados en otro idioma o en minúsculas,
+    listas entregadas como cadena y campos narrativos ausentes.
+    """
+    data = dict(data)
+    data["match_score"] = _to_score(data.get("match_score"))
+    data["experience_score"] = _to_score(data.get("experience_score", 0.0))
+    status = data.get("status")
+    if isinstance(status, str):
+        data["status"] = _STATUS_ALIASES.get(status.strip().upper(), "PENDIENTE")
+
+    skill_analysis = data.get("skill_analysis")
+    if isinstance(skill_analysis, dict):
+        skill_analysis = dict(skill_analysis)
+        skill_analysis["hard_skills_score"] = _to_score(skill_analysis.get("hard_skills_score", 0.0))
+        skill_analysis["soft_skills_score"] = _to_score(skill_analysis.get("soft_skills_score", 0.0))
+        skill_analysis["matched_skills"] = _to_list(skill_analysis.get("matched_skills"))
+        skill_analysis["missing_skills"] = _to_list(skill_analysis.get("missing_skills"))
+        data["skill_analysis"] = skill_analysis
+
+    compliance = data.get("compliance_check")
+    data["compliance_check"] = (
+        {key: _to_bool(value) for key, value in compliance.items()} if isinstance(compliance, dict) else {}
+    )
+    data["recommendations"] = _to_list(data.get("recommendations"))
+    data["summary"] = data.get("summary") or ""
+    data["detailed_analysis"] = data.get("detailed_analysis") or ""
+    return data
+
+
+def validate_analysis(data: Dict[str, Any]) -> ATSMatchResponse:
+    """Normaliza y valida un análisis contra ATSMatchResponse"""
+    return ANALYSIS_ADAPTER.validate_python(normalize_analysis(data))
+
+
+class AnalysisParser:
+    """
+    Extracción incremental y validada del análisis que devuelve el modelo
+
+    Acepta la salida completa o por fragmentos (streaming). Al finalizar:
+    1. Si el objeto JSON se cerró bien, se decodifica directamente
+    2. Si no, se repara el texto (repair_json) sin volver a llamar al modelo
+    3. Si aún falla, se recuperan los campos de primer nivel ya completos
+    El resultado se valida en ATSMatchResponse con un TypeAdapter.
+    """
+
+    def __init__(self):
+        self.fields = StreamingFieldParser()
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Añade un fragmento y devuelve los campos de primer nivel completados"""
+        return self.fields.feed(chunk)
+
+    @property
+    def text(self) -> str:
+        """Texto acumulado de la respuesta"""
+        return self.fields.buffer
+
+    def finalize(self) -> Tuple[Optional[ATSMatchResponse], str]:
+        """
+        Obtiene el análisis validado
+
+        Returns:
+            Tupla (análisis o None si no fue posible, estado: ok | repaired | failed)
+        """
+        if self.fields.finished:
+            candidate = self._decode(self.fields.object_text)
+            if candidate is not None:
+                analysis = self._validate(candidate)
+                if analysis is not None:
+                    return analysis, "ok"
+
+        candidate = self._decode(repair_json(self.text))
+        if candidate is not None:
+            analysis = self._validate(candidate)
+            if analysis is not None:
+                return analysis, "repaired"
+
+        salvaged = dict(self.fields.fields)
+        if salvaged:
+            analysis = self._validate(salvaged)
+            if analysis is not None:
+                return analysis, "repaired"
+        return None, "failed"
+
+    def _decode(self, text: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Decodifica JSON y exige un objeto con los campos imprescindibles"""
+        if not text:
+            return None
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError:
+            return None
+        if not isinstance(data, dict) or any(field not in data for field in REQUIRED_FIELDS):
+            return None
+        return data
+
+    def _validate(self, data: Dict[str, Any]) -> Optional[ATSMatchResponse]:
+        """Valida el diccionario contra el esquema; None si no es válido"""
+        if any(field not in data for field in REQUIRED_FIELDS):
+            return None
+        try:
+            return validate_analysis(data)
+        except ValidationError:
+            return None
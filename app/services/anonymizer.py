@@ -0,0 +1,315 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Pattern, Tuple, Union
+from app.models.schemas import CandidatoData
+from app.services.prompt_builder import estimate_tokens
+from app.services.text import strip_accents
+
+# Marcadores con los que se sustituye cada tipo de dato personal
+EMAIL = "EMAIL"
+PHONE = "TELEFONO"
+NAME = "NOMBRE"
+BIRTH_DATE = "FECHA_NACIMIENTO"
+PERSONAL_ID = "DOCUMENTO"
+ADDRESS = "DIRECCION"
+PROFILE_URL = "PERFIL"
+PERSONAL_DATA = "DATO_PERSONAL"
+
+_DATE = r"(?:\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}|\d{1,2}\s+de\s+[a-záéíóú]+\s+(?:de|del)\s+\d{4}|[a-z]+\s+\d{1,2},?\s+\d{4})"
+_NAME_WORD = r"[A-ZÁÉÍÓÚÑ][a-záéíóúñü]+"
+
+# Sustituciones en orden: los patrones más específicos primero para que un
+# correo o una URL no se confundan con un teléfono o un nombre
+_PATTERNS: List[Tuple[str, Pattern[str]]] = [
+    (EMAIL, re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+", re.UNICODE)),
+    (PROFILE_URL, re.compile(
+        r"(?:https?://)?(?:www\.)?(?:linkedin\.com/in|facebook\.com|instagram\.com|twitter\.com|x\.com)/[\w.-]+/?",
+        re.IGNORECASE
+    )),
+    (BIRTH_DATE, re.compile(
+        r"\b(?:fecha\s+de\s+nacimiento|f\.?\s*de\s*nac\.?|nacid[oa]\s+el|date\s+of\s+birth|birth\s*date|d\.?o\.?b\.?)"
+        r"\s*:?\s*" + _DATE,
+        re.IGNORECASE
+    )),
+    # CURP y RFC (México), DNI/NIE (España) y documentos etiquetados
+    (PERSONAL_ID, re.compile(
+        r"\b[A-Z]{4}\d{6}[HM][A-Z]{5}[A-Z0-9]\d\b|\b[A-ZÑ&]{3,4}\d{6}[A-Z0-9]{3}\b|\b[XYZ]?\d{7,8}-?[A-Z]\b|"
+        r"\b(?:dni|nie|curp|rfc|nss|pasaporte|passport|c[eé]dula)\s*(?:n[ºo°.]*)?\s*:?\s*[A-Z0-9-]{6,20}",
+        re.IGNORECASE
+    )),
+    # Solo la etiqueta ignora mayúsculas: el nombre son palabras capitalizadas
+    # de la misma línea (un salto de línea nunca forma parte del nombre)
+    (NAME, re.compile(
+        r"\b(?i:nombre(?:\s+completo)?\s*:|me\s+llamo|mi\s+nombre\s+es|my\s+name\s+is|name\s*:)[ \t]*"
+        + _NAME_WORD + r"(?:[ \t]+(?:de[ \t]+(?:la[ \t]+)?|del[ \t]+)?" + _NAME_WORD + r"){0,4}"
+    )),
+    (ADDRESS, re.compile(
+        r"\b(?:direcci[oó]n|domicilio|address)\s*:[^\n]*|\bC\.?\s?P\.?\s*\d{5}\b",
+        re.IGNORECASE
+    )),
+    # Datos personales etiquetados que no aportan al matching (edad, sexo, estado civil...)
+    (PERSONAL_DATA, re.compile(
+        r"\b(?:edad|age|sexo|g[eé]nero|gender|estado\s+civil|marital\s+status|nacionalidad|nationality|religi[oó]n)"
+        r"\s*:\s*[^\n,;|]*|\b\d{2}\s+años\s+de\s+edad\b",
+        re.IGNORECASE
+    )),
+    (PHONE, re.compile(r"(?<![\w+$€£])\+?\(?\d[\d\s().-]{6,18}\d(?!\w)")),
+]
+
+# Un teléfono tiene entre 8 y 15 dígitos y no es un rango de años ("2018 - 2022")
+_YEAR_RANGE = re.compile(r"^\(?(?:19|20)\d{2}\)?(?:\s*[-–/.]\s*\(?(?:19|20)\d{2}\)?)*$")
+# Ni un rango de importes con el guion entre espacios ("25000 - 30000")
+_NUMBER_RANGE = re.compile(r"\d\s+[-–]\s+\d")
+# Ni un número precedido en la misma línea por una etiqueta de importe, publicación,
+# certificación o licencia, salvo que la etiqueta más cercana sea la de un teléfono
+_PHONE_LABEL = re.compile(r"\b(?:tel[eé]fono|tel|phone|m[oó]vil|mobile|celular|cel|whatsapp)\b", re.IGNORECASE)
+_NOT_PHONE_LABEL = re.compile(
+    r"(?:\b(?:isbn(?:-?1[03])?|issn|doi|certificaci[oó]n|certificado|certification|certificate|credencial|"
+    r"credential|licencia|license|licence|folio|salario|sueldo|salary|pretensi[oó]n|usd|mxn|eur)\b|[$€£])",
+    re.IGNORECASE
+)
+_AMOUNT_SUFFIX = re.compile(r"^\s*(?:[$€£]|(?:usd|mxn|eur|pesos|euros|d[oó]lares|mil|k)\b|/\s*(?:mes|año|month|year))", re.IGNORECASE)
+
+# Líneas de relleno que no aportan al matching
+_BOILERPLATE = re.compile(
+    r"^(?:curr[ií]cul(?:um|o)(?:\s+vitae)?|hoja\s+de\s+vida|resume|cv|datos\s+personales|personal\s+(?:data|details)|"
+    r"p[aá]gina\s+\d+(?:\s+de\s+\d+)?|page\s+\d+(?:\s+of\s+\d+)?|"
+    r"referencias?(?:\s+\w+)?\s+disponibles?.*|references\s+available.*|"
+    r"(?:declaro|certifico)\s+(?:bajo\s+protesta\s+)?que\s+(?:la\s+)?informaci[oó]n.*)$",
+    re.IGNORECASE
+)
+# Cabecera de la sección de referencias: se descarta hasta la siguiente línea en blanco
+_REFERENCES_HEADING = re.compile(r"^(?:referencias(?:\s+(?:personales|laborales|profesionales))?|references)\s*:?$", re.IGNORECASE)
+
+# Palabras de una primera línea que indican un título profesional y no un nombre
+_TITLE_WORDS = {
+    "desarrollador", "desarrolladora", "ingeniero", "ingeniera", "analista", "disenador", "disenadora",
+    "gerente", "director", "directora", "consultor", "consultora", "lider", "arquitecto", "arquitecta",
+    "developer", "engineer", "analyst", "designer", "manager", "consultant", "architect", "senior", "junior",
+    "frontend", "backend", "fullstack", "perfil", "resumen", "profesional", "experiencia", "objetivo",
+}
+_HEADER_NAME = re.compile(r"^" + _NAME_WORD + r"(?:\s+(?:de\s+(?:la\s+)?|del\s+)?" + _NAME_WORD + r"){1,4}$")
+_HORIZONTAL_SPACE = re.compile(r"[ \t\u00a0\u200b]+")
+_REPEATED_MARKER = re.compile(r"(\[[A-Z_]+\])(?:[\s,;|/·-]*\1)+")
+
+
+@dataclass
+class AnonymizedText:
+    """Texto anonimizado y normalizado con lo que se eliminó"""
+
+    text: str
+    redactions: Dict[str, int] = field(default_factory=dict)
+    chars_removed: int = 0
+    tokens_removed: int = 0
+
+
+@dataclass
+class AnonymizationStats:
+    """Resultado de anonimizar los campos de texto libre de un candidato"""
+
+    redactions: int = 0
+    chars_removed: int = 0
+    tokens_removed: int = 0
+    cache_hits: int = 0
+
+
+def _redact(kind: str) -> Callable[[re.Match], str]:
+    marker = f"[{kind}]"
+    if kind != PHONE:
+        return lambda match: marker
+
+    def redact_phone(match: re.Match) -> str:
+        value = match.group(0)
+        digits = sum(ch.isdigit() for ch in value)
+        if not 8 <= digits <= 15 or _YEAR_RANGE.match(value.strip()) or _NUMBER_RANGE.search(value):
+            return value
+        start, end = match.span()
+        before = match.string[max(start - 40, 0):start].rsplit("\n", 1)[-1]
+        labels = [*_PHONE_LABEL.finditer(before), *_NOT_PHONE_LABEL.finditer(before)]
+        if labels and max(labels, key=lambda label: label.start()).re is _NOT_PHONE_LABEL:
+            return value
+        if _AMOUNT_SUFFIX.match(match.string[end:end + 12]):
+            return value
+        return marker
+    return redact_phone
+
+
+_REPLACEMENTS = [(kind, pattern, _redact(kind)) for kind, pattern in _PATTERNS]
+
+
+def anonymize_text(text: str, is_skill: Optional[Callable[[str], bool]] = None) -> AnonymizedText:
+    """
+    Anonimiza y normaliza un texto libre (CV o información adicional)
+
+    - Sustituye correos, teléfonos, nombres, fechas de nacimiento, documentos,
+      direcciones, perfiles de redes sociales y datos personales etiquetados
+      por marcadores ([EMAIL], [TELEFONO], [NOMBRE]...).
+    - Un nombre en la primera línea del CV (2-5 palabras capitalizadas sin
+      títulos profesionales ni habilidades conocidas) también se trata como nombre.
+    - Elimina líneas de relleno (encabezados "Curriculum Vitae", números de
+      página, "referencias disponibles...") y la sección de referencias.
+    - Colapsa espacios y líneas en blanco.
+
+    Args:
+        text: Texto libre del candidato
+        is_skill: True si un término es una habilidad de la taxonomía
+            (SkillMatcher.is_known); una cabecera con habilidades no es un nombre
+
+    Returns:
+        AnonymizedText con el texto resultante y lo eliminado
+
+    Ejemplos:
+
+    >>> anonymize_text("Language: English, Spanish\\nStage: producción").text
+    'Language: English, Spanish\\nStage: producción'
+    >>> anonymize_text("name: Postgres Main\\nUsername: admin").text
+    '[NOMBRE]\\nUsername: admin'
+    >>> anonymize_text("Python Django Flask", is_skill=lambda term: term in {"python", "django"}).text
+    'Python Django Flask'
+    >>> anonymize_text("Pretensión salarial: 25000 - 30000 MXN\\nISBN 978-3-16-148410-0").text
+    'Pretensión salarial: 25000 - 30000 MXN\\nISBN 978-3-16-148410-0'
+    >>> anonymize_text("AWS Certified Developer, credential ID 1234-5678-90").text
+    'AWS Certified Developer, credential ID 1234-5678-90'
+    >>> anonymize_text("Tel: 55 1234 5678").text
+    'Tel: [TELEFONO]'
+    """
+    redactions: Dict[str, int] = {}
+    result = text
+    for kind, pattern, replace in _REPLACEMENTS:
+        count = 0
+
+        def counted(match: re.Match, replace=replace) -> str:
+            nonlocal count
+            replacement = replace(match)
+            count += replacement != match.group(0)
+            return replacement
+
+        result = pattern.sub(counted, result)
+        if count:
+            redactions[kind] = count
+
+    lines: List[str] = []
+    in_references = False
+    for raw_line in result.splitlines():
+        line = _HORIZONTAL_SPACE.sub(" ", raw_line).strip()
+        if not line:
+            in_references = False
+            continue
+        if in_references or _BOILERPLATE.match(line):
+            continue
+        if _REFERENCES_HEADING.match(line):
+            in_references = True
+            continue
+        if not lines and _looks_like_name(line, is_skill):
+            redactions[NAME] = redactions.get(NAME, 0) + 1
+            line = f"[{NAME}]"
+        lines.append(line)
+    result = _REPEATED_MARKER.sub(r"\1", "\n".join(lines))
+
+    return AnonymizedText(
+        text=result,
+        redactions=redactions,
+        chars_removed=max(len(text) - len(result), 0),
+        tokens_removed=max(estimate_tokens(text) - estimate_tokens(result), 0)
+    )
+
+
+def _looks_like_name(line: str, is_skill: Optional[Callable[[str], bool]] = None) -> bool:
+    """True si la línea es solo un nombre propio (típica cabecera de un CV)"""
+    if not _HEADER_NAME.match(line):
+        return False
+    words = strip_accents(line).lower().split()
+    if any(word in _TITLE_WORDS for word in words):
+        return False
+    if is_skill is None:
+        return True
+    terms = words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+    return not any(is_skill(term) for term in terms)
+
+
+class CVAnonymizer:
+    """
+    Etapa local de anonimización previa a la construcción del prompt
+
+    Los textos anonimizados se cachean por hash de contenido (LRU), así que
+    un mismo CV evaluado contra varias vacantes se procesa una sola vez.
+    """
+
+    def __init__(self, max_entries: int = 4096, is_skill: Optional[Callable[[str], bool]] = None):
+        """
+        Inicializa el anonimizador
+
+        Args:
+            max_entries: Número máximo de textos anonimizados en caché
+            is_skill: True si un término es una habilidad conocida (ver anonymize_text)
+        """
+        self.max_entries = max_entries
+        self.is_skill = is_skill
+        self._entries: "OrderedDict[str, AnonymizedText]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "redactions": 0,
+            "chars_removed": 0,
+            "tokens_removed": 0,
+        }
+
+    def anonymize(self, text: str) -> Tuple[AnonymizedText, bool]:
+        """
+        Anonimiza un texto usando la caché
+
+        Returns:
+            Tupla (texto anonimizado, True si venía de la caché)
+        """
+        key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return cached, True
+        result = anonymize_text(text, self.is_skill)
+        with self._lock:
+            self._stats["misses"] += 1
+            self._entries[key] = result
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result, False
+
+    def anonymize_candidato(self, candidato: CandidatoData) -> Tuple[CandidatoData, AnonymizationStats]:
+        """
+        Copia del candidato con cv_text y additional_info anonimizados
+
+        Returns:
+            Tupla (candidato anonimizado, totales de lo eliminado)
+        """
+        stats = AnonymizationStats()
+        update: Dict[str, Any] = {}
+        for name in ("cv_text", "additional_info"):
+            value: Optional[str] = getattr(candidato, name)
+            if not value:
+                continue
+            result, cached = self.anonymize(value)
+            update[name] = result.text
+            stats.redactions += sum(result.redactions.values())
+            stats.chars_removed += result.chars_removed
+            stats.tokens_removed += result.tokens_removed
+            stats.cache_hits += cached
+        with self._lock:
+            self._stats["redactions"] += stats.redactions
+            self._stats["chars_removed"] += stats.chars_removed
+            self._stats["tokens_removed"] += stats.tokens_removed
+        return candidato.model_copy(update=update), stats
+
+    def get_stats(self) -> Dict[str, Union[int, float]]:
+        """Aciertos de la caché y totales de datos redactados, caracteres y tokens eliminados"""
+        with self._lock:
+            stats: Dict[str, Union[int, float]] = dict(self._stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
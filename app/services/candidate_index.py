@@ -0,0 +1,185 @@
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from app.models.schemas import VacanteData, CandidatoData
+from app.services.compliance import ComplianceEngine
+from app.services.scoring import HARD_SKILLS_WEIGHT, EXPERIENCE_WEIGHT, SOFT_SKILLS_WEIGHT
+from app.services.skill_matcher import SkillMatcher
+from app.services.text import normalize_text
+
+
+def prefilter_scores(
+    hard_coverage: np.ndarray,
+    soft_coverage: np.ndarray,
+    years: np.ndarray,
+    required_years: int,
+    compliance_mask: np.ndarray
+) -> np.ndarray:
+    """
+    Score de pre-filtrado (0-100) a partir de las columnas de un pool
+
+    Usa la misma ponderación 50/30/20 que el análisis completo; los
+    candidatos que no superan el compliance obtienen 0.
+
+    Args:
+        hard_coverage: Fracción (0-1) de hard skills cubiertas por candidato
+        soft_coverage: Fracción (0-1) de soft skills cubiertas por candidato
+        years: Años de experiencia por candidato
+        required_years: Años requeridos por la vacante
+        compliance_mask: Candidatos que superan los checks de compliance activos
+
+    Returns:
+        Array float32 con un score por candidato
+    """
+    if required_years > 0:
+        experience = np.minimum(years / required_years, 1.0)
+    else:
+        experience = np.ones(len(years), dtype=np.float32)
+    scores = 100 * (
+        HARD_SKILLS_WEIGHT * hard_coverage + EXPERIENCE_WEIGHT * experience + SOFT_SKILLS_WEIGHT * soft_coverage
+    )
+    scores = np.where(compliance_mask, scores, 0.0)
+    return np.round(scores, 1).astype(np.float32)
+
+
+def top_k_scores(scores: np.ndarray, k: int, min_score: float = 0.0) -> List[Tuple[int, float]]:
+    """
+    Posiciones de los K mayores scores (estrictamente mayores que min_score)
+
+    Returns:
+        Lista de (posición, score) ordenada de mayor a menor; a igual score, por posición
+    """
+    eligible = np.flatnonzero(scores > min_score)
+    if eligible.size == 0:
+        return []
+    k = min(k, eligible.size)
+    top = eligible[np.argpartition(-scores[eligible], k - 1)[:k]]
+    top = top[np.lexsort((top, -scores[top]))]
+    return [(int(i), float(scores[i])) for i in top]
+
+
+class CandidateIndex:
+    """
+    Índice invertido sobre un pool de candidatos para el pre-filtrado
+
+    Indexa por candidato las habilidades canónicas declaradas, los n-gramas de
+    palabras del CV (1-2), las partes normalizadas de la ubicación, los años
+    de experiencia, el permiso de trabajo y el nivel educativo. Con eso se
+    puntúa todo el pool para una vacante en una sola pasada vectorizada, sin
+    llamar al modelo.
+    """
+
+    def __init__(
+        self,
+        candidatos: Sequence[CandidatoData],
+        skill_matcher: SkillMatcher,
+        compliance: ComplianceEngine
+    ):
+        """
+        Construye el índice
+
+        Args:
+            candidatos: Pool de candidatos (la posición en la lista es su id)
+            skill_matcher: Motor de skills usado para canonicalizar habilidades
+            compliance: Motor de compliance usado para normalizar ubicación y educación
+        """
+        self.size = len(candidatos)
+        self.skill_matcher = skill_matcher
+        self.compliance = compliance
+
+        terms: Dict[str, List[int]] = defaultdict(list)
+        locations: Dict[str, List[int]] = defaultdict(list)
+        years = np.zeros(self.size, dtype=np.float32)
+        permits = np.zeros(self.size, dtype=bool)
+        education = np.full(self.size, -1, dtype=np.int16)
+
+        for doc_id, candidato in enumerate(candidatos):
+            doc_terms = {skill_matcher.canonicalize(skill) for skill in candidato.skills}
+            words = normalize_text(candidato.cv_text).split()
+            doc_terms.update(words)
+            doc_terms.update(" ".join(words[i:i + 2]) for i in range(len(words) - 1))
+            for term in doc_terms:
+                terms[term].append(doc_id)
+            for part in set(compliance.normalize_location(candidato.location)):
+                locations[part].append(doc_id)
+            years[doc_id] = candidato.years_experience
+            permits[doc_id] = candidato.has_work_permit
+            level = compliance.education_level(candidato.education)
+            education[doc_id] = -1 if level is None else level
+
+        self._terms = {term: np.asarray(ids, dtype=np.int32) for term, ids in terms.items()}
+        self._locations = {part: np.asarray(ids, dtype=np.int32) for part, ids in locations.items()}
+        self.years = years
+        self.permits = permits
+        self.education = education
+
+    def _postings_for_skill(self, skill: str) -> Optional[np.ndarray]:
+        """Candidatos que mencionan una habilidad por su forma canónica o algún alias"""
+        canonical = self.skill_matcher.canonicalize(skill)
+        postings = [self._terms[form] for form in {canonical, *self.skill_matcher.surface_forms(canonical)} if form in self._terms]
+        if not postings:
+            return None
+        return np.unique(np.concatenate(postings))
+
+    def _coverage(self, skills: Sequence[str]) -> np.ndarray:
+        """Fracción (0-1) de las habilidades dadas que cubre cada candidato"""
+        skills = [skill for skill in skills if skill and skill.strip()]
+        if not skills:
+            return np.ones(self.size, dtype=np.float32)
+        counts = np.zeros(self.size, dtype=np.float32)
+        for skill in skills:
+            postings = self._postings_for_skill(skill)
+            if postings is not None:
+                counts[postings] += 1.0
+        return counts / len(skills)
+
+    def compliance_mask(self, vacante: VacanteData) -> np.ndarray:
+        """Máscara booleana de los candidatos que superan los checks de compliance activos"""
+        mask = np.ones(self.size, dtype=bool)
+        gate = self.compliance.gate_checks
+        if "has_work_permit" in gate and vacante.work_permit_required:
+            mask &= self.permits
+        required_locations = self.compliance.location_requirement(vacante.location_required)
+        if "location_match" in gate and required_locations:
+            location_ok = np.zeros(self.size, dtype=bool)
+            for part in required_locations:
+                for indexed_part, ids in self._locations.items():
+                    if indexed_part == part or f" {part} " in f" {indexed_part} ":
+                        location_ok[ids] = True
+            mask &= location_ok
+        required_level = self.compliance.required_education_level(vacante.education)
+        if "education_match" in gate and required_level is not None:
+            mask &= (self.education < 0) | (self.education >= required_level)
+        return mask
+
+    def score(self, vacante: VacanteData) -> np.ndarray:
+        """
+        Score de pre-filtrado (0-100) de todo el pool para una vacante
+
+        Usa la misma ponderación 50/30/20 que el análisis completo; los
+        candidatos que no superan el compliance obtienen 0.
+
+        Returns:
+            Array float32 con un score por candidato
+        """
+        return prefilter_scores(
+            self._coverage(vacante.hard_skills),
+            self._coverage(vacante.soft_skills or []),
+            self.years,
+            vacante.years_experience,
+            self.compliance_mask(vacante)
+        )
+
+    def top_k(self, vacante: VacanteData, k: int, min_score: float = 0.0) -> List[Tuple[int, float]]:
+        """
+        Los K mejores candidatos según el score de pre-filtrado
+
+        Args:
+            vacante: Vacante contra la que se puntúa
+            k: Número máximo de candidatos a devolver
+            min_score: Solo se devuelven candidatos con score estrictamente mayor
+
+        Returns:
+            Lista de (índice del candidato, score) ordenada de mayor a menor
+        """
+        return top_k_scores(self.score(vacante), k, min_score)
@@ -0,0 +1,214 @@
+import codecs
+import csv
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+from pydantic import ValidationError
+from app.models.schemas import CandidatoData, UploadFormat
+
+# Columnas de lista en CSV: JSON ("[...]") o valores separados por ";" o "|" (o "," si no hay otro)
+LIST_FIELDS = ("skills", "languages")
+_LIST_SEPARATORS = (";", "|", ",")
+_TRUE_VALUES = {"si", "sí", "s", "x"}
+_FALSE_VALUES = {"no", "n", ""}
+
+# Fila del archivo: (índice de la fila de datos, línea donde empieza, candidato o error)
+IngestRow = Tuple[int, int, Union[CandidatoData, "RowError"]]
+
+
+class RowError(ValueError):
+    """Fila del archivo que no se pudo convertir en un candidato"""
+
+
+class UploadLimitExceeded(RowError):
+    """El archivo supera el número máximo de filas; la ingesta se detiene"""
+
+
+def describe_validation_error(error: ValidationError) -> str:
+    """Resumen de una línea de los errores de validación de una fila"""
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc']) or 'fila'}: {item['msg']}"
+        for item in error.errors()
+    )
+
+
+async def aiter_lines(
+    chunks: AsyncIterator[bytes],
+    max_line_bytes: int
+) -> AsyncIterator[Tuple[int, Union[str, RowError]]]:
+    """
+    Divide un flujo de bytes UTF-8 en líneas sin cargarlo entero
+
+    Args:
+        chunks: Fragmentos del body tal como llegan
+        max_line_bytes: Tamaño máximo de una línea; las más largas se descartan
+
+    Yields:
+        Tuplas (número de línea, texto sin salto de línea o RowError si era demasiado larga)
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    buffer = ""
+    line_number = 0
+    discarding = False
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        while True:
+            newline = buffer.find("\n")
+            if newline < 0:
+                break
+            line, buffer = buffer[:newline], buffer[newline + 1:]
+            line_number += 1
+            if discarding:
+                discarding = False
+                yield line_number, RowError(f"La línea supera el máximo de {max_line_bytes} bytes")
+            else:
+                yield line_number, line.rstrip("\r")
+        if len(buffer) > max_line_bytes:
+            # Se descarta hasta el siguiente salto de línea para no crecer sin límite
+            buffer = ""
+            discarding = True
+    buffer += decoder.decode(b"", final=True)
+    if discarding:
+        yield line_number + 1, RowError(f"La línea supera el máximo de {max_line_bytes} bytes")
+    elif buffer.strip():
+        yield line_number + 1, buffer.rstrip("\r")
+
+
+async def aiter_records(
+    lines: AsyncIterator[Tuple[int, Union[str, RowError]]],
+    fmt: UploadFormat,
+    max_row_bytes: int
+) -> AsyncIterator[Tuple[int, Union[Dict[str, Any], RowError]]]:
+    """
+    Convierte las líneas en registros (diccionarios) según el formato
+
+    En CSV la primera línea es la cabecera y un campo entre comillas puede
+    ocupar varias líneas: las líneas se acumulan hasta que las comillas quedan
+    balanceadas.
+
+    Yields:
+        Tuplas (línea donde empieza el registro, diccionario o RowError)
+    """
+    if fmt == UploadFormat.JSONL:
+        async for line_number, line in lines:
+            if isinstance(line, RowError):
+                yield line_number, line
+                continue
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_number, RowError(f"JSON inválido: {e.msg} (columna {e.colno})")
+                continue
+            if not isinstance(record, dict):
+                yield line_number, RowError("Cada línea debe ser un objeto JSON")
+                continue
+            yield line_number, record
+        return
+
+    header: Optional[List[str]] = None
+    pending: List[str] = []
+    pending_bytes = 0
+    start = 0
+    async for line_number, line in lines:
+        if isinstance(line, RowError):
+            pending, pending_bytes = [], 0
+            yield line_number, line
+            continue
+        if not pending:
+            if not line.strip():
+                continue
+            start = line_number
+        pending.append(line)
+        pending_bytes += len(line) + 1
+        text = "\n".join(pending)
+        if text.count('"') % 2:
+            if pending_bytes > max_row_bytes:
+                pending, pending_bytes = [], 0
+                yield start, RowError(f"El registro supera el máximo de {max_row_bytes} bytes")
+            continue
+        pending, pending_bytes = [], 0
+        try:
+            values = next(csv.reader([text]))
+        except csv.Error as e:
+            yield start, RowError(f"CSV inválido: {e}")
+            continue
+        if header is None:
+            header = [name.strip().lower() for name in values]
+            continue
+        if len(values) != len(header):
+            yield start, RowError(f"Se esperaban {len(header)} columnas y hay {len(values)}")
+            continue
+        yield start, csv_record(dict(zip(header, values)))
+    if pending:
+        yield start, RowError("Comillas sin cerrar al final del archivo")
+
+
+def csv_record(row: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Adapta una fila CSV (todo texto) a los campos de CandidatoData
+
+    Las columnas vacías se omiten (los campos opcionales quedan en None), las
+    de lista se dividen y los booleanos aceptan también "sí"/"no".
+    """
+    record: Dict[str, Any] = {}
+    for name, value in row.items():
+        value = value.strip()
+        if name in LIST_FIELDS:
+            record[name] = _split_list(value)
+        elif name == "has_work_permit" and value.lower() in _TRUE_VALUES | _FALSE_VALUES:
+            record[name] = value.lower() in _TRUE_VALUES
+        elif value:
+            record[name] = value
+    return record
+
+
+def _split_list(value: str) -> Any:
+    """Lista de una celda CSV: JSON si empieza por "[" o texto separado"""
+    if value.startswith("["):
+        try:
+            return json.loads(value)
+        except json.JSONDecodeError:
+            pass
+    for separator in _LIST_SEPARATORS:
+        if separator in value:
+            return [item.strip() for item in value.split(separator) if item.strip()]
+    return [value] if value else []
+
+
+async def aiter_candidatos(
+    chunks: AsyncIterator[bytes],
+    fmt: UploadFormat,
+    max_row_bytes: int,
+    max_rows: int
+) -> AsyncIterator[IngestRow]:
+    """
+    Pipeline perezoso body → líneas → registros → CandidatoData
+
+    Cada etapa es un generador asíncrono, así que solo hay en memoria la fila
+    en curso: el body se sigue leyendo a medida que el consumidor pide filas.
+    Las filas inválidas se entregan como RowError sin detener la ingesta.
+
+    Args:
+        chunks: Fragmentos del body (p. ej. request.stream())
+        fmt: csv o jsonl
+        max_row_bytes: Tamaño máximo de una fila
+        max_rows: Número máximo de filas de datos; al superarlo se entrega un
+            UploadLimitExceeded y se deja de leer
+
+    Yields:
+        Tuplas (índice de la fila de datos, línea donde empieza, candidato o RowError)
+    """
+    index = 0
+    async for line_number, record in aiter_records(aiter_lines(chunks, max_row_bytes), fmt, max_row_bytes):
+        if index >= max_rows:
+            yield index, line_number, UploadLimitExceeded(f"El archivo supera el máximo de {max_rows} filas")
+            return
+        if isinstance(record, RowError):
+            yield index, line_number, record
+        else:
+            try:
+                yield index, line_number, CandidatoData(**record)
+            except ValidationError as e:
+                yield index, line_number, RowError(describe_validation_error(e))
+        index += 1
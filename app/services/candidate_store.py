@@ -0,0 +1,432 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from app.models.schemas import CandidatoData
+from app.services.candidate_index import prefilter_scores, top_k_scores
+from app.services.compliance import ComplianceEngine, LOCATION_CHECK, WORK_PERMIT_CHECK, EDUCATION_CHECK, MAX_LOCATION_WORDS
+from app.services.match_cache import fingerprint_candidato
+from app.services.skill_matcher import SkillMatcher, SkillRequirements
+
+# Longitud (en caracteres hex) del identificador público de un candidato
+CANDIDATO_ID_LENGTH = 16
+
+# Firma de términos por candidato (filtro de Bloom): bits y funciones hash
+SIGNATURE_BITS = 16384
+SIGNATURE_HASHES = 2
+
+# Fila de la matriz de features (memory-mapped): columnas numéricas + firma de términos
+FEATURE_DTYPE = np.dtype([
+    ("years", np.float32),
+    ("has_work_permit", np.bool_),
+    ("education", np.int16),
+    ("signature", np.uint8, (SIGNATURE_BITS // 8,)),
+])
+
+# Filas de la matriz que se puntúan por bloque en el ranking
+SCORING_CHUNK_ROWS = 8192
+
+_LOCATION_PREFIX = "loc:"
+
+# Versión del cálculo de las filas; al cambiarla, las matrices existentes se recalculan al abrir el almacén
+FEATURES_VERSION = 2
+
+
+def term_bits(term: str) -> List[int]:
+    """Posiciones de la firma que activa un término"""
+    data = term.encode("utf-8")
+    return [zlib.crc32(data, seed) % SIGNATURE_BITS for seed in range(1, SIGNATURE_HASHES + 1)]
+
+
+@dataclass
+class StoredCandidato:
+    """Candidato almacenado con sus datos derivados ya calculados"""
+
+    candidato_id: str
+    row: int
+    candidato: CandidatoData
+    fingerprint: str
+    terms: List[str]
+    text: str
+
+    @property
+    def candidate_terms(self) -> Tuple[List[str], str]:
+        """Términos y texto normalizado en el formato de SkillMatcher.candidate_terms"""
+        return self.terms, self.text
+
+
+class CandidateStore:
+    """
+    Almacén persistente de perfiles de candidatos
+
+    Cada perfil se guarda en SQLite junto con sus habilidades canónicas y los
+    términos normalizados del CV, de modo que el matching no vuelve a procesar
+    cv_text. Para el ranking, cada candidato ocupa una fila de tamaño fijo en
+    una matriz memory-mapped (FEATURE_DTYPE): años de experiencia, permiso de
+    trabajo, nivel educativo y una firma de bits de sus términos y ubicación.
+    Solo las páginas que se leen entran en memoria, así que el consumo se
+    mantiene plano aunque el pool crezca a cientos de miles de perfiles.
+
+    Varios procesos pueden compartir la base y la matriz: las altas se
+    serializan con BEGIN IMMEDIATE y cada proceso incorpora las filas de los
+    demás al consultar.
+    """
+
+    def __init__(
+        self,
+        skill_matcher: SkillMatcher,
+        compliance: ComplianceEngine,
+        sqlite_path: Optional[str] = None,
+        features_path: Optional[str] = None,
+        initial_capacity: int = 1024
+    ):
+        """
+        Inicializa el almacén
+
+        Args:
+            skill_matcher: Motor de skills usado para canonicalizar y extraer términos
+            compliance: Motor de compliance usado para normalizar ubicación y educación
+            sqlite_path: Ruta de la base SQLite; None o vacío la mantiene en memoria
+            features_path: Ruta del archivo de la matriz de features; None o vacío la mantiene en memoria
+            initial_capacity: Filas reservadas inicialmente en la matriz
+        """
+        self.skill_matcher = skill_matcher
+        self.compliance = compliance
+        self.features_path = features_path or None
+        self._lock = threading.Lock()
+
+        self._db = sqlite3.connect(sqlite_path or ":memory:", check_same_thread=False, timeout=10.0)
+        if sqlite_path:
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS candidatos ("
+            "id TEXT PRIMARY KEY, row INTEGER NOT NULL UNIQUE, fingerprint TEXT NOT NULL, "
+            "data TEXT NOT NULL, skills TEXT NOT NULL, terms TEXT NOT NULL, text TEXT NOT NULL, "
+            "created_at REAL NOT NULL)"
+        )
+        self._db.commit()
+        self.size = self._db.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM candidatos").fetchone()[0]
+
+        self._features = self._open_features(max(initial_capacity, self.size))
+        if self.features_path and self._features_stale():
+            self._rebuild_features()
+
+    @property
+    def features(self) -> np.ndarray:
+        """Filas ocupadas de la matriz de features"""
+        with self._lock:
+            self._refresh()
+            return self._features[:self.size]
+
+    def add(self, candidato: CandidatoData) -> Tuple[StoredCandidato, bool]:
+        """
+        Guarda (o recupera) un candidato
+
+        Returns:
+            Tupla (candidato almacenado, True si no existía)
+        """
+        stored, created = self.add_many([candidato])
+        return stored[0], created[0]
+
+    def add_many(self, candidatos: Sequence[CandidatoData]) -> Tuple[List[StoredCandidato], List[bool]]:
+        """
+        Guarda varios candidatos en una sola transacción
+
+        Returns:
+            Tupla (candidatos almacenados, True por cada candidato que no existía)
+        """
+        results: List[StoredCandidato] = []
+        created: List[bool] = []
+        with self._lock:
+            # Bloquea la base para que otro proceso no asigne las mismas filas
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._refresh()
+                self._insert(candidatos, results, created)
+            except BaseException:
+                self._db.rollback()
+                self.size = self._db.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM candidatos").fetchone()[0]
+                raise
+            self._db.commit()
+            if isinstance(self._features, np.memmap):
+                self._features.flush()
+        return results, created
+
+    def get(self, candidato_id: str) -> Optional[StoredCandidato]:
+        """
+        Obtiene un candidato almacenado
+
+        Returns:
+            El candidato o None si el id no existe
+        """
+        with self._lock:
+            return self._load(candidato_id)
+
+    def get_many(self, candidato_ids: Sequence[str]) -> Tuple[List[StoredCandidato], List[str]]:
+        """
+        Obtiene varios candidatos almacenados
+
+        Returns:
+            Tupla (candidatos encontrados en el orden pedido, ids que no existen)
+        """
+        found: List[StoredCandidato] = []
+        missing: List[str] = []
+        with self._lock:
+            for candidato_id in candidato_ids:
+                stored = self._load(candidato_id)
+                if stored is None:
+                    missing.append(candidato_id)
+                else:
+                    found.append(stored)
+        return found, missing
+
+    def get_rows(self, rows: Sequence[int]) -> List[StoredCandidato]:
+        """Carga los candidatos de unas filas concretas de la matriz, en el orden pedido"""
+        with self._lock:
+            ids = [
+                self._db.execute("SELECT id FROM candidatos WHERE row = ?", (int(row),)).fetchone()[0]
+                for row in rows
+            ]
+            return [self._load(candidato_id) for candidato_id in ids]
+
+    def rows_for(self, candidato_ids: Sequence[str]) -> Tuple[np.ndarray, List[str]]:
+        """
+        Filas de la matriz de features de una lista de ids (sin cargar los perfiles)
+
+        Returns:
+            Tupla (array de filas en el orden pedido, ids que no existen)
+        """
+        rows: Dict[str, int] = {}
+        with self._lock:
+            self._refresh()
+            unique_ids = list(dict.fromkeys(candidato_ids))
+            # SQLite limita el número de parámetros por consulta
+            for start in range(0, len(unique_ids), 500):
+                chunk = unique_ids[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows.update(self._db.execute(
+                    f"SELECT id, row FROM candidatos WHERE id IN ({placeholders})", chunk
+                ).fetchall())
+        missing = [candidato_id for candidato_id in unique_ids if candidato_id not in rows]
+        return np.asarray([rows.get(candidato_id, -1) for candidato_id in candidato_ids], dtype=np.int64), missing
+
+    def top_k(
+        self,
+        skills: Tuple[SkillRequirements, SkillRequirements],
+        required_years: int,
+        work_permit_required: bool,
+        location_parts: Sequence[str],
+        education_level: Optional[int],
+        rows: np.ndarray,
+        k: int,
+        min_score: float = 0.0
+    ) -> List[Tuple[int, float]]:
+        """
+        Pre-filtrado de un subconjunto de candidatos almacenados desde la matriz de features
+
+        Misma ponderación que CandidateIndex; las habilidades se comprueban contra
+        la firma de términos de cada fila, sin cargar ni procesar los CVs.
+
+        Args:
+            skills: Requisitos de hard y soft skills precompilados de la vacante
+            required_years: Años requeridos por la vacante
+            work_permit_required: Si la vacante exige permiso de trabajo
+            location_parts: Ubicaciones aceptadas por la vacante (basta una; vacío = cualquiera)
+            education_level: Nivel educativo requerido o None
+            rows: Filas de la matriz a puntuar
+            k: Número máximo de candidatos a devolver
+            min_score: Solo se devuelven candidatos con score estrictamente mayor
+
+        Returns:
+            Lista de (posición en rows, score) ordenada de mayor a menor
+        """
+        scores = np.empty(len(rows), dtype=np.float32)
+        # Por bloques: solo un bloque de filas de la matriz se copia a memoria a la vez
+        for start in range(0, len(rows), SCORING_CHUNK_ROWS):
+            features = self._features[rows[start:start + SCORING_CHUNK_ROWS]]
+            signatures = features["signature"]
+            gate = self.compliance.gate_checks
+
+            mask = np.ones(len(features), dtype=bool)
+            if WORK_PERMIT_CHECK in gate and work_permit_required:
+                mask &= features["has_work_permit"]
+            if LOCATION_CHECK in gate and location_parts:
+                location_ok = np.zeros(len(features), dtype=bool)
+                for part in location_parts:
+                    location_ok |= self._has_term(signatures, _LOCATION_PREFIX + part)
+                mask &= location_ok
+            if EDUCATION_CHECK in gate and education_level is not None:
+                mask &= (features["education"] < 0) | (features["education"] >= education_level)
+
+            scores[start:start + len(features)] = prefilter_scores(
+                self._coverage(signatures, skills[0]),
+                self._coverage(signatures, skills[1]),
+                features["years"],
+                required_years,
+                mask
+            )
+        return top_k_scores(scores, k, min_score)
+
+    def _coverage(self, signatures: np.ndarray, requirements: SkillRequirements) -> np.ndarray:
+        """Fracción (0-1) de las habilidades requeridas presentes en cada firma"""
+        if not requirements.skills:
+            return np.ones(len(signatures), dtype=np.float32)
+        counts = np.zeros(len(signatures), dtype=np.float32)
+        for canonical, forms in zip(requirements.canonicals, requirements.surface_forms):
+            present = np.zeros(len(signatures), dtype=bool)
+            for form in {canonical, *forms}:
+                present |= self._has_term(signatures, form)
+            counts += present
+        return counts / len(requirements.skills)
+
+    def _has_term(self, signatures: np.ndarray, term: str) -> np.ndarray:
+        """Filas cuya firma contiene un término (puede haber falsos positivos, nunca falsos negativos)"""
+        present = np.ones(len(signatures), dtype=bool)
+        for bit in term_bits(term):
+            present &= (signatures[:, bit >> 3] & np.uint8(1 << (bit & 7))) != 0
+        return present
+
+    def _feature_row(self, stored: StoredCandidato) -> np.ndarray:
+        """Fila de la matriz de features de un candidato"""
+        candidato = stored.candidato
+        row = np.zeros((), dtype=FEATURE_DTYPE)
+        row["years"] = candidato.years_experience
+        row["has_work_permit"] = candidato.has_work_permit
+        level = self.compliance.education_level(candidato.education)
+        row["education"] = -1 if level is None else level
+
+        # Mismos términos que CandidateIndex: habilidades canónicas y 1-2-gramas del texto
+        words = stored.text.split()
+        terms = {self.skill_matcher.canonicalize(skill) for skill in candidato.skills}
+        terms.update(words)
+        terms.update(" ".join(words[i:i + 2]) for i in range(len(words) - 1))
+        for part in self.compliance.normalize_location(candidato.location):
+            part_words = part.split()
+            for size in range(1, MAX_LOCATION_WORDS + 1):
+                for i in range(len(part_words) - size + 1):
+                    terms.add(_LOCATION_PREFIX + " ".join(part_words[i:i + size]))
+        terms.discard("")
+        terms.add(f"version:{FEATURES_VERSION}")
+
+        bits = np.zeros(SIGNATURE_BITS, dtype=np.uint8)
+        bits[[bit for term in terms for bit in term_bits(term)]] = 1
+        row["signature"] = np.packbits(bits, bitorder="little")
+        return row
+
+    def _insert(
+        self,
+        candidatos: Sequence[CandidatoData],
+        results: List[StoredCandidato],
+        created: List[bool]
+    ) -> None:
+        """Inserta los candidatos nuevos dentro de la transacción de add_many (requiere el lock)"""
+        pending: Dict[str, StoredCandidato] = {}
+        for candidato in candidatos:
+            fingerprint = fingerprint_candidato(candidato)
+            candidato_id = fingerprint[:CANDIDATO_ID_LENGTH]
+            existing = pending.get(candidato_id) or self._load(candidato_id)
+            if existing is not None:
+                results.append(existing)
+                created.append(False)
+                continue
+
+            terms, text = self.skill_matcher.candidate_terms(candidato)
+            stored = StoredCandidato(candidato_id, self.size, candidato, fingerprint, terms, text)
+            self._ensure_capacity(self.size + 1)
+            self._features[stored.row] = self._feature_row(stored)
+            self._db.execute(
+                "INSERT INTO candidatos (id, row, fingerprint, data, skills, terms, text, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    candidato_id,
+                    stored.row,
+                    fingerprint,
+                    candidato.model_dump_json(),
+                    json.dumps(sorted({self.skill_matcher.canonicalize(s) for s in candidato.skills}), ensure_ascii=False),
+                    json.dumps(terms, ensure_ascii=False),
+                    text,
+                    time.time()
+                )
+            )
+            self.size += 1
+            pending[candidato_id] = stored
+            results.append(stored)
+            created.append(True)
+
+    def _load(self, candidato_id: str) -> Optional[StoredCandidato]:
+        """Carga un candidato desde SQLite (requiere el lock)"""
+        row = self._db.execute(
+            "SELECT row, fingerprint, data, terms, text FROM candidatos WHERE id = ?", (candidato_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return StoredCandidato(
+            candidato_id=candidato_id,
+            row=row[0],
+            candidato=CandidatoData(**json.loads(row[2])),
+            fingerprint=row[1],
+            terms=json.loads(row[3]),
+            text=row[4]
+        )
+
+    def _open_features(self, capacity: int) -> np.ndarray:
+        """Abre (o crea) la matriz de features con al menos `capacity` filas"""
+        if not self.features_path:
+            return np.zeros(capacity, dtype=FEATURE_DTYPE)
+        existing = os.path.getsize(self.features_path) // FEATURE_DTYPE.itemsize if os.path.exists(self.features_path) else 0
+        if existing < capacity:
+            with open(self.features_path, "ab") as handle:
+                handle.truncate(capacity * FEATURE_DTYPE.itemsize)
+        capacity = max(capacity, existing)
+        return np.memmap(self.features_path, dtype=FEATURE_DTYPE, mode="r+", shape=(capacity,))
+
+    def _ensure_capacity(self, rows: int) -> None:
+        """Amplía la matriz (duplicando su tamaño) si no caben `rows` filas (requiere el lock)"""
+        capacity = len(self._features)
+        if rows <= capacity:
+            return
+        new_capacity = max(rows, capacity * 2)
+        if isinstance(self._features, np.memmap):
+            self._features.flush()
+            del self._features
+            self._features = self._open_features(new_capacity)
+        else:
+            grown = np.zeros(new_capacity, dtype=FEATURE_DTYPE)
+            grown[:capacity] = self._features
+            self._features = grown
+
+    def _refresh(self) -> None:
+        """Incorpora las filas añadidas por otros procesos que comparten la base (requiere el lock)"""
+        size = self._db.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM candidatos").fetchone()[0]
+        if size > len(self._features):
+            if isinstance(self._features, np.memmap):
+                # El otro proceso ya amplió el archivo: solo hay que volver a mapearlo
+                self._features.flush()
+                del self._features
+                self._features = self._open_features(size)
+            else:
+                self._ensure_capacity(size)
+        self.size = size
+
+    def _features_stale(self) -> bool:
+        """True si la matriz en disco no corresponde a los perfiles de SQLite"""
+        if self.size == 0:
+            return False
+        last = self._db.execute("SELECT id FROM candidatos WHERE row = ?", (self.size - 1,)).fetchone()
+        if last is None:
+            return True
+        stored = self._load(last[0])
+        return not np.array_equal(self._features[stored.row], self._feature_row(stored))
+
+    def _rebuild_features(self) -> None:
+        """Recalcula la matriz de features desde SQLite (p. ej. si el archivo se perdió)"""
+        for (candidato_id,) in self._db.execute("SELECT id FROM candidatos ORDER BY row").fetchall():
+            stored = self._load(candidato_id)
+            self._features[stored.row] = self._feature_row(stored)
+        if isinstance(self._features, np.memmap):
+            self._features.flush()
@@ -0,0 +1,380 @@
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+from app.models.schemas import VacanteData, CandidatoData
+from app.services.scoring import exact_skill_overlap, experience_score
+from app.services.text import normalize_text
+
+# Alias de ubicaciones frecuentes (texto normalizado -> forma canónica)
+DEFAULT_LOCATION_ALIASES: Dict[str, str] = {
+    "cdmx": "ciudad de mexico",
+    "df": "ciudad de mexico",
+    "mexico df": "ciudad de mexico",
+    "ciudad de mexico df": "ciudad de mexico",
+    "mexico city": "ciudad de mexico",
+    "gdl": "guadalajara",
+    "mty": "monterrey",
+    "bogota dc": "bogota",
+    "caba": "buenos aires",
+    "capital federal": "buenos aires",
+    "nyc": "new york",
+}
+
+# Términos que indican que la vacante no exige una ubicación concreta
+REMOTE_KEYWORDS = ("remoto", "remote", "flexible", "teletrabajo", "home office", "anywhere", "cualquier")
+
+# Términos que vuelven ambigua una ubicación requerida: no se filtra y decide el modelo
+AMBIGUOUS_LOCATION_KEYWORDS = (
+    "preferentemente", "preferible", "preferiblemente", "deseable", "idealmente", "cerca", "cercania",
+    "alrededores", "reubicacion", "relocation", "viajar", "latam", "latinoamerica", "america latina",
+    "europa", "emea",
+)
+
+# Palabras de modalidad que acompañan a la ubicación sin formar parte de ella
+LOCATION_MODALITY_WORDS = frozenset((
+    "hibrido", "hibrida", "hybrid", "presencial", "presencialmente", "onsite", "oficina", "oficinas",
+    "modalidad", "sede", "sitio",
+))
+
+# Conectores que quedan al inicio al quitar la modalidad ("Presencial en CDMX")
+_LOCATION_LEADING_WORDS = frozenset(("en", "in", "on", "de", "desde"))
+
+# Palabras máximas de la parte requerida (la firma del almacén indexa n-gramas de hasta este tamaño)
+MAX_LOCATION_WORDS = 3
+
+# Alternativas dentro de una ubicación ("CDMX o Guadalajara", "Bogotá / Medellín")
+_LOCATION_ALTERNATIVES = re.compile(r"\s+(?:o|u|y|or|and)\s+|[/|]", re.IGNORECASE)
+# Partes de una alternativa, de la más específica a la más general
+_LOCATION_PARTS = re.compile(r"[,;]|\s+-\s+")
+_PARENTHESES = re.compile(r"\([^)]*\)|\[[^\]]*\]")
+
+# Niveles educativos de menor a mayor; cada nivel se detecta por palabras clave
+DEFAULT_EDUCATION_LEVELS: List[List[str]] = [
+    ["secundaria"],
+    ["bachillerato", "preparatoria", "high school"],
+    ["tecnico", "tecnologo", "tsu"],
+    ["licenciatura", "ingenieria", "ingeniero", "grado", "bachelor", "universitario", "carrera"],
+    ["maestria", "master", "mba", "posgrado", "postgrado", "especialidad"],
+    ["doctorado", "phd", "doctor"],
+]
+
+# Nombres de los checks tal y como aparecen en compliance_check
+WORK_PERMIT_CHECK = "has_work_permit"
+LOCATION_CHECK = "location_match"
+EDUCATION_CHECK = "education_match"
+
+_FAILURE_MESSAGES = {
+    WORK_PERMIT_CHECK: "La vacante requiere permiso de trabajo y el candidato no lo tiene",
+    LOCATION_CHECK: "La ubicación del candidato no coincide con la ubicación requerida",
+    EDUCATION_CHECK: "El nivel educativo del candidato es inferior al requerido",
+}
+
+
+@dataclass
+class ComplianceResult:
+    """Resultado de la capa de compliance"""
+
+    checks: Dict[str, bool]
+    failures: List[str] = field(default_factory=list)
+
+    @property
+    def passed(self) -> bool:
+        """True si ningún requisito excluyente falló"""
+        return not self.failures
+
+    def failure_messages(self) -> List[str]:
+        """Descripción legible de cada requisito que falló"""
+        return [_FAILURE_MESSAGES[name] for name in self.failures]
+
+
+@dataclass
+class CompliancePredicates:
+    """Requisitos excluyentes de una vacante ya normalizados"""
+
+    work_permit_required: bool
+    # Ubicaciones aceptadas (basta una); vacío = cualquier ubicación
+    location_parts: List[str]
+    education_level: Optional[int]
+
+    @property
+    def any_location(self) -> bool:
+        """True si la vacante no exige ubicación concreta (sin requisito o remota)"""
+        return not self.location_parts
+
+
+class ComplianceEngine:
+    """
+    Capa de compliance determinista (filtro excluyente)
+
+    Evalúa localmente permiso de trabajo, ubicación y educación mínima con los
+    campos estructurados de VacanteData/CandidatoData. Solo marca un requisito
+    como fallido cuando la evidencia es inequívoca: un nivel educativo que no
+    se reconoce se considera cumplido y queda a criterio del modelo.
+    """
+
+    def __init__(
+        self,
+        location_aliases: Optional[Dict[str, str]] = None,
+        education_levels: Optional[Sequence[Sequence[str]]] = None,
+        gate_checks: Optional[Sequence[str]] = None
+    ):
+        """
+        Inicializa el motor de compliance
+
+        Args:
+            location_aliases: Alias adicionales de ubicación (se combinan con los predeterminados)
+            education_levels: Niveles educativos ordenados de menor a mayor (reemplazan los predeterminados)
+            gate_checks: Checks cuyo fallo rechaza al candidato sin consultar al modelo
+        """
+        self.location_aliases = dict(DEFAULT_LOCATION_ALIASES)
+        for alias, canonical in (location_aliases or {}).items():
+            self.location_aliases[normalize_text(alias)] = normalize_text(canonical)
+
+        levels = education_levels or DEFAULT_EDUCATION_LEVELS
+        self.education_levels = [[normalize_text(keyword) for keyword in level] for level in levels]
+        self.gate_checks = set(gate_checks or (WORK_PERMIT_CHECK, LOCATION_CHECK, EDUCATION_CHECK))
+
+    @classmethod
+    def from_settings(cls, settings: Any) -> "ComplianceEngine":
+        """
+        Crea el motor a partir de la configuración de la aplicación
+
+        COMPLIANCE_LOCATION_ALIASES y COMPLIANCE_EDUCATION_LEVELS se leen como JSON;
+        COMPLIANCE_GATE_CHECKS es una lista separada por comas.
+        """
+        aliases = json.loads(settings.compliance_location_aliases) if settings.compliance_location_aliases else None
+        levels = json.loads(settings.compliance_education_levels) if settings.compliance_education_levels else None
+        checks = [c.strip() for c in settings.compliance_gate_checks.split(",") if c.strip()]
+        return cls(location_aliases=aliases, education_levels=levels, gate_checks=checks)
+
+    def normalize_location(self, location: str) -> List[str]:
+        """
+        Normaliza una ubicación en sus partes canónicas
+
+        Quita el texto entre paréntesis y las palabras de modalidad, separa
+        alternativas y partes, y aplica los alias a cada fragmento de la parte.
+
+        "CDMX, México" -> ["ciudad de mexico", "mexico"]
+        "Bogotá D.C. (presencial)" -> ["bogota"]
+        """
+        return [part for alternative in self._location_alternatives(location) for part in alternative]
+
+    def location_requirement(self, location: Optional[str]) -> List[str]:
+        """
+        Ubicaciones que acepta una vacante, una por alternativa
+
+        De cada alternativa se toma la parte más específica ("Ciudad de México,
+        México" -> "ciudad de mexico"): el país solo cuenta cuando es lo único
+        que se indica. Si la vacante es remota o el texto no se puede
+        interpretar sin ambigüedad, no se exige ubicación.
+
+        Returns:
+            Partes canónicas (basta con que el candidato tenga una) o lista vacía si no hay requisito
+        """
+        if not location or self.is_remote(location):
+            return []
+        text = " " + normalize_text(location) + " "
+        if any(f" {keyword} " in text for keyword in AMBIGUOUS_LOCATION_KEYWORDS):
+            return []
+        alternatives = self._location_alternatives(location, keep_empty=True)
+        required = []
+        for parts in alternatives:
+            if not parts or len(parts[0].split()) > MAX_LOCATION_WORDS:
+                return []
+            required.append(parts[0])
+        return list(dict.fromkeys(required))
+
+    def _location_alternatives(self, location: str, keep_empty: bool = False) -> List[List[str]]:
+        """Partes canónicas de cada alternativa de una ubicación"""
+        alternatives = []
+        for raw_alternative in _LOCATION_ALTERNATIVES.split(_PARENTHESES.sub(" ", location)):
+            parts = []
+            for raw_part in _LOCATION_PARTS.split(raw_alternative):
+                part = self._canonical_place(raw_part)
+                if part and part not in parts:
+                    parts.append(part)
+            if parts or (keep_empty and normalize_text(raw_alternative)):
+                alternatives.append(parts)
+        return alternatives
+
+    def _canonical_place(self, text: str) -> str:
+        """Forma canónica de un lugar: sin modalidad y con los alias aplicados por n-gramas"""
+        words = [word for word in normalize_text(text).split() if word not in LOCATION_MODALITY_WORDS]
+        while words and words[0] in _LOCATION_LEADING_WORDS:
+            words.pop(0)
+        # Une las iniciales sueltas: "d c" -> "dc", "d f" -> "df"
+        joined: List[str] = []
+        for i, word in enumerate(words):
+            if len(word) == 1 and i > 0 and len(words[i - 1]) == 1:
+                joined[-1] += word
+            else:
+                joined.append(word)
+        words = joined
+        place: List[str] = []
+        i = 0
+        while i < len(words):
+            for size in range(min(4, len(words) - i), 0, -1):
+                alias = self.location_aliases.get(" ".join(words[i:i + size]))
+                if alias is not None:
+                    place.append(alias)
+                    i += size
+                    break
+            else:
+                place.append(words[i])
+                i += 1
+        return " ".join(place)
+
+    def education_levels_mentioned(self, education: Optional[str]) -> List[int]:
+        """Niveles educativos (índices en la escala) que menciona un texto, de menor a mayor"""
+        if not education:
+            return []
+        words = normalize_text(education).split()
+        text = " ".join(words)
+        detected = []
+        for index, keywords in enumerate(self.education_levels):
+            for keyword in keywords:
+                if " " in keyword:
+                    found = keyword in text
+                else:
+                    found = any(word.startswith(keyword) for word in words)
+                if found:
+                    detected.append(index)
+                    break
+        return detected
+
+    def education_level(self, education: Optional[str]) -> Optional[int]:
+        """
+        Nivel educativo de un candidato
+
+        Returns:
+            El nivel más alto mencionado o None si no se reconoce ninguno
+        """
+        levels = self.education_levels_mentioned(education)
+        return levels[-1] if levels else None
+
+    def required_education_level(self, education: Optional[str]) -> Optional[int]:
+        """
+        Nivel educativo mínimo que exige una vacante
+
+        "Licenciatura o Maestría" o "Licenciatura (deseable maestría)" exigen
+        licenciatura: se toma el nivel más bajo mencionado.
+
+        Returns:
+            El nivel más bajo mencionado o None si no se reconoce ninguno
+        """
+        levels = self.education_levels_mentioned(education)
+        return levels[0] if levels else None
+
+    def is_remote(self, location: str) -> bool:
+        """True si la ubicación requerida admite trabajo remoto o flexible"""
+        text = normalize_text(location)
+        return any(keyword in text for keyword in REMOTE_KEYWORDS)
+
+    def check_location(self, required: Optional[str], actual: str) -> bool:
+        """Verifica si la ubicación del candidato satisface la requerida"""
+        return self._location_satisfied(self.location_requirement(required), actual)
+
+    def _location_satisfied(self, required_parts: Sequence[str], actual: str) -> bool:
+        """True si alguna ubicación aceptada (ver location_requirement) aparece en la del candidato"""
+        if not required_parts:
+            return True
+        actual_parts = self.normalize_location(actual)
+        return any(f" {required} " in f" {part} " for required in required_parts for part in actual_parts)
+
+    def check_education(self, required: Optional[str], actual: str) -> bool:
+        """Verifica si el nivel educativo del candidato alcanza el requerido"""
+        return self._education_satisfied(self.required_education_level(required), actual)
+
+    def _education_satisfied(self, required_level: Optional[int], actual: str) -> bool:
+        """True si el nivel del candidato alcanza el requerido (o alguno no se reconoce)"""
+        actual_level = self.education_level(actual)
+        if required_level is None or actual_level is None:
+            return True
+        return actual_level >= required_level
+
+    def compile(self, vacante: VacanteData) -> CompliancePredicates:
+        """
+        Normaliza una sola vez los requisitos excluyentes de una vacante
+
+        Returns:
+            CompliancePredicates reutilizable para evaluar cualquier candidato
+        """
+        return CompliancePredicates(
+            work_permit_required=vacante.work_permit_required,
+            location_parts=self.location_requirement(vacante.location_required),
+            education_level=self.required_education_level(vacante.education)
+        )
+
+    def evaluate(
+        self,
+        vacante: VacanteData,
+        candidato: CandidatoData,
+        predicates: Optional[CompliancePredicates] = None
+    ) -> ComplianceResult:
+        """
+        Evalúa los requisitos excluyentes de la vacante
+
+        Args:
+            vacante: Datos de la vacante
+            candidato: Datos del candidato
+            predicates: Requisitos precompilados con compile(); si faltan se calculan
+
+        Returns:
+            ComplianceResult con el estado de cada check y los que bloquean el matching
+        """
+        predicates = predicates or self.compile(vacante)
+        checks = {
+            WORK_PERMIT_CHECK: candidato.has_work_permit or not predicates.work_permit_required,
+            LOCATION_CHECK: predicates.any_location or self._location_satisfied(predicates.location_parts, candidato.location),
+            EDUCATION_CHECK: self._education_satisfied(predicates.education_level, candidato.education),
+        }
+        failures = [name for name, ok in checks.items() if not ok and name in self.gate_checks]
+        return ComplianceResult(checks=checks, failures=failures)
+
+    def rejection_analysis(
+        self,
+        vacante: VacanteData,
+        candidato: CandidatoData,
+        result: ComplianceResult,
+        skill_analysis: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Construye el análisis completo de un candidato rechazado por compliance
+
+        Sigue la regla de la CAPA DE COMPLIANCE (score 0 y RECHAZADO) sin
+        consultar al modelo; las secciones informativas se calculan localmente.
+
+        Args:
+            vacante: Datos de la vacante
+            candidato: Datos del candidato
+            result: Resultado de evaluate() con al menos un fallo
+            skill_analysis: Sección de habilidades ya calculada; si falta se usa coincidencia exacta
+
+        Returns:
+            Diccionario con la misma estructura que el análisis del agente
+        """
+        if skill_analysis is None:
+            matched, missing = exact_skill_overlap(vacante.hard_skills, candidato.skills)
+            skill_analysis = {
+                "hard_skills_score": round(100 * len(matched) / len(vacante.hard_skills), 1) if vacante.hard_skills else 100.0,
+                "soft_skills_score": 0.0,
+                "matched_skills": matched,
+                "missing_skills": missing
+            }
+        reasons = result.failure_messages()
+
+        return {
+            "match_score": 0.0,
+            "status": "RECHAZADO",
+            "skill_analysis": skill_analysis,
+            "experience_score": experience_score(vacante.years_experience, candidato.years_experience),
+            "compliance_check": dict(result.checks),
+            "recommendations": reasons,
+            "summary": "Candidato rechazado por no cumplir requisitos excluyentes de la vacante",
+            "detailed_analysis": (
+                "CAPA DE COMPLIANCE: el candidato no supera el filtro excluyente, por lo que el "
+                "match_score es 0% y el estado RECHAZADO. Motivos: " + "; ".join(reasons) + "."
+            ),
+            "processing": {"source": "compliance"}
+        }
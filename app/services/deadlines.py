@@ -0,0 +1,100 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Optional, TypeVar
+from app.services.metrics import DEADLINES_EXCEEDED
+
+T = TypeVar("T")
+
+
+class DeadlineExceeded(Exception):
+    """La petición no obtuvo el análisis dentro de su plazo"""
+
+    def __init__(self, timeout: float):
+        super().__init__(f"El análisis superó el plazo de {timeout:.1f} s")
+        self.timeout = timeout
+
+
+class Deadline:
+    """
+    Plazo máximo de una petición
+
+    Se fija al recibir la petición y acota todo lo que espera después: el
+    turno en el scheduler, la llamada al modelo (y su reintento o su llamada
+    de cobertura) y cada fragmento del streaming. Al vencer, la espera en
+    curso se cancela, lo que cierra la llamada HTTP al proveedor.
+    """
+
+    def __init__(self, timeout: Optional[float]):
+        """
+        Inicializa el plazo
+
+        Args:
+            timeout: Segundos disponibles desde ahora; None o 0 = sin plazo
+        """
+        self.timeout = timeout or None
+        self._expires_at = time.monotonic() + timeout if timeout else None
+
+    def remaining(self) -> Optional[float]:
+        """Segundos que quedan (0 si ya venció) o None si no hay plazo"""
+        if self._expires_at is None:
+            return None
+        return max(self._expires_at - time.monotonic(), 0.0)
+
+    async def run(self, awaitable: Awaitable[T]) -> T:
+        """
+        Espera un awaitable dentro del plazo
+
+        Raises:
+            DeadlineExceeded: Si el plazo vence antes (el awaitable se cancela)
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return await awaitable
+        try:
+            return await asyncio.wait_for(awaitable, remaining)
+        except asyncio.TimeoutError:
+            # Un timeout propio de la llamada no es el plazo de la petición
+            if self.remaining():
+                raise
+            raise self._exceeded() from None
+
+    async def iterate(self, iterator: AsyncIterator[T]) -> AsyncIterator[T]:
+        """
+        Recorre un iterador asíncrono esperando cada elemento dentro del plazo
+
+        Raises:
+            DeadlineExceeded: Si el plazo vence esperando un elemento
+        """
+        iterator = aiter(iterator)
+        while True:
+            try:
+                item = await self.run(anext(iterator))
+            except StopAsyncIteration:
+                return
+            yield item
+
+    @asynccontextmanager
+    async def scope(self) -> AsyncIterator[None]:
+        """
+        Acota un bloque de código (no apto para generadores que ceden valores dentro)
+
+        Raises:
+            DeadlineExceeded: Si el plazo vence antes de terminar el bloque
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            yield
+            return
+        timeout = asyncio.timeout(remaining)
+        try:
+            async with timeout:
+                yield
+        except TimeoutError:
+            if not timeout.expired():
+                raise
+            raise self._exceeded() from None
+
+    def _exceeded(self) -> DeadlineExceeded:
+        DEADLINES_EXCEEDED.inc()
+        return DeadlineExceeded(self.timeout)
@@ -0,0 +1,89 @@
+import math
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+
+class HedgePolicy:
+    """
+    Decide cuándo lanzar una llamada de cobertura (hedged request)
+
+    Guarda una ventana deslizante con las latencias recientes de cada modelo.
+    Si una llamada no ha respondido al llegar al percentil configurado de esa
+    ventana, se lanza una segunda idéntica y gana la primera respuesta válida.
+    Con el percentil 95 solo se cubre ~5 % de las llamadas, las de la cola
+    lenta, así que el coste extra es pequeño y acota el p99.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 95.0,
+        min_samples: int = 50,
+        min_delay_seconds: float = 0.5,
+        window: int = 500
+    ):
+        """
+        Inicializa la política
+
+        Args:
+            percentile: Percentil de latencia (0-100) a partir del cual se cubre una llamada
+            min_samples: Latencias necesarias antes de lanzar la primera cobertura
+            min_delay_seconds: Espera mínima antes de cubrir (evita duplicar llamadas rápidas)
+            window: Latencias recientes que se conservan por modelo
+        """
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay_seconds = min_delay_seconds
+        self.window = window
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, model_id: str, seconds: float) -> None:
+        """Registra la latencia de una llamada al modelo"""
+        with self._lock:
+            latencies = self._latencies.get(model_id)
+            if latencies is None:
+                latencies = self._latencies[model_id] = deque(maxlen=self.window)
+            latencies.append(seconds)
+
+    def delay(self, model_id: str) -> Optional[float]:
+        """
+        Segundos que se espera a la primera llamada antes de lanzar la cobertura
+
+        Returns:
+            El percentil de la ventana (al menos min_delay_seconds) o None si
+            aún no hay latencias suficientes
+        """
+        with self._lock:
+            latencies = sorted(self._latencies.get(model_id, ()))
+        if not latencies or len(latencies) < self.min_samples:
+            return None
+        rank = max(math.ceil(self.percentile / 100 * len(latencies)) - 1, 0)
+        return max(latencies[rank], self.min_delay_seconds)
+
+    def record(self, model_id: str, won: bool) -> None:
+        """Cuenta una cobertura lanzada y si su respuesta llegó antes que la original"""
+        with self._lock:
+            stats = self._stats.setdefault(model_id, {"fired": 0, "won": 0})
+            stats["fired"] += 1
+            stats["won"] += won
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Umbral actual, coberturas lanzadas y ganadas por modelo"""
+        with self._lock:
+            models = set(self._latencies) | set(self._stats)
+            counts = {model: dict(self._stats.get(model, {"fired": 0, "won": 0})) for model in models}
+            samples = {model: len(self._latencies.get(model, ())) for model in models}
+        result: Dict[str, Any] = {"percentile": self.percentile, "models": {}}
+        for model in sorted(models):
+            delay = self.delay(model)
+            fired, won = counts[model]["fired"], counts[model]["won"]
+            result["models"][model] = {
+                "samples": samples[model],
+                "delay_ms": round(delay * 1000, 1) if delay is not None else None,
+                "fired": fired,
+                "won": won,
+                "win_rate": round(won / fired, 4) if fired else 0.0,
+            }
+        return result
@@ -0,0 +1,476 @@
+import asyncio
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Estados de un elemento (un par vacante/candidato) de un job
+ITEM_PENDING = "pending"
+ITEM_RUNNING = "running"
+ITEM_DONE = "done"
+ITEM_FAILED = "failed"
+
+# Estados agregados de un job
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_COMPLETED_WITH_ERRORS = "completed_with_errors"
+JOB_FAILED = "failed"
+
+
+@dataclass
+class JobItem:
+    """Elemento de un job reclamado por un worker"""
+
+    job_id: str
+    index: int
+    attempts: int
+    vacante: Dict[str, Any]
+    candidato: Dict[str, Any]
+    options: Dict[str, Any]
+
+
+class JobQueue:
+    """
+    Cola de trabajos durable sobre SQLite
+
+    Cada job (individual o por lotes) se divide en elementos, uno por
+    candidato, que los workers reclaman de forma atómica. Un elemento
+    reclamado queda "arrendado" durante lease_seconds: si el proceso se cae,
+    el arrendamiento expira y otro worker lo retoma; en una parada ordenada
+    los elementos en curso vuelven a la cola de inmediato (release), así que
+    los jobs sobreviven a reinicios y continúan donde se quedaron. Los fallos se
+    reintentan con backoff exponencial (con jitter) hasta max_attempts.
+
+    Las escrituras pueden esperar el bloqueo de otros procesos: desde el
+    event loop se llaman con asyncio.to_thread. Las consultas (get,
+    get_stats) usan su propia conexión y no esperan a las escrituras.
+    """
+
+    def __init__(
+        self,
+        sqlite_path: str,
+        max_attempts: int = 3,
+        backoff_seconds: float = 2.0,
+        backoff_max_seconds: float = 60.0,
+        lease_seconds: float = 300.0
+    ):
+        """
+        Inicializa la cola
+
+        Args:
+            sqlite_path: Ruta de la base SQLite (":memory:" para pruebas, sin durabilidad)
+            max_attempts: Intentos máximos por elemento
+            backoff_seconds: Espera base antes del primer reintento
+            backoff_max_seconds: Espera máxima entre reintentos
+            lease_seconds: Tiempo tras el cual un elemento en curso se considera abandonado
+        """
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+
+        self._db = sqlite3.connect(sqlite_path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, vacante TEXT NOT NULL, options TEXT NOT NULL, "
+            "total INTEGER NOT NULL, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS job_items ("
+            "job_id TEXT NOT NULL, item_index INTEGER NOT NULL, candidato TEXT NOT NULL, "
+            "status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+            "available_at REAL NOT NULL, lease_until REAL, result TEXT, error TEXT, "
+            "PRIMARY KEY (job_id, item_index))"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_job_items_queue ON job_items (status, available_at)"
+        )
+
+        # Lecturas en WAL: una conexión aparte no espera a las transacciones de escritura
+        if sqlite_path == ":memory:":
+            self._read_db, self._read_lock = self._db, self._lock
+        else:
+            self._read_db = sqlite3.connect(sqlite_path, check_same_thread=False, isolation_level=None)
+            self._read_lock = threading.Lock()
+
+    def enqueue(
+        self,
+        kind: str,
+        vacante: Dict[str, Any],
+        candidatos: List[Dict[str, Any]],
+        options: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """
+        Encola un job
+
+        Args:
+            kind: "match" (un candidato) o "batch" (varios)
+            vacante: Datos de la vacante serializados
+            candidatos: Datos de cada candidato serializados
+            options: Opciones del matching (use_cache, scoring_mode...)
+
+        Returns:
+            Id del job
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock, self._transaction():
+            self._db.execute(
+                "INSERT INTO jobs (id, kind, vacante, options, total, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(vacante, ensure_ascii=False), json.dumps(options or {}),
+                 len(candidatos), now, now)
+            )
+            self._db.executemany(
+                "INSERT INTO job_items (job_id, item_index, candidato, status, available_at) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (job_id, index, json.dumps(candidato, ensure_ascii=False), ITEM_PENDING, now)
+                    for index, candidato in enumerate(candidatos)
+                ]
+            )
+        return job_id
+
+    def claim(self) -> Optional[JobItem]:
+        """
+        Reclama el siguiente elemento disponible
+
+        Disponibles: pendientes cuyo backoff ya pasó y elementos en curso cuyo
+        arrendamiento expiró (worker caído o reinicio). Un elemento abandonado
+        que ya agotó max_attempts (p. ej. uno que tumba al worker) se marca
+        como fallido en lugar de reintentarse.
+
+        Returns:
+            JobItem o None si no hay trabajo disponible
+        """
+        now = time.time()
+        with self._lock, self._transaction():
+            exhausted = self._db.execute(
+                "SELECT DISTINCT job_id FROM job_items WHERE status = ? AND lease_until < ? AND attempts >= ?",
+                (ITEM_RUNNING, now, self.max_attempts)
+            ).fetchall()
+            if exhausted:
+                self._db.execute(
+                    "UPDATE job_items SET status = ?, lease_until = NULL, "
+                    "error = COALESCE(error, 'El elemento se abandonó sin terminar en todos sus intentos') "
+                    "WHERE status = ? AND lease_until < ? AND attempts >= ?",
+                    (ITEM_FAILED, ITEM_RUNNING, now, self.max_attempts)
+                )
+                for (job_id,) in exhausted:
+                    self._touch(job_id, now)
+            row = self._db.execute(
+                "SELECT i.job_id, i.item_index, i.attempts, i.candidato, j.vacante, j.options "
+                "FROM job_items i JOIN jobs j ON j.id = i.job_id "
+                "WHERE (i.status = ? AND i.available_at <= ?) OR (i.status = ? AND i.lease_until < ?) "
+                "ORDER BY i.available_at LIMIT 1",
+                (ITEM_PENDING, now, ITEM_RUNNING, now)
+            ).fetchone()
+            if row is None:
+                return None
+            job_id, index, attempts, candidato, vacante, options = row
+            self._db.execute(
+                "UPDATE job_items SET status = ?, attempts = attempts + 1, lease_until = ? "
+                "WHERE job_id = ? AND item_index = ?",
+                (ITEM_RUNNING, now + self.lease_seconds, job_id, index)
+            )
+            self._touch(job_id, now)
+        return JobItem(
+            job_id=job_id,
+            index=index,
+            attempts=attempts + 1,
+            vacante=json.loads(vacante),
+            candidato=json.loads(candidato),
+            options=json.loads(options)
+        )
+
+    def complete(self, item: JobItem, result: Dict[str, Any]) -> bool:
+        """
+        Guarda el resultado de un elemento
+
+        Returns:
+            False si el arrendamiento ya no es de este worker (expiró y otro
+            worker reclamó el elemento): el resultado se descarta
+        """
+        now = time.time()
+        with self._lock, self._transaction():
+            cursor = self._db.execute(
+                "UPDATE job_items SET status = ?, result = ?, error = NULL, lease_until = NULL "
+                "WHERE job_id = ? AND item_index = ? AND status = ? AND attempts = ?",
+                (ITEM_DONE, json.dumps(result, ensure_ascii=False), item.job_id, item.index,
+                 ITEM_RUNNING, item.attempts)
+            )
+            if cursor.rowcount == 0:
+                return self._lease_lost(item)
+            self._touch(item.job_id, now)
+        return True
+
+    def fail(self, item: JobItem, error: str, retry_after: Optional[float] = None) -> bool:
+        """
+        Registra un fallo: reprograma el elemento con backoff o lo marca como fallido
+
+        Args:
+            item: Elemento reclamado que ha fallado
+            error: Mensaje de error
+            retry_after: Espera mínima antes del reintento (p. ej. la indicada por un 429)
+
+        Returns:
+            True si el elemento se reintentará (False también si el
+            arrendamiento ya no es de este worker: el fallo se descarta)
+        """
+        now = time.time()
+        retry = item.attempts < self.max_attempts
+        with self._lock, self._transaction():
+            if retry:
+                delay = min(self.backoff_seconds * 2 ** (item.attempts - 1), self.backoff_max_seconds)
+                delay *= random.uniform(0.8, 1.2)
+                delay = max(delay, retry_after or 0.0)
+                cursor = self._db.execute(
+                    "UPDATE job_items SET status = ?, available_at = ?, lease_until = NULL, error = ? "
+                    "WHERE job_id = ? AND item_index = ? AND status = ? AND attempts = ?",
+                    (ITEM_PENDING, now + delay, error, item.job_id, item.index, ITEM_RUNNING, item.attempts)
+                )
+            else:
+                cursor = self._db.execute(
+                    "UPDATE job_items SET status = ?, lease_until = NULL, error = ? "
+                    "WHERE job_id = ? AND item_index = ? AND status = ? AND attempts = ?",
+                    (ITEM_FAILED, error, item.job_id, item.index, ITEM_RUNNING, item.attempts)
+                )
+            if cursor.rowcount == 0:
+                return self._lease_lost(item)
+            self._touch(item.job_id, now)
+        return retry
+
+    def release(self, items: List[JobItem]) -> int:
+        """
+        Devuelve a la cola elementos en curso que no se llegaron a terminar
+
+        Se usa al detener los workers de forma ordenada: los elementos quedan
+        disponibles de inmediato (sin esperar a que expire el arrendamiento) y
+        la interrupción no cuenta como intento.
+
+        Returns:
+            Número de elementos devueltos
+        """
+        now = time.time()
+        released = 0
+        with self._lock, self._transaction():
+            for item in items:
+                cursor = self._db.execute(
+                    "UPDATE job_items SET status = ?, attempts = attempts - 1, available_at = ?, lease_until = NULL "
+                    "WHERE job_id = ? AND item_index = ? AND status = ? AND attempts = ?",
+                    (ITEM_PENDING, now, item.job_id, item.index, ITEM_RUNNING, item.attempts)
+                )
+                if cursor.rowcount:
+                    released += 1
+                    self._touch(item.job_id, now)
+        return released
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Estado, progreso y resultados de un job
+
+        Returns:
+            Diccionario con el job o None si no existe
+        """
+        with self._read_lock:
+            job = self._read_db.execute(
+                "SELECT kind, total, created_at, updated_at FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            if job is None:
+                return None
+            items = self._read_db.execute(
+                "SELECT item_index, status, attempts, result, error FROM job_items "
+                "WHERE job_id = ? ORDER BY item_index",
+                (job_id,)
+            ).fetchall()
+
+        kind, total, created_at, updated_at = job
+        counts = {ITEM_PENDING: 0, ITEM_RUNNING: 0, ITEM_DONE: 0, ITEM_FAILED: 0}
+        results = []
+        for index, item_status, attempts, result, error in items:
+            counts[item_status] += 1
+            if item_status == ITEM_DONE:
+                results.append({"index": index, "result": json.loads(result)})
+            elif item_status == ITEM_FAILED:
+                results.append({"index": index, "error": error})
+
+        finished = counts[ITEM_DONE] + counts[ITEM_FAILED]
+        if finished == total:
+            if counts[ITEM_FAILED] == 0:
+                job_status = JOB_COMPLETED
+            elif counts[ITEM_DONE] == 0:
+                job_status = JOB_FAILED
+            else:
+                job_status = JOB_COMPLETED_WITH_ERRORS
+        elif finished == 0 and counts[ITEM_RUNNING] == 0 and all(attempts == 0 for _, _, attempts, _, _ in items):
+            job_status = JOB_QUEUED
+        else:
+            job_status = JOB_RUNNING
+
+        return {
+            "job_id": job_id,
+            "kind": kind,
+            "status": job_status,
+            "total": total,
+            "completed": counts[ITEM_DONE],
+            "failed": counts[ITEM_FAILED],
+            "pending": counts[ITEM_PENDING] + counts[ITEM_RUNNING],
+            "progress": round(finished / total, 4) if total else 1.0,
+            "created_at": created_at,
+            "updated_at": updated_at,
+            "results": results,
+        }
+
+    def get_stats(self) -> Dict[str, int]:
+        """Número de elementos por estado en toda la cola"""
+        with self._read_lock:
+            rows = self._read_db.execute("SELECT status, COUNT(*) FROM job_items GROUP BY status").fetchall()
+        stats = {ITEM_PENDING: 0, ITEM_RUNNING: 0, ITEM_DONE: 0, ITEM_FAILED: 0}
+        stats.update(dict(rows))
+        return stats
+
+    def _lease_lost(self, item: JobItem) -> bool:
+        """Registra que otro worker retomó el elemento tras expirar su arrendamiento"""
+        logger.warning(
+            f"Job {item.job_id}[{item.index}]: el arrendamiento del intento {item.attempts} expiró; "
+            "se descarta su resultado"
+        )
+        return False
+
+    def _touch(self, job_id: str, now: float) -> None:
+        """Actualiza la fecha de modificación del job (dentro de una transacción)"""
+        self._db.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (now, job_id))
+
+    def _transaction(self) -> "_Transaction":
+        """Transacción IMMEDIATE: el reclamo es atómico también entre procesos"""
+        return _Transaction(self._db)
+
+
+class _Transaction:
+    """Context manager BEGIN IMMEDIATE / COMMIT / ROLLBACK"""
+
+    def __init__(self, db: sqlite3.Connection):
+        self._db = db
+
+    def __enter__(self):
+        self._db.execute("BEGIN IMMEDIATE")
+        return self._db
+
+    def __exit__(self, exc_type, exc, tb):
+        self._db.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+class JobWorkerPool:
+    """
+    Workers asíncronos (en el mismo proceso) que consumen la cola de jobs
+
+    Cada worker reclama un elemento, ejecuta el handler y registra el
+    resultado o el fallo; si no hay trabajo espera poll_interval segundos.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        handler: Callable[[JobItem], Awaitable[Dict[str, Any]]],
+        workers: int,
+        poll_interval: float = 0.5
+    ):
+        """
+        Inicializa el pool
+
+        Args:
+            queue: Cola de jobs
+            handler: Corrutina que procesa un elemento y devuelve su resultado
+            workers: Número de workers concurrentes
+            poll_interval: Espera en segundos cuando la cola está vacía
+        """
+        self.queue = queue
+        self.handler = handler
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+        # Elemento que procesa cada worker en este momento
+        self._in_flight: Dict[int, JobItem] = {}
+
+    def start(self) -> None:
+        """Arranca los workers en el event loop actual"""
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._run(i)) for i in range(self.workers)]
+        logger.info(f"Cola de jobs: {self.workers} workers iniciados")
+
+    async def stop(self) -> None:
+        """Detiene los workers y devuelve a la cola los elementos en curso para retomarlos al arrancar"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        items, self._in_flight = list(self._in_flight.values()), {}
+        if items:
+            try:
+                released = await asyncio.to_thread(self.queue.release, items)
+            except sqlite3.Error as e:
+                logger.error(f"Cola de jobs: no se pudieron liberar los elementos en curso: {str(e)}")
+            else:
+                logger.info(f"Cola de jobs: {released} elementos en curso devueltos a la cola")
+
+    def notify(self) -> None:
+        """Despierta a los workers en espera (p. ej. tras encolar un job)"""
+        self._wakeup.set()
+
+    async def _run(self, worker_id: int) -> None:
+        """Bucle de un worker"""
+        while True:
+            try:
+                item = await asyncio.to_thread(self.queue.claim)
+            except sqlite3.Error as e:
+                logger.error(f"Worker {worker_id}: error al reclamar trabajo: {str(e)}")
+                item = None
+
+            if item is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            self._in_flight[worker_id] = item
+            try:
+                result = await self.handler(item)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await self._record_failure(worker_id, item, e)
+            else:
+                try:
+                    await asyncio.to_thread(self.queue.complete, item, result)
+                except sqlite3.Error as db_error:
+                    # Sin registrar el resultado, el elemento se retoma al expirar su arrendamiento
+                    logger.error(f"Worker {worker_id}: error al guardar el resultado: {str(db_error)}")
+            self._in_flight.pop(worker_id, None)
+
+    async def _record_failure(self, worker_id: int, item: JobItem, error: Exception) -> None:
+        """Registra el fallo de un elemento (reintento con backoff o fallo definitivo)"""
+        try:
+            retry = await asyncio.to_thread(self.queue.fail, item, str(error), getattr(error, "retry_after", None))
+        except sqlite3.Error as db_error:
+            # Sin registrar el fallo, el elemento se retoma al expirar su arrendamiento
+            logger.error(f"Worker {worker_id}: error al registrar el fallo: {str(db_error)}")
+            return
+        logger.warning(
+            f"Job {item.job_id}[{item.index}] falló (intento {item.attempts}): {str(error)}"
+            + (" - se reintentará" if retry else " - sin más reintentos")
+        )
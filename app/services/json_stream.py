@@ -0,0 +1,122 @@
+import json
+from typing import Any, List, Optional, Tuple
+
+
+class StreamingFieldParser:
+    """
+    Parser incremental de los campos de primer nivel de un objeto JSON
+
+    Recibe la salida del modelo por fragmentos y devuelve cada campo de primer
+    nivel en cuanto su valor está completo, sin esperar al cierre del objeto.
+    El texto previo a la primera "{" (p. ej. "Aquí está el análisis:") se ignora.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self._pos = 0
+        self._started = False
+        self._finished = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._key: Optional[str] = None
+        self._token_start: Optional[int] = None
+        self._value_start: Optional[int] = None
+        self._object_start: Optional[int] = None
+        self._object_end: Optional[int] = None
+        self.fields: List[Tuple[str, Any]] = []
+
+    @property
+    def finished(self) -> bool:
+        """True cuando se cerró el objeto de primer nivel"""
+        return self._finished
+
+    @property
+    def object_text(self) -> Optional[str]:
+        """Texto exacto del objeto de primer nivel una vez cerrado"""
+        if self._object_end is None:
+            return None
+        return self.buffer[self._object_start:self._object_end]
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """
+        Añade un fragmento de texto
+
+        Args:
+            chunk: Fragmento recibido del modelo
+
+        Returns:
+            Campos (clave, valor) completados con este fragmento, en orden
+        """
+        self.buffer += chunk
+        completed: List[Tuple[str, Any]] = []
+        text = self.buffer
+
+        while self._pos < len(text) and not self._finished:
+            ch = text[self._pos]
+
+            if not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._depth = 1
+                    self._object_start = self._pos
+                self._pos += 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._key is None and self._value_start is None:
+                        self._key = self._decode_key(text[self._token_start:self._pos + 1])
+                self._pos += 1
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                if self._depth == 1 and self._key is None and self._value_start is None:
+                    self._token_start = self._pos
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._complete_field(text, self._pos, completed)
+                    self._finished = True
+                    self._object_end = self._pos + 1
+            elif ch == ":" and self._depth == 1 and self._key is not None and self._value_start is None:
+                self._value_start = self._pos + 1
+            elif ch == "," and self._depth == 1:
+                self._complete_field(text, self._pos, completed)
+            self._pos += 1
+
+        self.fields.extend(completed)
+        return completed
+
+    def _decode_key(self, raw: str) -> str:
+        """
+        Clave de un campo de primer nivel
+
+        Una clave mal formada (escape inválido, salto de línea literal) no
+        detiene el parser: se conserva tal cual, no coincide con ningún campo
+        esperado y el objeto completo pasa por la reparación del parser.
+        """
+        try:
+            return json.loads(raw, strict=False)
+        except json.JSONDecodeError:
+            return raw[1:-1]
+
+    def _complete_field(self, text: str, end: int, completed: List[Tuple[str, Any]]) -> None:
+        """Cierra el campo en curso si tiene clave y valor"""
+        if self._key is not None and self._value_start is not None:
+            raw_value = text[self._value_start:end].strip()
+            try:
+                completed.append((self._key, json.loads(raw_value)))
+            except json.JSONDecodeError:
+                pass
+        self._key = None
+        self._value_start = None
+        self._token_start = None
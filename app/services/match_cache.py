@@ -0,0 +1,280 @@
+import copy
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from app.models.schemas import VacanteData, CandidatoData
+
+
+def _normalize_value(value: Any) -> Any:
+    """
+    Normaliza un valor para que dos payloads equivalentes produzcan el mismo hash
+
+    - Cadenas: espacios colapsados y recortados
+    - Listas: elementos normalizados, sin mayúsculas, sin duplicados y ordenados
+      (las listas del modelo son conjuntos de habilidades/idiomas)
+    """
+    if isinstance(value, str):
+        return " ".join(value.split())
+    if isinstance(value, list):
+        items = {" ".join(str(item).split()).casefold() for item in value}
+        items.discard("")
+        return sorted(items)
+    return value
+
+
+def _canonical_hash(payload: Dict[str, Any]) -> str:
+    """Hash SHA-256 de la representación JSON canónica de un diccionario"""
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def fingerprint_vacante(vacante: VacanteData) -> str:
+    """Hash canónico de los datos normalizados de una vacante"""
+    return _canonical_hash({k: _normalize_value(v) for k, v in vacante.model_dump().items()})
+
+
+def fingerprint_candidato(candidato: CandidatoData) -> str:
+    """Hash canónico de los datos normalizados de un candidato"""
+    return _canonical_hash({k: _normalize_value(v) for k, v in candidato.model_dump().items()})
+
+
+def match_cache_key(
+    vacante: VacanteData,
+    candidato: CandidatoData,
+    model: str,
+    instructions: str,
+    vacante_fingerprint: Optional[str] = None,
+    candidato_fingerprint: Optional[str] = None
+) -> str:
+    """
+    Clave de caché de un análisis de matching
+
+    Incluye el modelo y las instrucciones del sistema para que un cambio de
+    configuración no devuelva análisis generados con la configuración anterior.
+    Si la vacante o el candidato están registrados se reutiliza su fingerprint.
+    """
+    return _canonical_hash({
+        "vacante": vacante_fingerprint or fingerprint_vacante(vacante),
+        "candidato": candidato_fingerprint or fingerprint_candidato(candidato),
+        "model": model,
+        "instructions": _canonical_hash({"text": instructions}),
+    })
+
+
+class MatchCache:
+    """
+    Caché de análisis de matching direccionada por contenido
+
+    Tiene dos niveles:
+    - Memoria: LRU con TTL, acotada por número de entradas
+    - Disco (opcional): SQLite con el mismo TTL, sobrevive a reinicios y se
+      comparte entre los workers que apuntan al mismo archivo
+
+    Las operaciones se llaman desde el event loop, así que nunca esperan el
+    bloqueo de otro proceso más de busy_timeout_seconds: una escritura que no
+    entra se guarda como pendiente (y se sirve desde ahí) y se reintenta en
+    la siguiente operación.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_seconds: int,
+        sqlite_path: Optional[str] = None,
+        memory_ttl_seconds: Optional[int] = None,
+        busy_timeout_seconds: float = 0.05
+    ):
+        """
+        Inicializa la caché
+
+        Args:
+            max_entries: Número máximo de entradas en memoria
+            ttl_seconds: Tiempo de vida de cada entrada en segundos
+            sqlite_path: Ruta de la base SQLite; None o vacío desactiva el nivel de disco
+            memory_ttl_seconds: Vida máxima de una entrada en memoria (None = ttl_seconds);
+                con SQLite compartido acota cuánto sirve un worker una entrada invalidada por otro
+            busy_timeout_seconds: Espera máxima por el bloqueo de SQLite antes de dejar la escritura pendiente
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.memory_ttl_seconds = min(memory_ttl_seconds or ttl_seconds, ttl_seconds)
+        self.sqlite_path = sqlite_path or None
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "invalidations": 0,
+            "deferred_writes": 0,
+        }
+        # Escrituras en disco que no entraron por bloqueo: clave -> (valor JSON, expiración) o None si es un borrado
+        self._pending: "OrderedDict[str, Optional[Tuple[str, float]]]" = OrderedDict()
+        self._pending_clear = False
+
+        self._db: Optional[sqlite3.Connection] = None
+        if self.sqlite_path:
+            self._db = sqlite3.connect(self.sqlite_path, check_same_thread=False, timeout=10.0)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS match_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.commit()
+            self._db.execute(f"PRAGMA busy_timeout = {int(busy_timeout_seconds * 1000)}")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Obtiene un análisis de la caché
+
+        Args:
+            key: Clave calculada con match_cache_key
+
+        Returns:
+            Copia del análisis almacenado o None si no existe o expiró
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return copy.deepcopy(value)
+                del self._entries[key]
+
+            if self._db is not None:
+                self._flush_pending()
+                if key in self._pending:
+                    row = self._pending[key]
+                elif self._pending_clear:
+                    row = None
+                else:
+                    row = self._read(key)
+                if row is not None and row[1] > now:
+                    value = json.loads(row[0])
+                    self._remember(key, row[1], value)
+                    self._stats["disk_hits"] += 1
+                    return copy.deepcopy(value)
+
+            self._stats["misses"] += 1
+            return None
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        """
+        Guarda un análisis en ambos niveles de la caché
+
+        Args:
+            key: Clave calculada con match_cache_key
+            value: Análisis a almacenar
+        """
+        expires_at = time.time() + self.ttl_seconds
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._remember(key, expires_at, value)
+            self._stats["stores"] += 1
+            if self._db is not None:
+                self._pending[key] = (json.dumps(value, ensure_ascii=False), expires_at)
+                self._pending.move_to_end(key)
+                self._flush_pending()
+                # Con la base bloqueada mucho tiempo, las altas más antiguas solo quedan en memoria
+                if len(self._pending) > self.max_entries:
+                    oldest = next((k for k, entry in self._pending.items() if entry is not None), None)
+                    if oldest is not None:
+                        del self._pending[oldest]
+
+    def invalidate(self, key: str) -> bool:
+        """
+        Elimina una entrada de la caché
+
+        Returns:
+            True si la entrada existía en algún nivel
+        """
+        with self._lock:
+            removed = self._entries.pop(key, None) is not None
+            if self._db is not None:
+                if key in self._pending:
+                    removed = removed or self._pending[key] is not None
+                elif not self._pending_clear:
+                    removed = removed or self._read(key) is not None
+                self._pending[key] = None
+                self._pending.move_to_end(key)
+                self._flush_pending()
+            if removed:
+                self._stats["invalidations"] += 1
+            return removed
+
+    def clear(self) -> int:
+        """
+        Vacía ambos niveles de la caché
+
+        Returns:
+            Número de entradas eliminadas de la memoria
+        """
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+            if self._db is not None:
+                self._pending.clear()
+                self._pending_clear = True
+                self._flush_pending()
+            self._stats["invalidations"] += count
+            return count
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Métricas de uso de la caché"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._entries)
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        lookups = hits + stats["misses"]
+        stats["hit_rate"] = round(hits / lookups, 4) if lookups else 0.0
+        stats["max_entries"] = self.max_entries
+        stats["ttl_seconds"] = self.ttl_seconds
+        stats["disk_enabled"] = self._db is not None
+        stats["pending_writes"] = len(self._pending)
+        return stats
+
+    def _read(self, key: str) -> Optional[Tuple[str, float]]:
+        """Valor JSON y expiración de una clave en disco (lectura sin bloqueo en WAL; requiere el lock)"""
+        try:
+            return self._db.execute(
+                "SELECT value, expires_at FROM match_cache WHERE key = ?", (key,)
+            ).fetchone()
+        except sqlite3.OperationalError:
+            return None
+
+    def _flush_pending(self) -> None:
+        """Escribe en disco las operaciones pendientes; si la base está ocupada quedan para la siguiente (requiere el lock)"""
+        if not self._pending and not self._pending_clear:
+            return
+        try:
+            with self._db:
+                if self._pending_clear:
+                    self._db.execute("DELETE FROM match_cache")
+                deletes = [(key,) for key, entry in self._pending.items() if entry is None]
+                upserts = [(key, entry[0], entry[1]) for key, entry in self._pending.items() if entry is not None]
+                self._db.executemany("DELETE FROM match_cache WHERE key = ?", deletes)
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO match_cache (key, value, expires_at) VALUES (?, ?, ?)", upserts
+                )
+        except sqlite3.OperationalError:
+            self._stats["deferred_writes"] += 1
+            return
+        self._pending.clear()
+        self._pending_clear = False
+
+    def _remember(self, key: str, expires_at: float, value: Dict[str, Any]) -> None:
+        """Inserta en el nivel de memoria respetando el límite LRU (requiere el lock)"""
+        self._entries[key] = (min(expires_at, time.time() + self.memory_ttl_seconds), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
@@ -0,0 +1,310 @@
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from app.models.schemas import CandidatoData, VacanteData
+
+# Tablas e índices del historial: la clave de cada análisis es el par vacante/candidato
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS match_history ("
+    "id INTEGER PRIMARY KEY, vacante_id TEXT NOT NULL, candidato_id TEXT NOT NULL, "
+    "status TEXT NOT NULL, match_score REAL NOT NULL, hard_skills_score REAL NOT NULL, "
+    "soft_skills_score REAL NOT NULL, experience_score REAL NOT NULL, source TEXT NOT NULL, "
+    "analysis TEXT NOT NULL, candidato TEXT NOT NULL, created_at REAL NOT NULL, updated_at REAL NOT NULL, "
+    "UNIQUE (vacante_id, candidato_id))",
+    "CREATE INDEX IF NOT EXISTS match_history_score ON match_history (vacante_id, match_score DESC)",
+    "CREATE INDEX IF NOT EXISTS match_history_status_score ON match_history (vacante_id, status, match_score DESC)",
+    "CREATE INDEX IF NOT EXISTS match_history_candidato ON match_history (candidato_id)",
+    # Una fila por habilidad faltante (canónica) de cada análisis
+    "CREATE TABLE IF NOT EXISTS match_history_missing ("
+    "vacante_id TEXT NOT NULL, skill TEXT NOT NULL, history_id INTEGER NOT NULL, "
+    "PRIMARY KEY (vacante_id, skill, history_id)) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS match_history_missing_entry ON match_history_missing (history_id)",
+    # Definición de cada vacante con la que se generaron los análisis
+    "CREATE TABLE IF NOT EXISTS match_history_vacantes ("
+    "vacante_id TEXT PRIMARY KEY, vacante TEXT NOT NULL, created_at REAL NOT NULL)",
+)
+
+
+@dataclass
+class HistoryEntry:
+    """Último análisis registrado de un par vacante/candidato"""
+
+    candidato_id: str
+    match_score: float
+    status: str
+    source: str
+    analysis: Dict[str, Any]
+    analyzed_at: float
+
+
+@dataclass
+class HistoryRecord:
+    """Análisis del historial con el candidato con el que se generó"""
+
+    candidato_id: str
+    candidato: CandidatoData
+    analysis: Dict[str, Any]
+    source: str
+
+
+@dataclass
+class HistoryPage:
+    """Página del leaderboard de una vacante"""
+
+    total: int
+    entries: List[HistoryEntry]
+
+
+class MatchHistory:
+    """
+    Historial indexado de los análisis de matching
+
+    Cada análisis válido se guarda en SQLite con columnas indexadas por
+    vacante (id por hash de contenido, el mismo del registro), candidato (id
+    por hash, el mismo del almacén), estado y match_score, más una tabla con
+    sus habilidades faltantes en forma canónica. Solo se conserva el último
+    análisis de cada par, así que un leaderboard (top N APROBADO por score,
+    o candidatos a los que solo les falta una habilidad) es una consulta por
+    índice que responde en milisegundos sin volver a llamar al modelo.
+
+    Varios procesos pueden compartir la base: las escrituras usan
+    transacciones IMMEDIATE y las lecturas no bloquean gracias a WAL.
+    """
+
+    def __init__(self, canonicalize: Callable[[str], str], sqlite_path: Optional[str] = None):
+        """
+        Inicializa el historial
+
+        Args:
+            canonicalize: Forma canónica de una habilidad (SkillMatcher.canonicalize)
+            sqlite_path: Ruta de la base SQLite; None o vacío la mantiene en memoria
+        """
+        self.canonicalize = canonicalize
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(sqlite_path or ":memory:", check_same_thread=False, timeout=10.0, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # Con WAL, NORMAL solo arriesga las últimas transacciones ante un corte de luz
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        for statement in _SCHEMA:
+            self._db.execute(statement)
+        self._stats = {"recorded": 0, "queries": 0, "query_ms": 0.0}
+
+    def record(
+        self,
+        vacante_id: str,
+        vacante: VacanteData,
+        candidato_id: str,
+        candidato: CandidatoData,
+        analysis: Dict[str, Any]
+    ) -> None:
+        """
+        Guarda (o sustituye) el análisis de un par vacante/candidato
+
+        Args:
+            vacante_id: Id de la vacante (prefijo de su hash canónico)
+            vacante: Datos de la vacante
+            candidato_id: Id del candidato (prefijo de su hash canónico)
+            candidato: Datos del candidato
+            analysis: Análisis validado (ATSMatchResponse serializado)
+        """
+        self.record_many(vacante_id, vacante, [(candidato_id, candidato, analysis)])
+
+    def record_many(
+        self,
+        vacante_id: str,
+        vacante: VacanteData,
+        entries: Sequence[Tuple[str, CandidatoData, Dict[str, Any]]]
+    ) -> None:
+        """
+        Guarda varios análisis de una vacante en una sola transacción
+
+        Args:
+            vacante_id: Id de la vacante
+            vacante: Datos de la vacante
+            entries: Tuplas (candidato_id, candidato, análisis)
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "INSERT OR IGNORE INTO match_history_vacantes (vacante_id, vacante, created_at) VALUES (?, ?, ?)",
+                    (vacante_id, vacante.model_dump_json(), now)
+                )
+                for candidato_id, candidato, analysis in entries:
+                    self._upsert(vacante_id, candidato_id, candidato, analysis, now)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._stats["recorded"] += len(entries)
+
+    def vacante(self, vacante_id: str) -> Optional[VacanteData]:
+        """
+        Definición de una vacante con análisis en el historial
+
+        Returns:
+            Los datos de la vacante o None si no tiene análisis registrados
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT vacante FROM match_history_vacantes WHERE vacante_id = ?", (vacante_id,)
+            ).fetchone()
+        return VacanteData.model_validate_json(row[0]) if row is not None else None
+
+    def iter_records(self, vacante_id: str, batch_size: int = 500) -> Iterator[List[HistoryRecord]]:
+        """
+        Recorre todos los análisis de una vacante por bloques
+
+        Cada bloque es una consulta independiente por id, así que la memoria
+        no crece con el tamaño del pool y el lock no se retiene entre bloques.
+
+        Yields:
+            Listas de hasta batch_size HistoryRecord
+        """
+        last_id = 0
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT id, candidato_id, candidato, analysis, source FROM match_history "
+                    "WHERE vacante_id = ? AND id > ? ORDER BY id LIMIT ?",
+                    (vacante_id, last_id, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            yield [
+                HistoryRecord(
+                    candidato_id=candidato_id,
+                    candidato=CandidatoData.model_validate_json(candidato),
+                    analysis=json.loads(analysis),
+                    source=source
+                )
+                for _, candidato_id, candidato, analysis, source in rows
+            ]
+
+    def leaderboard(
+        self,
+        vacante_id: str,
+        status: Optional[str] = None,
+        missing_skill: Optional[str] = None,
+        min_score: Optional[float] = None,
+        limit: int = 20,
+        offset: int = 0
+    ) -> HistoryPage:
+        """
+        Análisis de una vacante ordenados por match_score (mayor primero)
+
+        Args:
+            vacante_id: Id de la vacante
+            status: Solo análisis con este estado (APROBADO, RECHAZADO o PENDIENTE)
+            missing_skill: Solo candidatos a los que les falta esta habilidad
+                (se compara en forma canónica, así que acepta alias)
+            min_score: match_score mínimo
+            limit: Tamaño de la página
+            offset: Análisis que se saltan antes de la página
+
+        Returns:
+            HistoryPage con el total que cumple los filtros y la página pedida
+        """
+        joins = ""
+        conditions = ["h.vacante_id = ?"]
+        params: List[Any] = [vacante_id]
+        if missing_skill:
+            joins = " JOIN match_history_missing m ON m.history_id = h.id AND m.vacante_id = h.vacante_id AND m.skill = ?"
+            params.insert(0, self.canonicalize(missing_skill))
+        if status:
+            conditions.append("h.status = ?")
+            params.append(status)
+        if min_score is not None:
+            conditions.append("h.match_score >= ?")
+            params.append(min_score)
+        query = f" FROM match_history h{joins} WHERE {' AND '.join(conditions)}"
+
+        started = time.perf_counter()
+        with self._lock:
+            total = self._db.execute(f"SELECT COUNT(*){query}", params).fetchone()[0]
+            rows = self._db.execute(
+                f"SELECT h.candidato_id, h.match_score, h.status, h.source, h.analysis, h.updated_at{query} "
+                "ORDER BY h.match_score DESC, h.id LIMIT ? OFFSET ?",
+                [*params, limit, offset]
+            ).fetchall()
+            self._stats["queries"] += 1
+            self._stats["query_ms"] += (time.perf_counter() - started) * 1000
+        return HistoryPage(
+            total=total,
+            entries=[
+                HistoryEntry(
+                    candidato_id=candidato_id,
+                    match_score=match_score,
+                    status=status_value,
+                    source=source,
+                    analysis=json.loads(analysis),
+                    analyzed_at=updated_at
+                )
+                for candidato_id, match_score, status_value, source, analysis, updated_at in rows
+            ]
+        )
+
+    def _upsert(
+        self,
+        vacante_id: str,
+        candidato_id: str,
+        candidato: CandidatoData,
+        analysis: Dict[str, Any],
+        now: float
+    ) -> None:
+        """Inserta o actualiza un análisis y sus habilidades faltantes (dentro de una transacción)"""
+        skill_analysis = analysis["skill_analysis"]
+        stored = {key: value for key, value in analysis.items() if key != "processing"}
+        missing = {self.canonicalize(skill) for skill in skill_analysis.get("missing_skills", [])}
+        missing.discard("")
+        history_id = self._db.execute(
+            "INSERT INTO match_history (vacante_id, candidato_id, status, match_score, hard_skills_score, "
+            "soft_skills_score, experience_score, source, analysis, candidato, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (vacante_id, candidato_id) DO UPDATE SET status = excluded.status, "
+            "match_score = excluded.match_score, hard_skills_score = excluded.hard_skills_score, "
+            "soft_skills_score = excluded.soft_skills_score, experience_score = excluded.experience_score, "
+            "source = excluded.source, analysis = excluded.analysis, candidato = excluded.candidato, "
+            "updated_at = excluded.updated_at "
+            "RETURNING id",
+            (
+                vacante_id,
+                candidato_id,
+                analysis["status"],
+                float(analysis["match_score"]),
+                float(skill_analysis["hard_skills_score"]),
+                float(skill_analysis["soft_skills_score"]),
+                float(analysis["experience_score"]),
+                analysis.get("processing", {}).get("source", "llm"),
+                json.dumps(stored, ensure_ascii=False),
+                candidato.model_dump_json(),
+                now,
+                now
+            )
+        ).fetchone()[0]
+        self._db.execute("DELETE FROM match_history_missing WHERE history_id = ?", (history_id,))
+        self._db.executemany(
+            "INSERT INTO match_history_missing (vacante_id, skill, history_id) VALUES (?, ?, ?)",
+            [(vacante_id, skill, history_id) for skill in sorted(missing)]
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Análisis y vacantes en el historial, análisis registrados y latencia media de las consultas"""
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM match_history").fetchone()[0]
+            vacantes = self._db.execute("SELECT COUNT(*) FROM match_history_vacantes").fetchone()[0]
+            stats: Dict[str, Any] = dict(self._stats)
+        queries = stats.pop("queries")
+        query_ms = stats.pop("query_ms")
+        return {
+            "entries": entries,
+            "vacantes": vacantes,
+            "recorded": stats["recorded"],
+            "queries": queries,
+            "avg_query_ms": round(query_ms / queries, 3) if queries else None,
+        }
@@ -0,0 +1,201 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Buckets (segundos) de los histogramas de latencia: de sub-milisegundo a un minuto
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+# Un collector devuelve muestras (nombre, tipo, ayuda, etiquetas, valor) en el momento del scrape
+Sample = Tuple[str, str, str, Dict[str, str], float]
+
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Sequence[Tuple[str, str]] = ()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """Contador monótono con etiquetas"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(key)} {_format_value(value)}" for key, value in values]
+
+
+class Histogram:
+    """Histograma acumulativo con etiquetas (formato de exposición de Prometheus)"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._series: Dict[LabelKey, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            # Conteos por bucket (no acumulados) + [suma, total]
+            series = self._series.setdefault(key, [0.0] * (len(self.buckets) + 3))
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = sorted((key, list(values)) for key, values in self._series.items())
+        lines = []
+        for key, values in series:
+            cumulative = 0.0
+            for bound, count in zip((*self.buckets, float("inf")), values):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', _format_value(bound))])} {_format_value(cumulative)}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(values[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {_format_value(values[-1])}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Registro de métricas expuesto en /metrics
+
+    Los contadores e histogramas se actualizan en el código instrumentado;
+    los gauges (caché, scheduler, cola) se leen de collectors en cada scrape.
+    """
+
+    def __init__(self):
+        self._metrics: List[Any] = []
+        self._collectors: Dict[str, Callable[[], List[Sample]]] = {}
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        metric = Counter(name, help_text)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, name: str, collector: Callable[[], List[Sample]]) -> None:
+        """Registra (o sustituye) un collector de gauges"""
+        self._collectors[name] = collector
+
+    def render(self) -> str:
+        """Texto en formato de exposición de Prometheus 0.0.4"""
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+
+        grouped: Dict[str, Tuple[str, str, List[str]]] = {}
+        for collector in list(self._collectors.values()):
+            for name, kind, help_text, labels, value in collector():
+                entry = grouped.setdefault(name, (kind, help_text, []))
+                entry[2].append(f"{name}{_format_labels(_label_key(labels))} {_format_value(value)}")
+        for name, (kind, help_text, samples) in grouped.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+class StageTimings:
+    """Duración acumulada de cada etapa de una petición (para la cabecera Server-Timing)"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def server_timing(self) -> str:
+        """Valor de la cabecera Server-Timing (duraciones en ms) incluyendo el total"""
+        entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.stages.items()]
+        entries.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(entries)
+
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    "ats_stage_duration_seconds", "Duración de cada etapa del matching (validate, prepare, prompt, queue, llm, parse, history, response)"
+)
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "ats_http_request_duration_seconds", "Duración de las peticiones HTTP por ruta, método y código"
+)
+LLM_TOKENS = registry.counter("ats_llm_tokens_total", "Tokens de las llamadas al modelo (input/output reportados, prompt estimado)")
+LLM_CALLS = registry.counter("ats_llm_calls_total", "Llamadas al modelo por modelo y resultado")
+PARSE_RESULTS = registry.counter("ats_parse_results_total", "Resultado de la extracción del JSON del modelo (ok, repaired, failed)")
+ANALYSIS_SOURCES = registry.counter("ats_analyses_total", "Análisis completados por origen (llm, cache, compliance, local)")
+DEADLINES_EXCEEDED = registry.counter("ats_deadline_exceeded_total", "Peticiones que superaron su plazo (deadline) antes de obtener el análisis")
+
+_current_timings: ContextVar[Optional[StageTimings]] = ContextVar("ats_stage_timings", default=None)
+
+
+def start_request_timings() -> StageTimings:
+    """Crea las métricas de etapa de la petición en curso (lo llama el middleware HTTP)"""
+    timings = StageTimings()
+    _current_timings.set(timings)
+    return timings
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    """Registra la duración de una etapa en el histograma y en la petición en curso"""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+def record_stage_since_request_start(stage: str) -> None:
+    """Registra como etapa el tiempo desde que llegó la petición (p. ej. parseo y validación del body)"""
+    timings = _current_timings.get()
+    if timings is not None:
+        record_stage(stage, time.perf_counter() - timings.started)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Context manager que mide una etapa del matching"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started)
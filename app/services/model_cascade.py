@@ -0,0 +1,112 @@
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Sequence
+from agno.agent import Agent
+from app.services.prompt_builder import PromptBuilder
+from app.services.rate_limiter import RateLimitScheduler
+
+# Nombres de los niveles de la cascada
+TIER_SMALL = "small"
+TIER_LARGE = "large"
+
+# Motivos de escalado al modelo grande
+ESCALATION_PARSE_FAILED = "parse_failed"
+ESCALATION_UNCERTAIN = "uncertain_score"
+
+
+@dataclass
+class ModelTier:
+    """Un nivel de la cascada: modelo, agente, prompt y precio por millón de tokens"""
+
+    name: str
+    model_id: str
+    agent: Agent
+    scheduler: RateLimitScheduler
+    prompt_builder: PromptBuilder
+    price_input_per_mtok: float
+    price_output_per_mtok: float
+
+    def cost(self, input_tokens: int, output_tokens: int) -> float:
+        """Coste en USD de una llamada"""
+        return (input_tokens * self.price_input_per_mtok + output_tokens * self.price_output_per_mtok) / 1_000_000
+
+
+def escalation_reason(analysis: Dict[str, Any], band_low: float, band_high: float) -> Optional[str]:
+    """
+    Decide si el análisis del modelo pequeño debe repetirse con el grande
+
+    Args:
+        analysis: Análisis del modelo pequeño (con processing.parse_status)
+        band_low: Límite inferior (inclusive) de la banda de incertidumbre
+        band_high: Límite superior (inclusive) de la banda de incertidumbre
+
+    Returns:
+        Motivo del escalado o None si el modelo pequeño decide
+    """
+    if analysis.get("processing", {}).get("parse_status") == "failed":
+        return ESCALATION_PARSE_FAILED
+    if band_low <= float(analysis.get("match_score", 0.0)) <= band_high:
+        return ESCALATION_UNCERTAIN
+    return None
+
+
+class CascadeStats:
+    """
+    Métricas por nivel de la cascada
+
+    El ahorro se estima frente a enviar todas las peticiones al modelo
+    grande, con su latencia y coste medios observados.
+    """
+
+    def __init__(self, tiers: Sequence[str]):
+        self._lock = threading.Lock()
+        self._tiers = {
+            name: {"calls": 0, "decided": 0, "escalated": 0, "latency_ms": 0.0,
+                   "input_tokens": 0, "output_tokens": 0, "cost_usd": 0.0}
+            for name in tiers
+        }
+        self._requests = 0
+
+    def record_call(self, tier: str, latency_ms: float, input_tokens: int, output_tokens: int, cost: float) -> None:
+        """Registra una llamada a un nivel"""
+        with self._lock:
+            stats = self._tiers[tier]
+            stats["calls"] += 1
+            stats["latency_ms"] += latency_ms
+            stats["input_tokens"] += input_tokens
+            stats["output_tokens"] += output_tokens
+            stats["cost_usd"] += cost
+
+    def record_decision(self, tier: str, escalated_from: Optional[str] = None) -> None:
+        """Registra qué nivel resolvió la petición (y desde cuál se escaló)"""
+        with self._lock:
+            self._requests += 1
+            self._tiers[tier]["decided"] += 1
+            if escalated_from is not None:
+                self._tiers[escalated_from]["escalated"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Llamadas, decisiones, latencia y coste por nivel, más el ahorro estimado"""
+        with self._lock:
+            tiers = {}
+            for name, stats in self._tiers.items():
+                calls = stats["calls"]
+                tiers[name] = {
+                    "calls": calls,
+                    "decided": stats["decided"],
+                    "escalated": stats["escalated"],
+                    "avg_latency_ms": round(stats["latency_ms"] / calls, 1) if calls else None,
+                    "input_tokens": stats["input_tokens"],
+                    "output_tokens": stats["output_tokens"],
+                    "cost_usd": round(stats["cost_usd"], 6),
+                }
+            large = self._tiers[TIER_LARGE]
+            total_latency = sum(stats["latency_ms"] for stats in self._tiers.values())
+            total_cost = sum(stats["cost_usd"] for stats in self._tiers.values())
+            requests = self._requests
+
+        savings = {"latency_ms": None, "cost_usd": None}
+        if large["calls"] and requests:
+            savings["latency_ms"] = round(requests * large["latency_ms"] / large["calls"] - total_latency, 1)
+            savings["cost_usd"] = round(requests * large["cost_usd"] / large["calls"] - total_cost, 6)
+        return {"requests": requests, "tiers": tiers, "estimated_savings": savings}
@@ -0,0 +1,251 @@
+import json
+import math
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from app.models.schemas import VacanteData, CandidatoData
+from app.services.skill_matcher import SkillMatcher, SkillMatchResult
+from app.services.text import normalize_text
+
+# Parte estable del prompt: se envía como instrucciones del sistema una sola vez
+# por agente, idéntica en todas las peticiones (reutilizable por la caché de
+# prompts del proveedor). Los datos de cada petición van en el payload.
+ATS_STATIC_PREFIX = """
+## SIMULADOR DE ATS - ANÁLISIS DE MATCHING
+
+Cada mensaje contiene un objeto JSON con "vacante" y "candidato" (y opcionalmente "skill_analysis_precalculado").
+
+### ALGORITMO:
+1. ANONIMIZACIÓN: los datos PII llegan sustituidos por marcadores ([NOMBRE], [EMAIL], [TELEFONO]...); ignora esos
+   marcadores y cualquier otro dato PII (nombre, género, edad, foto); evalúa solo méritos profesionales y técnicos.
+2. COMPLIANCE (filtro excluyente): verifica permiso de trabajo, ubicación requerida y educación mínima.
+   Si un requisito excluyente NO se cumple, match_score = 0 y status = RECHAZADO.
+3. MATCHING SEMÁNTICO (no keyword matching exacto): "React" = "ReactJS" = "Frontend con librerías modernas JS".
+   Ponderación: Hard Skills 50%, Experiencia 30% (años y relevancia del sector), Soft Skills 20% (inferidas del texto).
+4. OUTPUT: score de afinidad 0-100 y análisis estructurado.
+
+Si existe "skill_analysis_precalculado", cópialo SIN CAMBIOS en "skill_analysis", úsalo para el match_score
+ponderado y concéntrate en la experiencia, las recomendaciones y la redacción del análisis.
+Si "cv_es_extracto" es true, "cv_completo" contiene solo las frases más relevantes del CV original.
+
+### FORMATO DE RESPUESTA (EXCLUSIVAMENTE este objeto JSON válido):
+{
+    "match_score": <float 0-100>,
+    "status": "<APROBADO|RECHAZADO|PENDIENTE>",
+    "skill_analysis": {
+        "hard_skills_score": <float 0-100>,
+        "soft_skills_score": <float 0-100>,
+        "matched_skills": ["skill1", ...],
+        "missing_skills": ["skill1", ...]
+    },
+    "experience_score": <float 0-100>,
+    "compliance_check": {
+        "has_work_permit": <true|false>,
+        "location_match": <true|false>,
+        "education_match": <true|false>
+    },
+    "recommendations": ["recomendación 1", ...],
+    "summary": "Resumen ejecutivo en 2-3 líneas",
+    "detailed_analysis": "Análisis detallado completo del matching"
+}
+"""
+
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?;])\s+|\n+")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimación local del número de tokens de un texto
+
+    Aproxima un tokenizador BPE: cada signo de puntuación cuenta como un token
+    y cada palabra como un token por cada 4 caracteres.
+    """
+    if not text:
+        return 0
+    return sum(max(1, math.ceil(len(token) / 4)) for token in _TOKEN_PATTERN.findall(text))
+
+
+def compress_text(text: str, keywords: Sequence[str], max_tokens: int) -> str:
+    """
+    Compresión extractiva: conserva las frases más relevantes dentro de un presupuesto
+
+    Las frases se puntúan por cuántas palabras clave (ya normalizadas) mencionan;
+    se eligen de mayor a menor relevancia y se devuelven en su orden original.
+
+    Args:
+        text: Texto a comprimir
+        keywords: Palabras clave normalizadas (habilidades de la vacante y sus alias)
+        max_tokens: Presupuesto de tokens del resultado
+
+    Returns:
+        El texto original si cabe en el presupuesto, o el extracto
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    sentences = [sentence.strip() for sentence in _SENTENCE_SPLIT.split(text) if sentence and sentence.strip()]
+    scored = []
+    for position, sentence in enumerate(sentences):
+        normalized = f" {normalize_text(sentence)} "
+        relevance = sum(1 for keyword in keywords if f" {keyword} " in normalized)
+        # A igual relevancia se prefieren las primeras frases (perfil/resumen del CV)
+        scored.append((relevance, -position, position, sentence))
+    scored.sort(reverse=True)
+
+    selected: List[Tuple[int, str]] = []
+    used = 0
+    for _, _, position, sentence in scored:
+        cost = estimate_tokens(sentence) + 1
+        if used + cost > max_tokens:
+            continue
+        selected.append((position, sentence))
+        used += cost
+
+    if not selected:
+        # Ninguna frase cabe entera: recortar por caracteres (~4 por token)
+        return text[:max_tokens * 4]
+    selected.sort()
+    return " ".join(sentence for _, sentence in selected)
+
+
+@dataclass
+class PromptStats:
+    """Tamaño estimado del prompt de una petición"""
+
+    static_prefix_tokens: int
+    payload_tokens: int
+    cv_tokens_original: int
+    cv_tokens_sent: int
+    # Etapa de anonimización previa (0 si está desactivada)
+    pii_redactions: int = 0
+    anonymized_chars_removed: int = 0
+    anonymized_tokens_removed: int = 0
+
+    @property
+    def cv_compressed(self) -> bool:
+        """True si el CV se recortó para respetar el presupuesto"""
+        return self.cv_tokens_sent < self.cv_tokens_original
+
+
+class PromptBuilder:
+    """
+    Constructor del prompt ATS con prefijo estático y payload compacto
+
+    El prefijo estático (ATS_STATIC_PREFIX) se registra como instrucción del
+    agente; cada petición solo envía un JSON compacto con los datos de la
+    vacante y el candidato, con el CV comprimido si excede el presupuesto.
+    """
+
+    def __init__(self, skill_matcher: SkillMatcher, token_budget: int, cv_max_tokens: int):
+        """
+        Inicializa el constructor
+
+        Args:
+            skill_matcher: Motor de skills (sus alias guían la compresión del CV)
+            token_budget: Presupuesto total de tokens del payload por petición
+            cv_max_tokens: Máximo de tokens del CV dentro del payload
+        """
+        self.skill_matcher = skill_matcher
+        self.token_budget = token_budget
+        self.cv_max_tokens = cv_max_tokens
+        self.static_prefix = ATS_STATIC_PREFIX
+        self.static_prefix_tokens = estimate_tokens(ATS_STATIC_PREFIX)
+
+    def vacante_section(self, vacante: VacanteData) -> Dict[str, Any]:
+        """Sección "vacante" del payload"""
+        return {
+            "puesto": vacante.job_title,
+            "descripcion": vacante.job_description,
+            "hard_skills_requeridas": vacante.hard_skills,
+            "soft_skills_deseadas": vacante.soft_skills or [],
+            "años_experiencia": vacante.years_experience,
+            "educacion": vacante.education or "No especificada",
+            "idiomas": vacante.languages or [],
+            "ubicacion_requerida": vacante.location_required or "Flexible",
+            "permiso_trabajo_requerido": vacante.work_permit_required,
+            "sector": vacante.sector or "General",
+        }
+
+    def render_vacante(self, vacante: VacanteData) -> str:
+        """Sección "vacante" ya serializada (se precalcula al registrar la vacante)"""
+        return self._render(self.vacante_section(vacante))
+
+    def keywords_for(self, vacante: VacanteData) -> List[str]:
+        """Palabras clave normalizadas de la vacante usadas para comprimir el CV"""
+        keywords = set()
+        for skill in [*vacante.hard_skills, *(vacante.soft_skills or [])]:
+            canonical = self.skill_matcher.canonicalize(skill)
+            keywords.add(canonical)
+            keywords.update(self.skill_matcher.surface_forms(canonical))
+        if vacante.sector:
+            keywords.add(normalize_text(vacante.sector))
+        keywords.discard("")
+        return sorted(keywords)
+
+    def build(
+        self,
+        vacante: VacanteData,
+        candidato: CandidatoData,
+        skill_match: Optional[SkillMatchResult] = None,
+        vacante_json: Optional[str] = None,
+        keywords: Optional[List[str]] = None
+    ) -> Tuple[str, PromptStats]:
+        """
+        Construye el payload de una petición
+
+        Args:
+            vacante: Datos de la vacante
+            candidato: Datos del candidato
+            skill_match: Sección de habilidades precalculada por el motor local (opcional)
+            vacante_json: Sección "vacante" ya serializada con render_vacante (opcional)
+            keywords: Palabras clave de compresión ya calculadas con keywords_for (opcional)
+
+        Returns:
+            Tupla (mensaje para el agente, estadísticas de tokens)
+        """
+        if vacante_json is None:
+            vacante_json = self.render_vacante(vacante)
+        if keywords is None:
+            keywords = self.keywords_for(vacante)
+
+        payload: Dict[str, Any] = {
+            "candidato": {
+                "cv_completo": "",
+                "habilidades": candidato.skills,
+                "años_experiencia": candidato.years_experience,
+                "educacion": candidato.education,
+                "idiomas": candidato.languages,
+                "ubicacion_actual": candidato.location,
+                "tiene_permiso_trabajo": candidato.has_work_permit,
+                "experiencia_sector": candidato.sector_experience or "No especificada",
+                "info_adicional": candidato.additional_info or "N/A",
+            },
+        }
+        if skill_match is not None:
+            payload["skill_analysis_precalculado"] = skill_match.to_skill_analysis()
+
+        base_tokens = estimate_tokens(self._message(vacante_json, payload))
+        cv_budget = max(min(self.cv_max_tokens, self.token_budget - base_tokens), 0)
+        cv_tokens_original = estimate_tokens(candidato.cv_text)
+        cv_text = compress_text(candidato.cv_text, keywords, cv_budget)
+        if cv_text != candidato.cv_text:
+            payload["candidato"]["cv_es_extracto"] = True
+        payload["candidato"]["cv_completo"] = cv_text
+
+        message = self._message(vacante_json, payload)
+        stats = PromptStats(
+            static_prefix_tokens=self.static_prefix_tokens,
+            payload_tokens=estimate_tokens(message),
+            cv_tokens_original=cv_tokens_original,
+            cv_tokens_sent=estimate_tokens(cv_text),
+        )
+        return message, stats
+
+    def _render(self, payload: Dict[str, Any]) -> str:
+        """Serializa el payload en JSON compacto"""
+        return json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+
+    def _message(self, vacante_json: str, payload: Dict[str, Any]) -> str:
+        """Mensaje final: la sección "vacante" serializada seguida del resto del payload"""
+        return '{"vacante":' + vacante_json + "," + self._render(payload)[1:]
@@ -0,0 +1,531 @@
+import asyncio
+import heapq
+import itertools
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Any, Dict, List, Optional
+
+# Resultado de una llamada al modelo, para el control de concurrencia AIMD
+OUTCOME_OK = "ok"
+OUTCOME_RATE_LIMITED = "rate_limited"
+OUTCOME_ERROR = "error"
+# Llamada abandonada (venció el plazo o ganó la llamada de cobertura): no cuenta como error
+OUTCOME_CANCELLED = "cancelled"
+
+# Espera por defecto cuando el proveedor no indica cuándo reintentar
+DEFAULT_RETRY_AFTER_SECONDS = 2.0
+
+_RATE_LIMIT_MARKERS = ("rate_limit_exceeded", "rate limit", "too many requests", "error code: 429")
+_RETRY_AFTER_PATTERN = re.compile(r"try again in\s+(?:(\d+)m(?!s))?\s*(\d+(?:\.\d+)?)\s*(ms|s)\b", re.IGNORECASE)
+
+
+class Priority(IntEnum):
+    """Clases de prioridad del scheduler (menor valor = se despacha antes)"""
+    INTERACTIVE = 0
+    BATCH = 1
+    BACKGROUND = 2
+
+
+class RateLimitExceeded(Exception):
+    """El proveedor sigue limitando la tasa tras los reintentos"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Límite de tasa de Groq alcanzado; reintentar en {retry_after:.1f} s")
+        self.retry_after = retry_after
+
+
+def rate_limit_retry_after(text: Optional[str]) -> Optional[float]:
+    """
+    Detecta un error 429 de Groq en el texto devuelto por el agente
+
+    El agente no propaga los errores del proveedor: devuelve su mensaje como
+    contenido de la respuesta, p. ej. "Rate limit reached ... Please try
+    again in 1m2.5s".
+
+    Returns:
+        Segundos de espera sugeridos o None si el texto no es un error de rate limit
+    """
+    if not text:
+        return None
+    lowered = text.lower()
+    if not any(marker in lowered for marker in _RATE_LIMIT_MARKERS):
+        return None
+    match = _RETRY_AFTER_PATTERN.search(text)
+    if match is None:
+        return DEFAULT_RETRY_AFTER_SECONDS
+    minutes, amount, unit = match.groups()
+    seconds = float(amount) / 1000 if unit.lower() == "ms" else float(amount)
+    return seconds + 60 * int(minutes or 0)
+
+
+class TokenBucket:
+    """Cubeta de tokens con recarga continua (capacidad = un minuto de cuota)"""
+
+    def __init__(self, per_minute: float):
+        """
+        Args:
+            per_minute: Cuota por minuto; 0 desactiva el límite
+        """
+        self.per_minute = per_minute
+        self.capacity = per_minute
+        self.available = per_minute
+        self._updated = time.monotonic()
+
+    @property
+    def enabled(self) -> bool:
+        return self.per_minute > 0
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._updated = now
+        self.available = min(self.capacity, self.available + elapsed * self.per_minute / 60)
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Segundos hasta que haya `amount` disponibles (0 si ya los hay)"""
+        if not self.enabled:
+            return 0.0
+        self._refill(now)
+        # Una petición mayor que la capacidad espera a tener la cubeta llena
+        amount = min(amount, self.capacity)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) * 60 / self.per_minute
+
+    def consume(self, amount: float) -> None:
+        """Descuenta `amount` (puede dejar la cubeta en negativo al conciliar el uso real)"""
+        if self.enabled:
+            self.available -= amount
+
+
+class LocalQuota:
+    """Cuotas RPM/TPM y pausa por 429 de un solo proceso"""
+
+    # Reloj de las cubetas y de la pausa
+    clock = staticmethod(time.monotonic)
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float):
+        """
+        Args:
+            requests_per_minute: Cuota RPM del proveedor (0 = sin límite)
+            tokens_per_minute: Cuota TPM del proveedor (0 = sin límite)
+        """
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.paused_until = 0.0
+
+    def try_acquire(self, tokens: float) -> float:
+        """
+        Consume una petición y `tokens` si hay cuota
+
+        Returns:
+            0 si se concedió; si no, segundos hasta que pueda haber cuota
+        """
+        now = self.clock()
+        wait = max(
+            self.paused_until - now,
+            self.requests.wait_time(1, now),
+            self.tokens.wait_time(tokens, now)
+        )
+        if wait > 0:
+            return wait
+        self.requests.consume(1)
+        self.tokens.consume(tokens)
+        return 0.0
+
+    def reconcile(self, tokens: float) -> None:
+        """Descuenta la diferencia entre los tokens reales y los estimados (puede ser negativa)"""
+        self.tokens.consume(tokens)
+
+    def pause(self, seconds: float) -> None:
+        """Detiene el despacho durante `seconds` (sin acortar una pausa en curso)"""
+        self.paused_until = max(self.paused_until, self.clock() + seconds)
+
+    def snapshot(self) -> Dict[str, Optional[float]]:
+        """Cuotas disponibles y pausa restante"""
+        return {
+            "requests_available": round(self.requests.available, 1) if self.requests.enabled else None,
+            "tokens_available": round(self.tokens.available, 1) if self.tokens.enabled else None,
+            "paused_for_seconds": round(max(self.paused_until - self.clock(), 0.0), 2),
+        }
+
+
+class SharedQuota(LocalQuota):
+    """
+    Cuotas RPM/TPM compartidas entre procesos a través de SQLite
+
+    La fila `name` guarda el presupuesto común y la pausa por 429. Para no
+    bloquear el event loop, cada worker toma del presupuesto una asignación
+    local (un lote de peticiones y tokens) dentro de una transacción BEGIN
+    IMMEDIATE breve y la va gastando sin tocar SQLite; solo vuelve a la base
+    cuando se agota. Si la base está ocupada no se espera: se pide reintentar
+    al cabo de `busy_retry_seconds`. La pausa por 429 se escribe al momento y
+    se lee (lectura simple, sin bloqueo en WAL) antes de cada concesión, así
+    que un 429 pausa el despacho en todos los workers.
+    """
+
+    clock = staticmethod(time.time)
+
+    def __init__(
+        self,
+        sqlite_path: str,
+        name: str,
+        requests_per_minute: float,
+        tokens_per_minute: float,
+        lease_fraction: float = 0.05,
+        busy_timeout_seconds: float = 0.05,
+        busy_retry_seconds: float = 0.05
+    ):
+        """
+        Args:
+            sqlite_path: Ruta de la base SQLite compartida por los workers
+            name: Nombre de la cuota (Groq las aplica por modelo)
+            requests_per_minute: Cuota RPM del proveedor (0 = sin límite)
+            tokens_per_minute: Cuota TPM del proveedor (0 = sin límite)
+            lease_fraction: Fracción de la cuota por minuto que se toma en cada asignación local
+            busy_timeout_seconds: Espera máxima por el bloqueo de SQLite dentro del event loop
+            busy_retry_seconds: Espera sugerida al scheduler cuando la base está ocupada
+        """
+        super().__init__(requests_per_minute, tokens_per_minute)
+        self.name = name
+        self.lease_fraction = lease_fraction
+        self.busy_retry_seconds = busy_retry_seconds
+        # Asignación local ya descontada del presupuesto común (negativa = deuda al conciliar)
+        self._lease_requests = 0.0
+        self._lease_tokens = 0.0
+        # Pausa que no se pudo escribir porque la base estaba ocupada
+        self._pending_pause = 0.0
+        self._db = sqlite3.connect(sqlite_path, check_same_thread=False, isolation_level=None, timeout=10.0)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS rate_quotas ("
+            "name TEXT PRIMARY KEY, requests REAL NOT NULL, tokens REAL NOT NULL, "
+            "paused_until REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._db.execute(
+            "INSERT OR IGNORE INTO rate_quotas (name, requests, tokens, paused_until, updated_at) VALUES (?, ?, ?, 0, ?)",
+            (name, self.requests.available, self.tokens.available, self.clock())
+        )
+        # A partir de aquí las operaciones corren en el event loop: nunca esperan más que esto
+        self._db.execute(f"PRAGMA busy_timeout = {int(busy_timeout_seconds * 1000)}")
+
+    def try_acquire(self, tokens: float) -> float:
+        now = self.clock()
+        self._write_pause()
+        self._read_pause()
+        if self.paused_until > now:
+            return self.paused_until - now
+        missing_requests = 1 - self._lease_requests if self.requests.enabled else 0.0
+        missing_tokens = tokens - self._lease_tokens if self.tokens.enabled else 0.0
+        if missing_requests > 0 or missing_tokens > 0:
+            wait = self._renew_lease(max(missing_requests, 0.0), max(missing_tokens, 0.0))
+            if wait > 0:
+                return wait
+        if self.requests.enabled:
+            self._lease_requests -= 1
+        if self.tokens.enabled:
+            self._lease_tokens -= tokens
+        return 0.0
+
+    def reconcile(self, tokens: float) -> None:
+        # La diferencia se salda con la asignación local; una deuda se cobra al renovarla
+        if self.tokens.enabled:
+            self._lease_tokens -= tokens
+
+    def pause(self, seconds: float) -> None:
+        super().pause(seconds)
+        self._pending_pause = self.paused_until
+        self._write_pause()
+
+    def snapshot(self) -> Dict[str, Optional[float]]:
+        """Cuotas disponibles (comunes más la asignación local) y pausa restante"""
+        try:
+            row = self._db.execute(
+                "SELECT requests, tokens, paused_until, updated_at FROM rate_quotas WHERE name = ?", (self.name,)
+            ).fetchone()
+        except sqlite3.OperationalError:
+            row = None
+        now = self.clock()
+        result: Dict[str, Optional[float]] = {"requests_available": None, "tokens_available": None}
+        for key, bucket, lease, index in (
+            ("requests_available", self.requests, self._lease_requests, 0),
+            ("tokens_available", self.tokens, self._lease_tokens, 1),
+        ):
+            if not bucket.enabled:
+                continue
+            available = bucket.available
+            if row is not None:
+                available = min(bucket.capacity, row[index] + (now - row[3]) * bucket.per_minute / 60)
+            result[key] = round(available + lease, 1)
+        paused_until = max(self.paused_until, row[2]) if row is not None else self.paused_until
+        result["paused_for_seconds"] = round(max(paused_until - now, 0.0), 2)
+        return result
+
+    def _read_pause(self) -> None:
+        """Actualiza la pausa con la de los demás workers (lectura simple)"""
+        try:
+            row = self._db.execute("SELECT paused_until FROM rate_quotas WHERE name = ?", (self.name,)).fetchone()
+        except sqlite3.OperationalError:
+            return
+        self.paused_until = max(self.paused_until, row[0])
+
+    def _write_pause(self) -> None:
+        """Publica la pausa pendiente; si la base está ocupada se reintenta en la siguiente concesión"""
+        if not self._pending_pause:
+            return
+        try:
+            self._db.execute(
+                "UPDATE rate_quotas SET paused_until = MAX(paused_until, ?) WHERE name = ?",
+                (self._pending_pause, self.name)
+            )
+        except sqlite3.OperationalError:
+            return
+        self._pending_pause = 0.0
+
+    def _renew_lease(self, requests: float, tokens: float) -> float:
+        """
+        Toma del presupuesto común al menos lo que falta para la siguiente concesión
+
+        Returns:
+            0 si se renovó la asignación; si no, segundos hasta volver a intentarlo
+        """
+        try:
+            self._db.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError:
+            return self.busy_retry_seconds
+        try:
+            shared_requests, shared_tokens, paused_until, updated_at = self._db.execute(
+                "SELECT requests, tokens, paused_until, updated_at FROM rate_quotas WHERE name = ?", (self.name,)
+            ).fetchone()
+            now = self.clock()
+            self.paused_until = max(self.paused_until, paused_until)
+            for bucket, available in ((self.requests, shared_requests), (self.tokens, shared_tokens)):
+                bucket.available = available
+                bucket._updated = updated_at
+                if bucket.enabled:
+                    bucket._refill(now)
+            wait = max(
+                self.paused_until - now,
+                self.requests.wait_time(requests, now) if requests else 0.0,
+                self.tokens.wait_time(tokens, now) if tokens else 0.0
+            )
+            if wait <= 0:
+                self._lease_requests += self._take(self.requests, requests)
+                self._lease_tokens += self._take(self.tokens, tokens)
+            self._db.execute(
+                "UPDATE rate_quotas SET requests = ?, tokens = ?, updated_at = ? WHERE name = ?",
+                (self.requests.available, self.tokens.available, now, self.name)
+            )
+            self._db.execute("COMMIT")
+        except BaseException as e:
+            self._db.execute("ROLLBACK")
+            if isinstance(e, sqlite3.OperationalError):
+                return self.busy_retry_seconds
+            raise
+        return max(wait, 0.0)
+
+    def _take(self, bucket: TokenBucket, needed: float) -> float:
+        """Descuenta de la cubeta común lo que falta más el lote de la asignación (sin pasar de lo disponible)"""
+        if not bucket.enabled or needed <= 0:
+            return 0.0
+        amount = max(needed, min(bucket.per_minute * self.lease_fraction, bucket.available))
+        bucket.consume(amount)
+        return amount
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    seq: int
+    tokens: float = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+
+
+@dataclass
+class Ticket:
+    """Permiso de ejecución concedido por el scheduler"""
+
+    priority: Priority
+    estimated_tokens: float
+    queued_ms: float
+
+
+class RateLimitScheduler:
+    """
+    Scheduler de llamadas al modelo consciente de los límites de Groq
+
+    - Dos cubetas de tokens: peticiones por minuto (RPM) y tokens estimados
+      por minuto (TPM); el uso real reportado por el proveedor se concilia
+      al terminar cada llamada. Con una SharedQuota las cubetas y la pausa
+      por 429 son comunes a todos los workers.
+    - Concurrencia adaptativa AIMD: el límite de llamadas en vuelo crece en
+      1/límite con cada éxito (≈ +1 por ronda) y se reduce a la mitad ante un
+      429 (como mucho una vez por ventana de enfriamiento).
+    - Un 429 pausa el despacho durante el tiempo que indica el proveedor.
+    - Prioridades: las peticiones interactivas se despachan antes que los
+      lotes y estos antes que los jobs en segundo plano.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float,
+        tokens_per_minute: float,
+        max_concurrency: int,
+        min_concurrency: int = 1,
+        decrease_factor: float = 0.5,
+        decrease_cooldown_seconds: float = 2.0,
+        quota: Optional[LocalQuota] = None
+    ):
+        """
+        Inicializa el scheduler
+
+        Args:
+            requests_per_minute: Cuota RPM del proveedor (0 = sin límite)
+            tokens_per_minute: Cuota TPM del proveedor (0 = sin límite)
+            max_concurrency: Límite superior (e inicial) de llamadas simultáneas
+            min_concurrency: Límite inferior de llamadas simultáneas
+            decrease_factor: Factor multiplicativo aplicado ante un 429
+            decrease_cooldown_seconds: Ventana en la que varios 429 cuentan como uno
+            quota: Cuotas a usar (p. ej. una SharedQuota); por defecto, propias del proceso
+        """
+        self.quota = quota or LocalQuota(requests_per_minute, tokens_per_minute)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min(min_concurrency, max_concurrency)
+        self.decrease_factor = decrease_factor
+        self.decrease_cooldown_seconds = decrease_cooldown_seconds
+        self.concurrency_limit = float(max_concurrency)
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._stats = {
+            "dispatched": 0,
+            "rate_limited": 0,
+            "errors": 0,
+            "cancelled": 0,
+            "decreases": 0,
+            "queued_ms_total": 0.0,
+        }
+
+    async def acquire(self, priority: Priority, estimated_tokens: float) -> Ticket:
+        """
+        Espera turno para una llamada al modelo
+
+        Args:
+            priority: Clase de prioridad de la petición
+            estimated_tokens: Tokens estimados (prompt + salida esperada)
+
+        Returns:
+            Ticket que se debe devolver con release()
+        """
+        started = time.monotonic()
+        waiter = _Waiter(int(priority), next(self._seq), estimated_tokens, asyncio.get_running_loop().create_future())
+        with self._lock:
+            heapq.heappush(self._waiters, waiter)
+        try:
+            while True:
+                wait = self._dispatch()
+                if waiter.future.done():
+                    break
+                try:
+                    await asyncio.wait_for(asyncio.shield(waiter.future), timeout=wait)
+                    break
+                except asyncio.TimeoutError:
+                    continue
+        except asyncio.CancelledError:
+            with self._lock:
+                granted = waiter.future.done() and not waiter.future.cancelled()
+                if not granted:
+                    waiter.future.cancel()
+            if granted:
+                self.release(Ticket(priority, estimated_tokens, 0.0), OUTCOME_CANCELLED)
+            raise
+
+        queued_ms = (time.monotonic() - started) * 1000
+        with self._lock:
+            self._stats["queued_ms_total"] += queued_ms
+        return Ticket(priority, estimated_tokens, queued_ms)
+
+    def release(
+        self,
+        ticket: Ticket,
+        outcome: str = OUTCOME_OK,
+        actual_tokens: Optional[float] = None,
+        retry_after: Optional[float] = None
+    ) -> None:
+        """
+        Devuelve un ticket y ajusta la concurrencia según el resultado
+
+        Args:
+            ticket: Ticket obtenido con acquire()
+            outcome: OUTCOME_OK, OUTCOME_RATE_LIMITED, OUTCOME_ERROR u OUTCOME_CANCELLED
+            actual_tokens: Tokens reales reportados por el proveedor (si se conocen)
+            retry_after: Segundos de pausa sugeridos por el proveedor ante un 429
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.in_flight -= 1
+            if actual_tokens:
+                self.quota.reconcile(actual_tokens - ticket.estimated_tokens)
+            if outcome == OUTCOME_OK:
+                self.concurrency_limit = min(self.max_concurrency, self.concurrency_limit + 1 / self.concurrency_limit)
+            elif outcome == OUTCOME_RATE_LIMITED:
+                self._stats["rate_limited"] += 1
+                self.quota.pause(retry_after or DEFAULT_RETRY_AFTER_SECONDS)
+                if now - self._last_decrease >= self.decrease_cooldown_seconds:
+                    self.concurrency_limit = max(self.min_concurrency, self.concurrency_limit * self.decrease_factor)
+                    self._last_decrease = now
+                    self._stats["decreases"] += 1
+            elif outcome == OUTCOME_CANCELLED:
+                self._stats["cancelled"] += 1
+            else:
+                self._stats["errors"] += 1
+        self._dispatch()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Estado del scheduler: concurrencia, cola por prioridad y cuotas disponibles"""
+        with self._lock:
+            queued = {priority.name.lower(): 0 for priority in Priority}
+            for waiter in self._waiters:
+                if not waiter.future.done():
+                    queued[Priority(waiter.priority).name.lower()] += 1
+            stats: Dict[str, Any] = dict(self._stats)
+            stats.update({
+                "in_flight": self.in_flight,
+                "concurrency_limit": round(self.concurrency_limit, 2),
+                "max_concurrency": self.max_concurrency,
+                "queued": queued,
+                **self.quota.snapshot(),
+            })
+        dispatched = stats["dispatched"]
+        stats["avg_queued_ms"] = round(stats.pop("queued_ms_total") / dispatched, 1) if dispatched else 0.0
+        return stats
+
+    def _dispatch(self) -> Optional[float]:
+        """
+        Concede turnos por orden de prioridad mientras haya capacidad y cuota
+
+        Returns:
+            Segundos hasta que se pueda volver a intentar o None si solo queda
+            esperar a que termine una llamada en vuelo
+        """
+        with self._lock:
+            while self._waiters:
+                waiter = self._waiters[0]
+                if waiter.future.done():
+                    heapq.heappop(self._waiters)
+                    continue
+                if self.in_flight >= int(self.concurrency_limit):
+                    return None
+                wait = self.quota.try_acquire(waiter.tokens)
+                if wait > 0:
+                    return wait
+                heapq.heappop(self._waiters)
+                self.in_flight += 1
+                self._stats["dispatched"] += 1
+                waiter.future.set_result(True)
+            return None
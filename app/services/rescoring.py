@@ -0,0 +1,108 @@
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+from app.models.schemas import CandidatoData, VacanteData
+from app.services.compliance import ComplianceEngine
+from app.services.scoring import exact_skill_overlap, experience_score, status_for_score, weighted_match_score
+from app.services.skill_matcher import SkillMatcher
+from app.services.vacante_registry import CompiledVacante
+
+# Componentes del análisis que se pueden recalcular localmente
+COMPONENT_SKILLS = "skills"
+COMPONENT_EXPERIENCE = "experience"
+COMPONENT_COMPLIANCE = "compliance"
+
+# Componentes que dependen de cada campo de la vacante; el resto de campos
+# (título, descripción, idiomas, sector) solo influyen en la narrativa del modelo
+FIELD_COMPONENTS = {
+    "hard_skills": COMPONENT_SKILLS,
+    "soft_skills": COMPONENT_SKILLS,
+    "years_experience": COMPONENT_EXPERIENCE,
+    "education": COMPONENT_COMPLIANCE,
+    "location_required": COMPONENT_COMPLIANCE,
+    "work_permit_required": COMPONENT_COMPLIANCE,
+}
+
+
+def changed_fields(previous: VacanteData, current: VacanteData) -> List[str]:
+    """Campos de la vacante cuyo valor cambió, en el orden del modelo"""
+    before, after = previous.model_dump(), current.model_dump()
+    return [name for name in after if before.get(name) != after[name]]
+
+
+def affected_components(fields: Iterable[str]) -> List[str]:
+    """Componentes del análisis que hay que recalcular tras cambiar esos campos"""
+    return sorted({FIELD_COMPONENTS[name] for name in fields if name in FIELD_COMPONENTS})
+
+
+def rescore_analysis(
+    analysis: Dict[str, Any],
+    compiled: CompiledVacante,
+    candidato: CandidatoData,
+    components: Sequence[str],
+    compliance: ComplianceEngine,
+    skill_matcher: Optional[SkillMatcher],
+    approval_threshold: float,
+    rejection_threshold: float
+) -> Dict[str, Any]:
+    """
+    Recalcula solo los componentes afectados de un análisis existente
+
+    - skills: la sección skill_analysis completa con el motor local (o por
+      coincidencia exacta de hard skills si está desactivado, conservando el
+      score de soft skills).
+    - experience: experience_score con la proporción de años cubiertos.
+    - compliance: compliance_check con el motor de compliance.
+
+    Los demás componentes se conservan y el score se recombina con la
+    ponderación 50/30/20; si algún check excluyente falla, el score es 0 y
+    el estado RECHAZADO. Sin componentes afectados (solo cambió la
+    narrativa) score y estado no se tocan. Resumen, recomendaciones y
+    análisis detallado se conservan tal cual (processing.narrative_stale = True).
+
+    Args:
+        analysis: Análisis anterior (ATSMatchResponse serializado)
+        compiled: Vacante editada ya compilada
+        candidato: Datos del candidato del análisis
+        components: Componentes a recalcular (ver affected_components)
+        compliance: Motor de compliance
+        skill_matcher: Motor local de skills (None si está desactivado)
+        approval_threshold: Score mínimo para APROBADO
+        rejection_threshold: Score por debajo del cual el estado es RECHAZADO
+
+    Returns:
+        Nuevo análisis con processing.source = "rescore"
+    """
+    vacante = compiled.vacante
+    result = {key: value for key, value in analysis.items() if key != "processing"}
+    processing = {"source": "rescore", "rescored_components": list(components), "narrative_stale": True}
+    if not components:
+        result["processing"] = processing
+        return result
+    skill_analysis = dict(result["skill_analysis"])
+
+    if COMPONENT_SKILLS in components:
+        if skill_matcher is not None:
+            skill_analysis = skill_matcher.match(vacante, candidato, compiled.skills).to_skill_analysis()
+        else:
+            matched, missing = exact_skill_overlap(vacante.hard_skills, candidato.skills)
+            skill_analysis.update(
+                hard_skills_score=round(100 * len(matched) / len(vacante.hard_skills), 1) if vacante.hard_skills else 100.0,
+                matched_skills=matched,
+                missing_skills=missing
+            )
+    if COMPONENT_EXPERIENCE in components:
+        result["experience_score"] = experience_score(vacante.years_experience, candidato.years_experience)
+    if COMPONENT_COMPLIANCE in components:
+        result["compliance_check"] = compliance.evaluate(vacante, candidato, compiled.compliance).checks
+
+    result["skill_analysis"] = skill_analysis
+    failed = [name for name, ok in result["compliance_check"].items() if not ok and name in compliance.gate_checks]
+    if failed:
+        result["match_score"], result["status"] = 0.0, "RECHAZADO"
+    else:
+        score = weighted_match_score(
+            skill_analysis["hard_skills_score"], result["experience_score"], skill_analysis["soft_skills_score"]
+        )
+        result["match_score"] = score
+        result["status"] = status_for_score(score, approval_threshold, rejection_threshold)
+    result["processing"] = processing
+    return result
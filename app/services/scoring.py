@@ -0,0 +1,109 @@
+from typing import Any, Dict, List, Tuple
+from app.models.schemas import VacanteData, CandidatoData
+
+# Ponderación documentada del score de afinidad
+HARD_SKILLS_WEIGHT = 0.5
+EXPERIENCE_WEIGHT = 0.3
+SOFT_SKILLS_WEIGHT = 0.2
+
+
+def experience_score(required_years: int, candidate_years: int) -> float:
+    """
+    Score de experiencia (0-100) según la proporción de años cubiertos
+
+    Args:
+        required_years: Años de experiencia requeridos por la vacante
+        candidate_years: Años de experiencia del candidato
+
+    Returns:
+        100 si el candidato cubre o supera lo requerido, proporcional si no
+    """
+    if required_years <= 0:
+        return 100.0
+    return round(min(max(candidate_years, 0) / required_years, 1.0) * 100, 1)
+
+
+def weighted_match_score(hard_skills_score: float, experience: float, soft_skills_score: float) -> float:
+    """Score de afinidad ponderado: 50% Hard Skills, 30% Experiencia, 20% Soft Skills"""
+    score = (
+        HARD_SKILLS_WEIGHT * hard_skills_score
+        + EXPERIENCE_WEIGHT * experience
+        + SOFT_SKILLS_WEIGHT * soft_skills_score
+    )
+    return round(min(max(score, 0.0), 100.0), 1)
+
+
+def exact_skill_overlap(required: List[str], available: List[str]) -> Tuple[List[str], List[str]]:
+    """
+    Coincidencia exacta (sin distinguir mayúsculas) entre habilidades
+
+    Returns:
+        Tupla (habilidades requeridas presentes, habilidades requeridas faltantes)
+    """
+    available_set = {skill.strip().casefold() for skill in available}
+    matched = [skill for skill in required if skill.strip().casefold() in available_set]
+    missing = [skill for skill in required if skill.strip().casefold() not in available_set]
+    return matched, missing
+
+
+def status_for_score(score: float, approval_threshold: float, rejection_threshold: float) -> str:
+    """Estado del matching según los umbrales de aprobación y rechazo"""
+    if score >= approval_threshold:
+        return "APROBADO"
+    if score < rejection_threshold:
+        return "RECHAZADO"
+    return "PENDIENTE"
+
+
+def local_analysis(
+    vacante: VacanteData,
+    candidato: CandidatoData,
+    skill_analysis: Dict[str, Any],
+    compliance_check: Dict[str, bool],
+    approval_threshold: float,
+    rejection_threshold: float
+) -> Dict[str, Any]:
+    """
+    Análisis completo calculado sin modelo (scoring_mode=local)
+
+    Args:
+        vacante: Datos de la vacante
+        candidato: Datos del candidato
+        skill_analysis: Sección skill_analysis calculada por el motor local
+        compliance_check: Resultado de la capa de compliance
+        approval_threshold: Score mínimo para APROBADO
+        rejection_threshold: Score por debajo del cual el estado es RECHAZADO
+
+    Returns:
+        Diccionario con la misma estructura que el análisis del agente
+    """
+    experience = experience_score(vacante.years_experience, candidato.years_experience)
+    score = weighted_match_score(
+        skill_analysis["hard_skills_score"], experience, skill_analysis["soft_skills_score"]
+    )
+    status = status_for_score(score, approval_threshold, rejection_threshold)
+
+    recommendations = [f"Desarrollar o acreditar: {skill}" for skill in skill_analysis["missing_skills"]]
+    if candidato.years_experience < vacante.years_experience:
+        gap = vacante.years_experience - candidato.years_experience
+        recommendations.append(f"Le faltan {gap} año(s) de experiencia respecto a lo requerido")
+
+    return {
+        "match_score": score,
+        "status": status,
+        "skill_analysis": skill_analysis,
+        "experience_score": experience,
+        "compliance_check": compliance_check,
+        "recommendations": recommendations,
+        "summary": (
+            f"Score local {score}% ({status}): hard skills {skill_analysis['hard_skills_score']}%, "
+            f"experiencia {experience}%, soft skills {skill_analysis['soft_skills_score']}%"
+        ),
+        "detailed_analysis": (
+            "Análisis calculado con el motor local (sin modelo de lenguaje) con la ponderación "
+            "50% Hard Skills, 30% Experiencia, 20% Soft Skills. "
+            f"Habilidades presentes: {', '.join(skill_analysis['matched_skills']) or 'ninguna'}. "
+            f"Habilidades faltantes: {', '.join(skill_analysis['missing_skills']) or 'ninguna'}."
+        ),
+        "processing": {"source": "local"}
+    }
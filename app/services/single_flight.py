@@ -0,0 +1,75 @@
+import asyncio
+import copy
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+
+@dataclass
+class _Call:
+    task: asyncio.Future
+    waiters: int = 0
+
+
+class SingleFlight:
+    """
+    Coalescencia de llamadas idénticas en vuelo (single-flight)
+
+    Las peticiones concurrentes con la misma clave comparten una única tarea:
+    la primera la lanza y las demás esperan su resultado (o su excepción).
+    La tarea solo se cancela cuando se cancelan todas las peticiones que la
+    esperan, de modo que una desconexión no afecta a las demás.
+    """
+
+    def __init__(self):
+        """Inicializa el registro de llamadas en vuelo"""
+        self._calls: Dict[str, _Call] = {}
+        self._stats = {
+            "leaders": 0,
+            "coalesced": 0,
+        }
+
+    async def do(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Ejecuta factory() o se une a la llamada en vuelo con la misma clave
+
+        Args:
+            key: Clave canónica de la llamada
+            factory: Función que crea la corrutina a ejecutar
+
+        Returns:
+            Tupla (resultado, True si se reutilizó una llamada en vuelo). Las
+            peticiones coalescidas reciben una copia para no compartir el objeto.
+        """
+        call = self._calls.get(key)
+        shared = call is not None
+        if call is None:
+            call = _Call(asyncio.ensure_future(factory()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+            self._stats["leaders"] += 1
+        else:
+            self._stats["coalesced"] += 1
+
+        call.waiters += 1
+        try:
+            result = await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+        return (copy.deepcopy(result) if shared else result), shared
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Llamadas lanzadas, llamadas ahorradas por coalescencia y llamadas en vuelo"""
+        stats: Dict[str, Any] = dict(self._stats)
+        total = stats["leaders"] + stats["coalesced"]
+        stats["in_flight"] = len(self._calls)
+        stats["dedup_rate"] = round(stats["coalesced"] / total, 4) if total else 0.0
+        return stats
+
+    def _forget(self, key: str, call: _Call) -> None:
+        """Retira la llamada terminada (si no la ha sustituido otra)"""
+        if self._calls.get(key) is call:
+            del self._calls[key]
@@ -0,0 +1,309 @@
+import json
+import zlib
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from app.models.schemas import VacanteData, CandidatoData
+from app.services.text import normalize_text
+
+# Taxonomía de sinónimos: forma canónica -> alias equivalentes
+DEFAULT_SKILL_ALIASES: Dict[str, List[str]] = {
+    "react": ["reactjs", "react.js", "react js"],
+    "javascript": ["js", "ecmascript", "es6", "vanilla js"],
+    "typescript": ["ts"],
+    "node.js": ["node", "nodejs", "node js"],
+    "next.js": ["nextjs"],
+    "vue": ["vuejs", "vue.js", "vue js"],
+    "angular": ["angularjs", "angular.js"],
+    "python": ["python3", "py"],
+    "django": ["django rest framework", "drf"],
+    "postgresql": ["postgres", "psql"],
+    "mongodb": ["mongo"],
+    "kubernetes": ["k8s"],
+    "aws": ["amazon web services"],
+    "gcp": ["google cloud", "google cloud platform"],
+    "azure": ["microsoft azure"],
+    "css": ["css3"],
+    "html": ["html5"],
+    "c#": ["csharp", "c sharp"],
+    "c++": ["cpp"],
+    "go": ["golang"],
+    "machine learning": ["ml", "aprendizaje automatico"],
+    "inteligencia artificial": ["ia", "ai", "artificial intelligence"],
+    "ci/cd": ["cicd", "integracion continua", "continuous integration"],
+    "git": ["control de versiones"],
+    "ingles": ["english"],
+    "trabajo en equipo": ["teamwork", "trabajo colaborativo", "colaboracion", "team player"],
+    "comunicacion efectiva": ["comunicacion", "communication", "habilidades de comunicacion"],
+    "liderazgo": ["leadership", "liderando", "lider de equipo", "liderar equipos"],
+    "resolucion de problemas": ["problem solving", "solucion de problemas"],
+    "proactividad": ["proactivo", "proactiva", "iniciativa"],
+}
+
+# Alias más cortos que esto solo se usan para canonicalizar habilidades declaradas,
+# no para buscarlos en el texto libre del CV ("ia", "js", "go" dan falsos positivos)
+MIN_TEXT_ALIAS_LENGTH = 3
+
+# Dimensión del espacio de n-gramas (hashing trick)
+VECTOR_DIMENSIONS = 1024
+NGRAM_SIZE = 3
+
+
+@dataclass
+class SkillMatchResult:
+    """Resultado del motor local de skills"""
+
+    hard_skills_score: float
+    soft_skills_score: float
+    matched_skills: List[str]
+    missing_skills: List[str]
+    details: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+
+    def to_skill_analysis(self) -> Dict[str, Any]:
+        """Sección skill_analysis con el formato de la respuesta ATS"""
+        return {
+            "hard_skills_score": self.hard_skills_score,
+            "soft_skills_score": self.soft_skills_score,
+            "matched_skills": list(self.matched_skills),
+            "missing_skills": list(self.missing_skills),
+        }
+
+
+@dataclass
+class SkillRequirements:
+    """Grupo de habilidades requeridas (hard o soft) precompilado para el matching"""
+
+    skills: List[str]
+    canonicals: List[str]
+    surface_forms: List[List[str]]
+    vectors: np.ndarray
+
+
+class SkillMatcher:
+    """
+    Motor local de matching semántico de habilidades
+
+    Combina una taxonomía de sinónimos ("React" = "ReactJS") con similitud
+    coseno sobre n-gramas de caracteres vectorizada con NumPy. Una habilidad
+    requerida se considera presente si:
+    1. Su forma canónica coincide con una habilidad declarada del candidato
+    2. Aparece literalmente (o un alias) en el texto del CV
+    3. Su vector es suficientemente similar al de algún término del candidato
+    """
+
+    def __init__(
+        self,
+        aliases: Optional[Dict[str, List[str]]] = None,
+        hard_threshold: float = 0.8,
+        soft_threshold: float = 0.65
+    ):
+        """
+        Inicializa el motor
+
+        Args:
+            aliases: Sinónimos adicionales (se combinan con la taxonomía predeterminada)
+            hard_threshold: Similitud mínima para aceptar una hard skill por n-gramas
+            soft_threshold: Similitud mínima para aceptar una soft skill por n-gramas
+        """
+        self.hard_threshold = hard_threshold
+        self.soft_threshold = soft_threshold
+        self._canonical: Dict[str, str] = {}
+        self._surface_forms: Dict[str, List[str]] = {}
+        taxonomy = {k: list(v) for k, v in DEFAULT_SKILL_ALIASES.items()}
+        for canonical, extra in (aliases or {}).items():
+            taxonomy.setdefault(canonical, []).extend(extra)
+        for canonical, alias_list in taxonomy.items():
+            canonical_norm = normalize_text(canonical)
+            forms = {canonical_norm} | {normalize_text(alias) for alias in alias_list}
+            forms.discard("")
+            for form in forms:
+                self._canonical[form] = canonical_norm
+            self._surface_forms[canonical_norm] = sorted(
+                (form for form in forms if len(form) >= MIN_TEXT_ALIAS_LENGTH or form == canonical_norm),
+                key=len,
+                reverse=True
+            )
+        self._ngram_cache: Dict[str, int] = {}
+
+    @classmethod
+    def from_settings(cls, settings: Any) -> "SkillMatcher":
+        """Crea el motor a partir de la configuración (SKILL_ALIASES se lee como JSON)"""
+        aliases = json.loads(settings.skill_aliases) if settings.skill_aliases else None
+        return cls(
+            aliases=aliases,
+            hard_threshold=settings.skill_hard_threshold,
+            soft_threshold=settings.skill_soft_threshold
+        )
+
+    def canonicalize(self, skill: str) -> str:
+        """Forma canónica normalizada de una habilidad"""
+        normalized = normalize_text(skill)
+        return self._canonical.get(normalized, normalized)
+
+    def is_known(self, term: str) -> bool:
+        """True si el término es una habilidad de la taxonomía (forma canónica o alias)"""
+        return normalize_text(term) in self._canonical
+
+    def surface_forms(self, canonical: str) -> List[str]:
+        """Formas (canónica y alias) con las que se busca una habilidad en el texto del CV"""
+        return self._surface_forms.get(canonical, [canonical])
+
+    def embed(self, terms: Sequence[str]) -> np.ndarray:
+        """
+        Vectoriza términos como bolsas de n-gramas de caracteres (L2-normalizadas)
+
+        Args:
+            terms: Términos ya normalizados
+
+        Returns:
+            Matriz float32 de forma (len(terms), VECTOR_DIMENSIONS)
+        """
+        rows: List[int] = []
+        cols: List[int] = []
+        for row, term in enumerate(terms):
+            padded = f" {term} "
+            for i in range(max(len(padded) - NGRAM_SIZE + 1, 1)):
+                gram = padded[i:i + NGRAM_SIZE]
+                bucket = self._ngram_cache.get(gram)
+                if bucket is None:
+                    bucket = zlib.crc32(gram.encode("utf-8")) % VECTOR_DIMENSIONS
+                    self._ngram_cache[gram] = bucket
+                rows.append(row)
+                cols.append(bucket)
+
+        matrix = np.zeros((len(terms), VECTOR_DIMENSIONS), dtype=np.float32)
+        if rows:
+            np.add.at(matrix, (np.asarray(rows), np.asarray(cols)), 1.0)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+    def compile_requirements(self, skills: Optional[Sequence[str]]) -> SkillRequirements:
+        """
+        Precalcula formas canónicas, alias y vectores de un grupo de habilidades requeridas
+
+        Args:
+            skills: Habilidades tal como aparecen en la vacante
+
+        Returns:
+            SkillRequirements reutilizable para cualquier candidato
+        """
+        required = [skill for skill in (skills or []) if skill and skill.strip()]
+        canonicals = [self.canonicalize(skill) for skill in required]
+        return SkillRequirements(
+            skills=required,
+            canonicals=canonicals,
+            surface_forms=[self.surface_forms(canonical) for canonical in canonicals],
+            vectors=self.embed(canonicals)
+        )
+
+    def compile(self, vacante: VacanteData) -> Tuple[SkillRequirements, SkillRequirements]:
+        """Precompila los grupos de hard y soft skills de una vacante"""
+        return self.compile_requirements(vacante.hard_skills), self.compile_requirements(vacante.soft_skills)
+
+    def candidate_terms(self, candidato: CandidatoData) -> Tuple[List[str], str]:
+        """
+        Términos normalizados del candidato y su texto libre normalizado
+
+        Returns:
+            Tupla (habilidades canónicas + n-gramas de palabras del texto, texto normalizado)
+        """
+        free_text = " ".join(
+            part for part in (candidato.cv_text, candidato.additional_info, candidato.sector_experience) if part
+        )
+        text = normalize_text(free_text)
+        terms = [self.canonicalize(skill) for skill in candidato.skills]
+        words = text.split()
+        terms.extend(words)
+        terms.extend(" ".join(words[i:i + 2]) for i in range(len(words) - 1))
+        terms.extend(" ".join(words[i:i + 3]) for i in range(len(words) - 2))
+        unique_terms = list(dict.fromkeys(term for term in terms if term))
+        return unique_terms, f" {text} "
+
+    def _match_group(
+        self,
+        requirements: SkillRequirements,
+        declared: set,
+        text: str,
+        terms: List[str],
+        term_vectors: np.ndarray,
+        threshold: float
+    ) -> Tuple[float, List[str], List[str], Dict[str, Dict[str, Any]]]:
+        """Evalúa un grupo de habilidades requeridas (hard o soft) contra el candidato"""
+        required = requirements.skills
+        if not required:
+            return 100.0, [], [], {}
+
+        canonicals = requirements.canonicals
+        credits = np.zeros(len(required), dtype=np.float32)
+        details: Dict[str, Dict[str, Any]] = {}
+        pending: List[int] = []
+
+        for i, canonical in enumerate(canonicals):
+            if canonical in declared:
+                credits[i] = 1.0
+                details[required[i]] = {"method": "declared", "similarity": 1.0}
+            elif any(f" {form} " in text for form in requirements.surface_forms[i]):
+                credits[i] = 1.0
+                details[required[i]] = {"method": "cv_text", "similarity": 1.0}
+            else:
+                pending.append(i)
+
+        if pending and terms:
+            similarities = requirements.vectors[pending] @ term_vectors.T
+            best = similarities.argmax(axis=1)
+            best_scores = similarities[np.arange(len(pending)), best]
+            for row, i in enumerate(pending):
+                score = float(best_scores[row])
+                if score >= threshold:
+                    credits[i] = score
+                    details[required[i]] = {
+                        "method": "semantic",
+                        "similarity": round(score, 3),
+                        "evidence": terms[int(best[row])]
+                    }
+
+        for i, skill in enumerate(required):
+            details.setdefault(skill, {"method": "missing", "similarity": 0.0})
+
+        matched = [skill for i, skill in enumerate(required) if credits[i] > 0]
+        missing = [skill for i, skill in enumerate(required) if credits[i] == 0]
+        return round(float(credits.mean()) * 100, 1), matched, missing, details
+
+    def match(
+        self,
+        vacante: VacanteData,
+        candidato: CandidatoData,
+        compiled: Optional[Tuple[SkillRequirements, SkillRequirements]] = None,
+        candidate_terms: Optional[Tuple[List[str], str]] = None
+    ) -> SkillMatchResult:
+        """
+        Calcula la sección de habilidades del matching
+
+        Args:
+            vacante: Datos de la vacante (hard_skills y soft_skills)
+            candidato: Datos del candidato (skills, cv_text e información adicional)
+            compiled: Requisitos precompilados con compile(); si faltan se calculan
+            candidate_terms: Resultado precalculado de candidate_terms() (candidatos almacenados)
+
+        Returns:
+            SkillMatchResult con scores, habilidades presentes/faltantes y evidencia
+        """
+        terms, text = candidate_terms if candidate_terms is not None else self.candidate_terms(candidato)
+        term_vectors = self.embed(terms)
+        declared = {self.canonicalize(skill) for skill in candidato.skills}
+        hard, soft = compiled if compiled is not None else self.compile(vacante)
+
+        hard_score, hard_matched, hard_missing, hard_details = self._match_group(
+            hard, declared, text, terms, term_vectors, self.hard_threshold
+        )
+        soft_score, soft_matched, soft_missing, soft_details = self._match_group(
+            soft, declared, text, terms, term_vectors, self.soft_threshold
+        )
+        return SkillMatchResult(
+            hard_skills_score=hard_score,
+            soft_skills_score=soft_score,
+            matched_skills=hard_matched + soft_matched,
+            missing_skills=hard_missing + soft_missing,
+            details={**hard_details, **soft_details}
+        )
@@ -0,0 +1,20 @@
+import re
+import unicodedata
+
+_NON_ALNUM = re.compile(r"[^a-z0-9+#]+")
+
+
+def strip_accents(text: str) -> str:
+    """Elimina tildes y diacríticos ("México" -> "Mexico")"""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normaliza texto libre para comparaciones locales
+
+    Minúsculas, sin tildes y con cualquier signo de puntuación convertido en
+    espacio (se conservan "+" y "#" para no confundir "C++" o "C#" con "C").
+    """
+    return " ".join(_NON_ALNUM.sub(" ", strip_accents(text).lower()).split())
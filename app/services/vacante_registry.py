@@ -0,0 +1,180 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+from app.models.schemas import VacanteData
+from app.services.compliance import ComplianceEngine, CompliancePredicates
+from app.services.match_cache import fingerprint_vacante
+from app.services.prompt_builder import PromptBuilder
+from app.services.skill_matcher import SkillMatcher, SkillRequirements
+
+# Longitud (en caracteres hex) del identificador público de una vacante
+VACANTE_ID_LENGTH = 16
+
+
+@dataclass
+class CompiledVacante:
+    """Vacante con todos los artefactos derivados ya calculados"""
+
+    vacante_id: str
+    vacante: VacanteData
+    fingerprint: str
+    skills: Tuple[SkillRequirements, SkillRequirements]
+    compliance: CompliancePredicates
+    prompt_section: str
+    keywords: List[str]
+    created_at: float
+
+    @property
+    def canonical_hard_skills(self) -> List[str]:
+        """Hard skills en su forma canónica"""
+        return list(self.skills[0].canonicals)
+
+    @property
+    def canonical_soft_skills(self) -> List[str]:
+        """Soft skills en su forma canónica"""
+        return list(self.skills[1].canonicals)
+
+
+class VacanteRegistry:
+    """
+    Registro de vacantes precompiladas
+
+    Al registrar una vacante se calculan una sola vez sus vectores de
+    habilidades, los predicados de compliance y la sección "vacante" del
+    prompt ya serializada. El id es un prefijo del hash canónico del contenido,
+    así que registrar dos veces la misma vacante devuelve el mismo id.
+
+    Los artefactos viven en memoria (LRU); la definición de la vacante se
+    persiste opcionalmente en SQLite y se recompila al leerla tras un reinicio.
+    """
+
+    def __init__(
+        self,
+        skill_matcher: SkillMatcher,
+        compliance: ComplianceEngine,
+        prompt_builder: PromptBuilder,
+        max_entries: int = 1024,
+        sqlite_path: Optional[str] = None
+    ):
+        """
+        Inicializa el registro
+
+        Args:
+            skill_matcher: Motor de skills con el que se compilan las habilidades
+            compliance: Motor de compliance con el que se compilan los requisitos
+            prompt_builder: Constructor del prompt con el que se renderiza la vacante
+            max_entries: Número máximo de vacantes compiladas en memoria
+            sqlite_path: Ruta de la base SQLite; None o vacío desactiva la persistencia
+        """
+        self.skill_matcher = skill_matcher
+        self.compliance = compliance
+        self.prompt_builder = prompt_builder
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, CompiledVacante]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._db: Optional[sqlite3.Connection] = None
+        if sqlite_path:
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS vacantes ("
+                "id TEXT PRIMARY KEY, data TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def compile(self, vacante: VacanteData, created_at: Optional[float] = None) -> CompiledVacante:
+        """
+        Calcula los artefactos de una vacante sin registrarla
+
+        Args:
+            vacante: Datos de la vacante
+            created_at: Fecha de registro (por defecto, ahora)
+
+        Returns:
+            CompiledVacante listo para el matching
+        """
+        fingerprint = fingerprint_vacante(vacante)
+        return CompiledVacante(
+            vacante_id=fingerprint[:VACANTE_ID_LENGTH],
+            vacante=vacante,
+            fingerprint=fingerprint,
+            skills=self.skill_matcher.compile(vacante),
+            compliance=self.compliance.compile(vacante),
+            prompt_section=self.prompt_builder.render_vacante(vacante),
+            keywords=self.prompt_builder.keywords_for(vacante),
+            created_at=created_at or time.time()
+        )
+
+    def register(self, vacante: VacanteData) -> Tuple[CompiledVacante, bool]:
+        """
+        Registra (o recupera) una vacante
+
+        Returns:
+            Tupla (vacante compilada, True si no estaba registrada)
+        """
+        compiled = self.compile(vacante)
+        existing = self.get(compiled.vacante_id)
+        if existing is not None:
+            return existing, False
+
+        with self._lock:
+            self._remember(compiled)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR IGNORE INTO vacantes (id, data, created_at) VALUES (?, ?, ?)",
+                    (compiled.vacante_id, vacante.model_dump_json(), compiled.created_at)
+                )
+                self._db.commit()
+        return compiled, True
+
+    def get(self, vacante_id: str) -> Optional[CompiledVacante]:
+        """
+        Obtiene una vacante registrada
+
+        Returns:
+            La vacante compilada o None si el id no existe
+        """
+        with self._lock:
+            compiled = self._entries.get(vacante_id)
+            if compiled is not None:
+                self._entries.move_to_end(vacante_id)
+                return compiled
+            if self._db is None:
+                return None
+            row = self._db.execute(
+                "SELECT data, created_at FROM vacantes WHERE id = ?", (vacante_id,)
+            ).fetchone()
+        if row is None:
+            return None
+
+        compiled = self.compile(VacanteData(**json.loads(row[0])), created_at=row[1])
+        with self._lock:
+            self._remember(compiled)
+        return compiled
+
+    def delete(self, vacante_id: str) -> bool:
+        """
+        Elimina una vacante del registro
+
+        Returns:
+            True si la vacante existía
+        """
+        with self._lock:
+            removed = self._entries.pop(vacante_id, None) is not None
+            if self._db is not None:
+                cursor = self._db.execute("DELETE FROM vacantes WHERE id = ?", (vacante_id,))
+                self._db.commit()
+                removed = removed or cursor.rowcount > 0
+            return removed
+
+    def _remember(self, compiled: CompiledVacante) -> None:
+        """Guarda una vacante compilada en memoria respetando el límite (requiere el lock)"""
+        self._entries[compiled.vacante_id] = compiled
+        self._entries.move_to_end(compiled.vacante_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+Matching por lotes sin pasar por HTTP, reanudable
+
+Lee un JSONL de pares vacante/candidato, los procesa con AgentService con
+concurrencia y cuotas propias y escribe cada resultado en el fichero de
+salida en cuanto termina. La salida es también el checkpoint: al volver a
+lanzar el mismo comando se saltan los pares que ya tienen resultado, así que
+una ejecución interrumpida no repite (ni vuelve a facturar) trabajo
+terminado. Los pares que fallaron se reintentan en la siguiente ejecución.
+
+Uso:
+    python batch_cli.py pares.jsonl --output resultados.jsonl --concurrency 16 --rpm 300 --tpm 120000
+    python batch_cli.py pares.jsonl --output resultados.jsonl          # reanuda donde se quedó
+    python batch_cli.py pares.jsonl --output resultados.jsonl --restart
+
+Cada línea de entrada tiene el esquema de POST /ats/match (vacante o
+vacante_id, candidato o candidato_id) y un "id" opcional que se copia a la
+salida:
+    {"id": "p-1", "vacante_id": "626a4162a06d9a6d", "candidato": {...}}
+    {"vacante": {...}, "candidato_id": "b7385ac58e294aa7"}
+
+Cada línea de salida es {"line": n, "id": ..., "result": {...}} o
+{"line": n, "id": ..., "error": "..."}; si un par aparece varias veces, vale
+la última.
+"""
+
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import os
+import sys
+import time
+import warnings
+from collections import Counter
+from typing import Any, Dict, IO, Iterator, List, Set, Tuple, Union
+
+import numpy as np
+from dotenv import load_dotenv
+
+# Suprimir advertencias de Pydantic sobre namespace 'model_' en dependencias (como main.py)
+warnings.filterwarnings("ignore", category=UserWarning, module="pydantic")
+
+
+# Estado que el CLI comparte con el servidor: variable de entorno y archivo en SHARED_STATE_DIR
+STATE_FILES = (
+    ("CANDIDATE_STORE_PATH", "candidatos.db"),
+    ("CANDIDATE_FEATURES_PATH", "candidatos.features"),
+    ("VACANTE_REGISTRY_PATH", "vacantes.db"),
+    ("CACHE_SQLITE_PATH", "match_cache.db"),
+)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Matching ATS por lotes desde un JSONL, con checkpoint y reanudación")
+    parser.add_argument("input", help="JSONL de pares vacante/candidato")
+    parser.add_argument("--output", required=True, help="JSONL de resultados (también es el checkpoint)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Análisis simultáneos (MAX_CONCURRENT_MATCHES)")
+    parser.add_argument("--rpm", type=int, default=None, help="Cuota de peticiones por minuto a Groq (GROQ_RPM_LIMIT)")
+    parser.add_argument("--tpm", type=int, default=None, help="Cuota de tokens por minuto a Groq (GROQ_TPM_LIMIT)")
+    parser.add_argument("--scoring-mode", choices=["llm", "local"], default=None, help="llm o local (por defecto, DEFAULT_SCORING_MODE)")
+    parser.add_argument("--no-cache", action="store_true", help="No consultar ni actualizar la caché de análisis")
+    parser.add_argument(
+        "--state-dir",
+        default=None,
+        help="Estado compartido con el servidor: candidatos, vacantes y caché (por defecto, SHARED_STATE_DIR)"
+    )
+    parser.add_argument("--restart", action="store_true", help="Descartar la salida existente y empezar de cero")
+    parser.add_argument("--fsync-every", type=int, default=100, help="Resultados entre cada fsync de la salida")
+    parser.add_argument("--progress-every", type=float, default=10.0, help="Segundos entre líneas de progreso (0 = sin progreso)")
+    parser.add_argument("--verbose", action="store_true", help="Logs INFO de la aplicación")
+    args = parser.parse_args(argv)
+    if args.concurrency < 1:
+        parser.error("--concurrency debe ser mayor que 0")
+    if not os.path.isfile(args.input):
+        parser.error(f"No existe el fichero de entrada: {args.input}")
+    return args
+
+
+def configure_environment(args: argparse.Namespace) -> None:
+    """
+    Traslada las opciones a variables de entorno antes de importar la aplicación
+
+    El CLI es un solo proceso: WEB_CONCURRENCY=1 evita que las cuotas y la
+    concurrencia se repartan como si hubiera varios workers. Aun así usa el
+    mismo almacén de candidatos, registro de vacantes y caché que el servidor
+    (los archivos de SHARED_STATE_DIR), así que los candidato_id y vacante_id
+    registrados por HTTP se resuelven y los análisis ya cacheados no se repiten.
+    Las rutas configuradas explícitamente en el entorno o en .env se respetan.
+    """
+    load_dotenv()
+    state_dir = args.state_dir or os.environ.get("SHARED_STATE_DIR") or ".ats_state"
+    os.makedirs(state_dir, exist_ok=True)
+    os.environ["SHARED_STATE_DIR"] = state_dir
+    for name, filename in STATE_FILES:
+        if not os.environ.get(name):
+            os.environ[name] = os.path.join(state_dir, filename)
+    os.environ["WEB_CONCURRENCY"] = "1"
+    os.environ["MAX_CONCURRENT_MATCHES"] = str(args.concurrency)
+    if args.rpm is not None:
+        os.environ["GROQ_RPM_LIMIT"] = str(args.rpm)
+    if args.tpm is not None:
+        os.environ["GROQ_TPM_LIMIT"] = str(args.tpm)
+
+
+def completed_lines(path: str) -> Set[int]:
+    """
+    Líneas de entrada que ya tienen resultado en la salida
+
+    Si la ejecución anterior se cortó a mitad de una línea, la línea
+    incompleta se recorta para que la siguiente escritura empiece limpia.
+    """
+    done: Set[int] = set()
+    if not os.path.exists(path):
+        return done
+    complete_bytes = 0
+    with open(path, "rb+") as output:
+        for raw in output:
+            if not raw.endswith(b"\n"):
+                break
+            complete_bytes += len(raw)
+            try:
+                record = json.loads(raw)
+            except json.JSONDecodeError:
+                continue
+            if record.get("result") is not None:
+                done.add(record["line"])
+        output.truncate(complete_bytes)
+    return done
+
+
+def read_pairs(path: str, done: Set[int]) -> Iterator[Tuple[int, Union[Dict[str, Any], ValueError]]]:
+    """
+    Pares pendientes de la entrada, leídos de forma perezosa
+
+    Yields:
+        Tuplas (número de línea, objeto JSON o ValueError si la línea no es válida)
+    """
+    with open(path, "r", encoding="utf-8-sig") as pairs:
+        for line_number, text in enumerate(pairs, start=1):
+            if line_number in done or not text.strip():
+                continue
+            try:
+                record = json.loads(text)
+            except json.JSONDecodeError as e:
+                yield line_number, ValueError(f"JSON inválido: {e.msg} (columna {e.colno})")
+                continue
+            if not isinstance(record, dict):
+                yield line_number, ValueError("Cada línea debe ser un objeto JSON")
+                continue
+            yield line_number, record
+
+
+class ThroughputSummary:
+    """Conteos, orígenes, tokens y latencias de la ejecución"""
+
+    def __init__(self, skipped: int):
+        self.started = time.perf_counter()
+        self.skipped = skipped
+        self.completed = 0
+        self.failed = 0
+        self.sources: Counter = Counter()
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.latencies_ms: List[float] = []
+        self.interrupted = False
+
+    @property
+    def processed(self) -> int:
+        return self.completed + self.failed
+
+    def add(self, outcome: Union[Dict[str, Any], Exception], seconds: float) -> None:
+        self.latencies_ms.append(seconds * 1000)
+        if isinstance(outcome, Exception):
+            self.failed += 1
+            return
+        self.completed += 1
+        processing = outcome.get("processing") or {}
+        self.sources[processing.get("source", "llm")] += 1
+        self.input_tokens += processing.get("input_tokens") or 0
+        self.output_tokens += processing.get("output_tokens") or 0
+
+    def progress(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        rate = self.processed / elapsed if elapsed else 0.0
+        return f"{self.processed} pares ({self.failed} con error) en {elapsed:.0f} s, {rate:.1f} pares/s"
+
+    def render(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        lines = [
+            "Resumen del lote" + (" (interrumpido: vuelve a lanzar el mismo comando para continuar)" if self.interrupted else ""),
+            f"  Pares: {self.processed} procesados ({self.completed} ok, {self.failed} con error), "
+            f"{self.skipped} ya terminados en ejecuciones anteriores",
+            f"  Tiempo: {elapsed:.1f} s, {self.processed / elapsed if elapsed else 0.0:.2f} pares/s",
+        ]
+        if self.latencies_ms:
+            p50, p95, p99 = np.percentile(np.asarray(self.latencies_ms), [50, 95, 99])
+            lines.append(f"  Latencia por par: p50 {p50:.0f} ms, p95 {p95:.0f} ms, p99 {p99:.0f} ms")
+        if self.sources:
+            lines.append("  Origen: " + ", ".join(f"{source} {count}" for source, count in self.sources.most_common()))
+        lines.append(f"  Tokens reportados: {self.input_tokens} de entrada, {self.output_tokens} de salida")
+        return "\n".join(lines)
+
+
+class ResultWriter:
+    """Salida JSONL en modo append con fsync periódico"""
+
+    def __init__(self, path: str, fsync_every: int):
+        self._file: IO[str] = open(path, "a", encoding="utf-8")
+        self.fsync_every = max(fsync_every, 1)
+        self._unsynced = 0
+
+    def write(self, record: Dict[str, Any]) -> None:
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_every:
+            self.sync()
+
+    def sync(self) -> None:
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def close(self) -> None:
+        self.sync()
+        self._file.close()
+
+
+async def run(args: argparse.Namespace, summary: ThroughputSummary, done: Set[int]) -> None:
+    from pydantic import ValidationError
+    from app.models.schemas import ATSMatchRequest, ScoringMode, VacanteData
+    from app.services import AgentService
+    from app.services.candidate_ingest import describe_validation_error
+    from app.services.rate_limiter import Priority
+
+    if not args.verbose:
+        # agno vuelve a fijar el nivel INFO de sus loggers en cada ejecución del
+        # agente, así que se filtra: sin --verbose solo se muestran sus errores
+        for name in list(logging.root.manager.loggerDict):
+            if name.startswith("agno"):
+                logging.getLogger(name).addFilter(lambda record: record.levelno >= logging.ERROR)
+    service = AgentService()
+    scoring_mode = ScoringMode(args.scoring_mode) if args.scoring_mode else None
+    compiled_by_id: Dict[str, Any] = {}
+
+    # Los pares suelen repetir pocas vacantes: cada una se compila una sola vez
+    @functools.lru_cache(maxsize=1024)
+    def compile_vacante(vacante_json: str):
+        return service.vacantes.compile(VacanteData.model_validate_json(vacante_json))
+
+    def resolve_vacante(request: ATSMatchRequest):
+        if request.vacante_id is None:
+            return compile_vacante(request.vacante.model_dump_json())
+        compiled = compiled_by_id.get(request.vacante_id) or service.vacantes.get(request.vacante_id)
+        if compiled is None and service.history is not None:
+            # Vacante que solo conoce el historial (registro en memoria de otra ejecución)
+            vacante = service.history.vacante(request.vacante_id)
+            compiled = service.vacantes.compile(vacante) if vacante is not None else None
+        if compiled is None:
+            raise LookupError(f"Vacante no registrada: {request.vacante_id}")
+        compiled_by_id[request.vacante_id] = compiled
+        return compiled
+
+    async def process(record: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            request = ATSMatchRequest.model_validate(record)
+        except ValidationError as e:
+            raise ValueError(describe_validation_error(e))
+        candidato = request.candidato
+        if request.candidato_id is not None:
+            candidato = service.candidatos.get(request.candidato_id)
+            if candidato is None:
+                raise LookupError(f"Candidato no registrado: {request.candidato_id}")
+        return await service.aprocess_ats_matching(
+            resolve_vacante(request),
+            candidato,
+            use_cache=not args.no_cache,
+            scoring_mode=scoring_mode,
+            priority=Priority.BATCH
+        )
+
+    writer = ResultWriter(args.output, args.fsync_every)
+    pairs = read_pairs(args.input, done)
+    pending: Dict[asyncio.Task, Tuple[int, Any, float]] = {}
+    last_progress = time.perf_counter()
+    try:
+        exhausted = False
+        while True:
+            # Solo se leen pares nuevos mientras haya hueco en la ventana de concurrencia
+            while not exhausted and len(pending) < args.concurrency:
+                item = next(pairs, None)
+                if item is None:
+                    exhausted = True
+                    break
+                line_number, record = item
+                if isinstance(record, ValueError):
+                    writer.write({"line": line_number, "id": None, "error": str(record)})
+                    summary.add(record, 0.0)
+                    continue
+                task = asyncio.ensure_future(process(record))
+                pending[task] = (line_number, record.get("id"), time.perf_counter())
+            if not pending:
+                break
+
+            finished, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                line_number, pair_id, started = pending.pop(task)
+                error = task.exception()
+                if error is None and task.result().get("processing", {}).get("parse_status") == "failed":
+                    # Respuesta irrecuperable: no cuenta como terminado para que se reintente al reanudar
+                    error = ValueError("No se pudo extraer un análisis válido de la respuesta del modelo")
+                outcome: Union[Dict[str, Any], Exception] = error if error is not None else task.result()
+                summary.add(outcome, time.perf_counter() - started)
+                if error is not None:
+                    writer.write({"line": line_number, "id": pair_id, "error": str(error) or type(error).__name__})
+                else:
+                    writer.write({"line": line_number, "id": pair_id, "result": outcome})
+
+            if args.progress_every and time.perf_counter() - last_progress >= args.progress_every:
+                last_progress = time.perf_counter()
+                print(summary.progress(), file=sys.stderr, flush=True)
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        writer.close()
+        await service.aclose()
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    configure_environment(args)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+
+    if args.restart and os.path.exists(args.output):
+        os.remove(args.output)
+    done = completed_lines(args.output)
+    summary = ThroughputSummary(skipped=len(done))
+    if done:
+        print(f"Reanudando: {len(done)} pares ya terminados en {args.output}", file=sys.stderr)
+
+    try:
+        asyncio.run(run(args, summary, done))
+    except KeyboardInterrupt:
+        summary.interrupted = True
+    print(summary.render())
+    if summary.interrupted:
+        return 130
+    return 1 if summary.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
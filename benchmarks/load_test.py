@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Generador de carga para los endpoints de matching
+
+Lanza peticiones con concurrencia controlada (bucle cerrado: cada worker
+envía la siguiente petición al recibir la anterior) y reporta en JSON la
+latencia p50/p95/p99, las peticiones por segundo y la tasa de errores.
+
+Uso:
+    python -m benchmarks.load_test --base-url http://127.0.0.1:8000 \\
+        --endpoint match --concurrency 16 --requests 200 --output result.json
+"""
+
+import argparse
+import asyncio
+import copy
+import json
+import subprocess
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import httpx
+import numpy as np
+
+from app.models.schemas import ATSMatchRequest
+
+ENDPOINTS = {
+    "match": "/api/v1/ats/match",
+    "stream": "/api/v1/ats/match/stream",
+    "batch": "/api/v1/ats/match/batch",
+    "rank": "/api/v1/ats/rank",
+}
+
+EXAMPLE = ATSMatchRequest.Config.json_schema_extra["example"]
+
+
+def build_candidato(sequence: int, unique: bool, salt: str = "") -> Dict[str, Any]:
+    """Candidato de ejemplo; con unique=True el CV cambia para no acertar en la caché"""
+    candidato = copy.deepcopy(EXAMPLE["candidato"])
+    if unique:
+        candidato["cv_text"] += f" Referencia de carga {salt}-{sequence}."
+        candidato["years_experience"] = 1 + sequence % 8
+    return candidato
+
+
+def build_payload(endpoint: str, sequence: int, unique: bool, batch_size: int, salt: str = "") -> Dict[str, Any]:
+    """Cuerpo de la petición para el endpoint indicado"""
+    if endpoint in ("match", "stream"):
+        return {"vacante": EXAMPLE["vacante"], "candidato": build_candidato(sequence, unique, salt)}
+    candidatos = [build_candidato(sequence * batch_size + i, unique, salt) for i in range(batch_size)]
+    payload = {"vacante": EXAMPLE["vacante"], "candidatos": candidatos}
+    if endpoint == "rank":
+        payload["top_k"] = max(batch_size // 4, 1)
+    return payload
+
+
+def percentiles(values: List[float]) -> Optional[Dict[str, float]]:
+    """p50/p95/p99, media y máximo en milisegundos"""
+    if not values:
+        return None
+    data = np.asarray(values)
+    p50, p95, p99 = np.percentile(data, [50, 95, 99])
+    return {
+        "p50": round(float(p50), 1),
+        "p95": round(float(p95), 1),
+        "p99": round(float(p99), 1),
+        "mean": round(float(data.mean()), 1),
+        "max": round(float(data.max()), 1),
+    }
+
+
+def git_commit() -> Optional[str]:
+    """Commit actual (para comparar resultados entre commits)"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def send(client: httpx.AsyncClient, endpoint: str, payload: Dict[str, Any], params: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Envía una petición y mide la latencia total y hasta el primer byte del cuerpo
+
+    Returns:
+        Diccionario con status, latencias y metadatos del análisis
+    """
+    sample: Dict[str, Any] = {"status": None, "ttfb_ms": None, "items": 0, "item_errors": 0,
+                              "source": None, "parse_status": None}
+    started = time.perf_counter()
+    try:
+        async with client.stream("POST", ENDPOINTS[endpoint], json=payload, params=params) as response:
+            sample["status"] = response.status_code
+            body = b""
+            async for chunk in response.aiter_bytes():
+                if sample["ttfb_ms"] is None:
+                    sample["ttfb_ms"] = (time.perf_counter() - started) * 1000
+                body += chunk
+    except httpx.HTTPError as e:
+        sample["status"] = type(e).__name__
+        sample["latency_ms"] = (time.perf_counter() - started) * 1000
+        return sample
+    sample["latency_ms"] = (time.perf_counter() - started) * 1000
+
+    if sample["status"] != 200:
+        return sample
+    text = body.decode("utf-8", errors="replace")
+    if endpoint == "match":
+        processing = json.loads(text).get("processing") or {}
+        sample["source"] = processing.get("source")
+        sample["parse_status"] = processing.get("parse_status")
+    elif endpoint == "stream":
+        if "event: error" in text:
+            sample["item_errors"] = 1
+    elif endpoint == "batch":
+        for line in text.splitlines():
+            if line.strip():
+                sample["items"] += 1
+                sample["item_errors"] += bool(json.loads(line).get("error"))
+    elif endpoint == "rank":
+        ranking = json.loads(text).get("ranking", [])
+        sample["items"] = len(ranking)
+        sample["item_errors"] = sum(bool(item.get("error")) for item in ranking)
+    return sample
+
+
+async def run_load(
+    base_url: str,
+    endpoint: str,
+    concurrency: int,
+    requests: int,
+    duration: Optional[float] = None,
+    batch_size: int = 10,
+    unique: bool = True,
+    use_cache: bool = True,
+    scoring_mode: Optional[str] = None,
+    timeout: float = 300.0
+) -> Dict[str, Any]:
+    """
+    Ejecuta un escenario de carga y resume sus métricas
+
+    Args:
+        base_url: URL de la aplicación
+        endpoint: match, stream, batch o rank
+        concurrency: Peticiones simultáneas
+        requests: Número total de peticiones (si no hay duration)
+        duration: Segundos de carga (sustituye a requests)
+        batch_size: Candidatos por petición en batch y rank
+        unique: Variar el CV en cada petición para evitar aciertos de caché
+        use_cache: Valor del parámetro use_cache
+        scoring_mode: llm o local (None = el del servidor)
+        timeout: Timeout por petición en segundos
+
+    Returns:
+        Resumen del escenario en formato JSON-serializable
+    """
+    params = {"use_cache": str(use_cache).lower()}
+    if scoring_mode:
+        params["scoring_mode"] = scoring_mode
+    samples: List[Dict[str, Any]] = []
+    counter = iter(range(10 ** 9))
+    # Cada ejecución usa CVs distintos para no acertar en la caché de ejecuciones previas
+    salt = uuid.uuid4().hex[:8]
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    started = time.perf_counter()
+    deadline = started + duration if duration else None
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        async def worker():
+            while True:
+                sequence = next(counter)
+                if deadline is None and sequence >= requests:
+                    return
+                if deadline is not None and time.perf_counter() >= deadline:
+                    return
+                payload = build_payload(endpoint, sequence, unique, batch_size, salt)
+                samples.append(await send(client, endpoint, payload, params))
+
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+
+    ok = [s for s in samples if s["status"] == 200]
+    errors = Counter(str(s["status"]) for s in samples if s["status"] != 200)
+    items = sum(s["items"] for s in samples)
+    item_errors = sum(s["item_errors"] for s in samples)
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "batch_size": batch_size if endpoint in ("batch", "rank") else None,
+        "requests": len(samples),
+        "ok": len(ok),
+        "errors": dict(errors),
+        "error_rate": round(1 - len(ok) / len(samples), 4) if samples else None,
+        "item_error_rate": round(item_errors / items, 4) if items else (round(item_errors / len(ok), 4) if ok else None),
+        "duration_s": round(elapsed, 3),
+        "rps": round(len(samples) / elapsed, 2) if elapsed else None,
+        "items_per_s": round(items / elapsed, 2) if items and elapsed else None,
+        "latency_ms": percentiles([s["latency_ms"] for s in ok]),
+        "ttfb_ms": percentiles([s["ttfb_ms"] for s in ok if s["ttfb_ms"] is not None]),
+        "sources": dict(Counter(s["source"] for s in ok if s["source"])),
+        "parse_status": dict(Counter(s["parse_status"] for s in ok if s["parse_status"])),
+    }
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Generador de carga para el Simulador ATS")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--endpoint", choices=sorted(ENDPOINTS), default="match")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=None, help="Segundos de carga (en lugar de --requests)")
+    parser.add_argument("--batch-size", type=int, default=10)
+    parser.add_argument("--repeat-payload", action="store_true", help="Repetir el mismo candidato (mide la caché)")
+    parser.add_argument("--no-cache", action="store_true", help="Enviar use_cache=false")
+    parser.add_argument("--scoring-mode", choices=("llm", "local"), default=None)
+    parser.add_argument("--label", default=None, help="Etiqueta del resultado")
+    parser.add_argument("--output", default=None, help="Fichero JSON de salida (por defecto stdout)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    result = asyncio.run(run_load(
+        args.base_url,
+        args.endpoint,
+        args.concurrency,
+        args.requests,
+        duration=args.duration,
+        batch_size=args.batch_size,
+        unique=not args.repeat_payload,
+        use_cache=not args.no_cache,
+        scoring_mode=args.scoring_mode
+    ))
+    report = {
+        "label": args.label,
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "scenarios": [result],
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Servidor local compatible con la API de chat de Groq/OpenAI para benchmarks
+
+Sirve POST /openai/v1/chat/completions (normal y streaming) y GET
+/openai/v1/models sin consumir cuota real. Permite simular:
+- Latencia del modelo con distribución fija, uniforme o lognormal
+- Velocidad de generación (tokens de salida por segundo)
+- Errores 429 con el mismo cuerpo que devuelve Groq
+- Respuestas con JSON mal formado (comillas simples, truncado, sin JSON)
+
+Uso:
+    python benchmarks/mock_groq.py --port 9100 --latency lognormal --latency-ms 800 \\
+        --rate-limit-prob 0.05 --malformed-prob 0.05
+
+La aplicación se apunta al servidor con GROQ_BASE_URL=http://127.0.0.1:9100
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from typing import Any, Dict, List
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Formas de JSON mal formado que se inyectan (el parser de la aplicación debe repararlas)
+MALFORMED_KINDS = ("single_quotes", "truncated", "prose")
+
+
+def build_analysis(rng: random.Random) -> Dict[str, Any]:
+    """Análisis ATS verosímil con un score aleatorio"""
+    hard = round(rng.uniform(20, 100), 1)
+    experience = round(rng.uniform(20, 100), 1)
+    soft = round(rng.uniform(20, 100), 1)
+    score = round(0.5 * hard + 0.3 * experience + 0.2 * soft, 1)
+    status = "APROBADO" if score >= 70 else "RECHAZADO" if score < 40 else "PENDIENTE"
+    return {
+        "match_score": score,
+        "status": status,
+        "skill_analysis": {
+            "hard_skills_score": hard,
+            "soft_skills_score": soft,
+            "matched_skills": ["React", "TypeScript"],
+            "missing_skills": ["CSS"],
+        },
+        "experience_score": experience,
+        "compliance_check": {"has_work_permit": True, "location_match": True, "education_match": True},
+        "recommendations": ["Profundizar en CSS moderno", "Documentar proyectos con métricas de impacto"],
+        "summary": "Perfil alineado con la vacante en las tecnologías principales.",
+        "detailed_analysis": "Análisis simulado por el servidor de benchmarks. " * 8,
+    }
+
+
+def malformed(text: str, kind: str) -> str:
+    """Estropea un JSON válido de una de las formas que producen los modelos"""
+    if kind == "single_quotes":
+        return "Aquí tienes el análisis:\n```json\n" + text.replace('"', "'") + "\n```"
+    if kind == "truncated":
+        return text[: max(len(text) * 2 // 3, 1)]
+    return "Lo siento, no puedo generar el análisis en este momento."
+
+
+class MockGroq:
+    """Estado y configuración del servidor simulado"""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.stats = {"requests": 0, "rate_limited": 0, "malformed": 0, "streamed": 0}
+
+    def latency(self) -> float:
+        """Latencia hasta el primer token en segundos según la distribución configurada"""
+        base = self.args.latency_ms / 1000
+        if self.args.latency == "uniform":
+            return self.rng.uniform(base * (1 - self.args.jitter), base * (1 + self.args.jitter))
+        if self.args.latency == "lognormal":
+            return self.rng.lognormvariate(0, self.args.sigma) * base
+        return base
+
+    def content(self) -> str:
+        """Contenido de la respuesta (a veces mal formado)"""
+        text = json.dumps(build_analysis(self.rng), ensure_ascii=False)
+        if self.rng.random() < self.args.malformed_prob:
+            self.stats["malformed"] += 1
+            return malformed(text, self.rng.choice(MALFORMED_KINDS))
+        return text
+
+    def rate_limited(self) -> bool:
+        return self.rng.random() < self.args.rate_limit_prob
+
+    def rate_limit_response(self, model: str) -> JSONResponse:
+        """429 con el cuerpo y las cabeceras que devuelve Groq"""
+        self.stats["rate_limited"] += 1
+        retry_after = self.args.retry_after
+        message = (
+            f"Rate limit reached for model `{model}` in organization `org_bench` on requests per minute (RPM): "
+            f"Limit 30, Used 30, Requested 1. Please try again in {retry_after}s."
+        )
+        return JSONResponse(
+            status_code=429,
+            content={"error": {"message": message, "type": "requests", "code": "rate_limit_exceeded"}},
+            headers={"retry-after": str(int(retry_after) or 1)},
+        )
+
+
+def create_app(mock: MockGroq) -> FastAPI:
+    """Aplicación FastAPI del servidor simulado"""
+    app = FastAPI(title="Mock Groq")
+
+    @app.get("/openai/v1/models")
+    async def list_models():
+        return {"object": "list", "data": [{"id": "mock", "object": "model", "created": 0, "owned_by": "bench"}]}
+
+    @app.get("/stats")
+    async def stats():
+        return mock.stats
+
+    @app.post("/openai/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "mock")
+        mock.stats["requests"] += 1
+        if mock.rate_limited():
+            return mock.rate_limit_response(model)
+
+        prompt_tokens = sum(len(str(m.get("content") or "")) for m in body.get("messages", [])) // 4
+        content = mock.content()
+        completion_tokens = max(len(content) // 4, 1)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        await asyncio.sleep(mock.latency())
+
+        if body.get("stream"):
+            mock.stats["streamed"] += 1
+            return StreamingResponse(
+                stream_chunks(mock, completion_id, created, model, content, usage),
+                media_type="text/event-stream",
+            )
+
+        await asyncio.sleep(completion_tokens / mock.args.tokens_per_second)
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": usage,
+        }
+
+    return app
+
+
+async def stream_chunks(mock: MockGroq, completion_id: str, created: int, model: str, content: str, usage: Dict[str, int]):
+    """Chunks SSE en formato OpenAI a la velocidad de generación configurada"""
+    pieces: List[str] = [content[i:i + 16] for i in range(0, len(content), 16)]
+    delay = 4 / mock.args.tokens_per_second
+    for index, piece in enumerate(pieces):
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": {"role": "assistant", "content": piece} if index == 0 else {"content": piece}, "finish_reason": None}],
+        }
+        yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+        await asyncio.sleep(delay)
+    final = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": created,
+        "model": model,
+        "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+        "x_groq": {"id": completion_id, "usage": usage},
+    }
+    yield f"data: {json.dumps(final)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Servidor Groq simulado para benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", choices=("fixed", "uniform", "lognormal"), default="lognormal",
+                        help="Distribución de la latencia hasta el primer token")
+    parser.add_argument("--latency-ms", type=float, default=800, help="Latencia base (mediana en lognormal)")
+    parser.add_argument("--jitter", type=float, default=0.3, help="Amplitud relativa de la distribución uniforme")
+    parser.add_argument("--sigma", type=float, default=0.5, help="Sigma de la distribución lognormal")
+    parser.add_argument("--tokens-per-second", type=float, default=250, help="Velocidad de generación de salida")
+    parser.add_argument("--rate-limit-prob", type=float, default=0.0, help="Probabilidad de responder 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Segundos sugeridos en los 429")
+    parser.add_argument("--malformed-prob", type=float, default=0.0, help="Probabilidad de JSON mal formado")
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    uvicorn.run(create_app(MockGroq(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Suite de benchmarks sin cuota real de Groq
+
+Arranca el servidor Groq simulado (benchmarks/mock_groq.py) y la aplicación
+apuntando a él con GROQ_BASE_URL, ejecuta los escenarios de carga y guarda
+un informe JSON comparable entre commits.
+
+Uso:
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --scenario match:32:400 --scenario batch:4:20 \\
+        --mock-args "--latency-ms 600 --rate-limit-prob 0.05 --malformed-prob 0.05"
+    python -m benchmarks.run --compare baseline.json --output bench.json
+
+Formato de escenario: endpoint:concurrencia:peticiones[:tamaño_lote]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+import httpx
+
+from benchmarks.load_test import git_commit, run_load
+
+DEFAULT_SCENARIOS = ["match:1:20", "match:16:200", "stream:8:50", "batch:4:20:10"]
+
+# Configuración de la aplicación durante el benchmark: sin cuotas del scheduler
+# (las impone el servidor simulado) y con la cola de jobs en un fichero temporal
+APP_ENV = {
+    "GROQ_API_KEY": "benchmark",
+    "GROQ_RPM_LIMIT": "0",
+    "GROQ_TPM_LIMIT": "0",
+    "JOBS_ENABLED": "False",
+    "DEBUG": "False",
+}
+
+
+def parse_scenario(spec: str) -> Dict[str, Any]:
+    """endpoint:concurrencia:peticiones[:tamaño_lote] -> argumentos de run_load"""
+    parts = spec.split(":")
+    if len(parts) not in (3, 4):
+        raise ValueError(f"Escenario inválido: {spec}")
+    scenario = {"endpoint": parts[0], "concurrency": int(parts[1]), "requests": int(parts[2])}
+    if len(parts) == 4:
+        scenario["batch_size"] = int(parts[3])
+    return scenario
+
+
+def wait_until_ready(url: str, process: subprocess.Popen, timeout: float = 60.0) -> None:
+    """Espera a que una URL responda 200 (o a que el proceso termine)"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"El proceso terminó antes de estar listo ({url})")
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"{url} no respondió en {timeout} s")
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Diferencias de latencia, rps y errores entre dos informes (por endpoint/concurrencia)"""
+    def key(scenario: Dict[str, Any]):
+        return scenario["endpoint"], scenario["concurrency"], scenario.get("batch_size")
+
+    previous = {key(s): s for s in baseline.get("scenarios", [])}
+    rows = []
+    for scenario in current["scenarios"]:
+        before = previous.get(key(scenario))
+        if before is None:
+            continue
+        row = {"endpoint": scenario["endpoint"], "concurrency": scenario["concurrency"]}
+        for metric in ("p50", "p95", "p99"):
+            now_value = (scenario["latency_ms"] or {}).get(metric)
+            old_value = (before["latency_ms"] or {}).get(metric)
+            if now_value is not None and old_value:
+                row[f"{metric}_change"] = round((now_value - old_value) / old_value, 4)
+        if scenario["rps"] and before["rps"]:
+            row["rps_change"] = round((scenario["rps"] - before["rps"]) / before["rps"], 4)
+        row["error_rate"] = [before["error_rate"], scenario["error_rate"]]
+        rows.append(row)
+    return rows
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmarks del Simulador ATS con Groq simulado")
+    parser.add_argument("--scenario", action="append", default=None,
+                        help="endpoint:concurrencia:peticiones[:tamaño_lote] (repetible)")
+    parser.add_argument("--mock-port", type=int, default=9100)
+    parser.add_argument("--app-port", type=int, default=8100)
+    parser.add_argument("--mock-args", default="", help="Argumentos extra para mock_groq.py")
+    parser.add_argument("--app-env", action="append", default=[], help="VARIABLE=valor extra para la aplicación")
+    parser.add_argument("--no-cache", action="store_true", help="Enviar use_cache=false")
+    parser.add_argument("--label", default=None)
+    parser.add_argument("--output", default=None, help="Fichero JSON del informe")
+    parser.add_argument("--compare", default=None, help="Informe JSON anterior con el que comparar")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    scenarios = [parse_scenario(spec) for spec in (args.scenario or DEFAULT_SCENARIOS)]
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    workdir = tempfile.mkdtemp(prefix="ats-bench-")
+
+    env = dict(os.environ, **APP_ENV)
+    env["GROQ_BASE_URL"] = f"http://127.0.0.1:{args.mock_port}"
+    env["JOB_QUEUE_PATH"] = os.path.join(workdir, "jobs.db")
+    env["MATCH_HISTORY_PATH"] = os.path.join(workdir, "history.db")
+    env["SHARED_STATE_DIR"] = os.path.join(workdir, "state")
+    for assignment in args.app_env:
+        name, _, value = assignment.partition("=")
+        env[name] = value
+
+    mock = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.mock_groq", "--port", str(args.mock_port), *shlex.split(args.mock_args)],
+        cwd=root,
+        stdout=sys.stderr
+    )
+    app = None
+    try:
+        wait_until_ready(f"http://127.0.0.1:{args.mock_port}/openai/v1/models", mock)
+        app = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(args.app_port),
+             "--log-level", "warning"],
+            cwd=root,
+            env=env,
+            # La salida de los procesos va a stderr para que stdout sea solo el informe JSON
+            stdout=sys.stderr
+        )
+        base_url = f"http://127.0.0.1:{args.app_port}"
+        wait_until_ready(f"{base_url}/ready", app)
+
+        results = []
+        for scenario in scenarios:
+            print(f"▶ {scenario}", file=sys.stderr)
+            results.append(asyncio.run(run_load(base_url, use_cache=not args.no_cache, **scenario)))
+        mock_stats = httpx.get(f"http://127.0.0.1:{args.mock_port}/stats").json()
+    finally:
+        for process in (app, mock):
+            if process is not None:
+                process.terminate()
+                process.wait(timeout=10)
+
+    report: Dict[str, Any] = {
+        "label": args.label,
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "mock_args": args.mock_args,
+        "app_env": args.app_env,
+        "scenarios": results,
+        "mock": mock_stats,
+    }
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            report["comparison"] = compare(report, json.load(f))
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
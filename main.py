@@ -4,10 +4,21 @@ import os
 # Suprimir advertencias de Pydantic sobre namespace 'model_' en dependencias
 warnings.filterwarnings("ignore", category=UserWarning, module="pydantic")
 
+import time
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.api import router
+from fastapi.responses import JSONResponse, PlainTextResponse
+from starlette.datastructures import MutableHeaders
+from app.api import (
+    router,
+    init_agent_service,
+    get_readiness,
+    close_agent_service,
+    start_job_workers,
+    stop_job_workers
+)
 from app.config import settings
+from app.services.metrics import HTTP_REQUEST_SECONDS, registry, start_request_timings
 import uvicorn
 
 # Crear la aplicación FastAPI
@@ -39,6 +50,48 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+class ServerTimingMiddleware:
+    """
+    Mide cada etapa de la petición y la expone en la cabecera Server-Timing
+    
+    Middleware ASGI puro: a diferencia de @app.middleware("http") no consume
+    receive() en paralelo, así que no interfiere con las respuestas que leen
+    el body mientras responden (/ats/match/upload).
+    """
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timings = start_request_timings()
+        started = time.perf_counter()
+        status_code = 500
+        
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                # En respuestas en streaming solo se incluyen las etapas previas al primer byte
+                MutableHeaders(raw=message.setdefault("headers", [])).append("Server-Timing", timings.server_timing())
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                route=getattr(route, "path", "unmatched"),
+                method=scope["method"],
+                status=status_code
+            )
+
+
+app.add_middleware(ServerTimingMiddleware)
+
 # Incluir las rutas
 app.include_router(router, prefix="/api/v1", tags=["ATS - Recruitment System"])
 
@@ -58,6 +111,19 @@ async def health():
     """Health check alternativo"""
     return {"status": "ok", "app": settings.app_name}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Métricas en formato de exposición de Prometheus"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/ready")
+async def ready():
+    """Readiness para Railway: 200 solo cuando el agente está inicializado y precalentado"""
+    state = get_readiness()
+    if not state["ready"]:
+        return JSONResponse(status_code=503, content={"status": "warming_up", **state})
+    return {"status": "ready", **state}
+
 
 @app.on_event("startup")
 async def startup_event():
@@ -68,6 +134,13 @@ async def startup_event():
         print(f"📝 Documentación disponible en: http://{settings.host}:{settings.port}/docs")
         print(f"🔧 Modo debug: {settings.debug}")
         print(f"✅ GROQ_API_KEY configurada: {bool(settings.groq_api_key)}")
+        if settings.multi_worker:
+            print(f"👥 Worker {os.getpid()} de {settings.worker_count()}; estado compartido en {settings.shared_state_dir}")
+        init_agent_service()
+        print("🔥 Agente inicializado; warm-up en curso (readiness en /ready)")
+        if settings.jobs_enabled:
+            start_job_workers()
+            print(f"🧵 Cola de jobs: {settings.job_workers} workers ({settings.job_queue_path})")
     except Exception as e:
         print(f"❌ Error en startup: {e}")
         raise
@@ -76,14 +149,22 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     """Evento que se ejecuta al cerrar la aplicación"""
+    await stop_job_workers()
+    await close_agent_service()
     print("👋 Cerrando la aplicación...")
 
 
 if __name__ == "__main__":
-    # Ejecutar el servidor
+    # Ejecutar el servidor: un proceso por núcleo disponible (WEB_CONCURRENCY)
+    # salvo en modo debug, que usa un único proceso con recarga automática
+    workers = settings.launch_worker_count()
+    # Los workers se lanzan como procesos nuevos: heredan el número resuelto
+    os.environ["WEB_CONCURRENCY"] = str(workers)
     uvicorn.run(
         "main:app",
         host=settings.host,
         port=settings.port,
-        reload=settings.debug
+        reload=settings.debug,
+        workers=workers,
+        timeout_keep_alive=settings.timeout_keep_alive
     )